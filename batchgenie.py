@@ -0,0 +1,11 @@
+"""BatchGenie 非交互命令行入口
+
+只导入所选子命令需要的模块，适合在 cron 或脚本中调用，例如：
+    python batchgenie.py prefix D:/Music wav 2024_ --yes
+    python batchgenie.py delete "D:/tmp/*.log" --dry-run --json
+"""
+import sys
+from modules.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+# 使 benchmarks 目录成为 Python 包
@@ -0,0 +1,128 @@
+"""AI 模式端到端基准测试（离线）
+
+使用确定性的替身模型代替 Gemini，测量 指令 -> AI 响应 -> 解析 -> 预览 -> 执行 各阶段的耗时分布。
+
+用法:
+    python -m benchmarks.bench_ai_mode --files 2000 --iterations 20 --latency 0.5
+    python -m benchmarks.bench_ai_mode --scenario prefix --scenario delete --json ai_bench.json
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import (
+    make_tree, temporary_tree, quiet, Stopwatch, print_table, write_json, machine_info
+)
+from modules.model_backend import StubBackend, set_backend
+from modules.ai_controller import get_ai_response, parse_ai_response, preview_plan, execute_plan
+
+
+def _scenario_prefix(root, files):
+    folder = os.path.join(root, 'flat')
+    make_tree(folder, files, extensions=('.txt', '.wav'))
+    return {'operation': 'add_prefix', 'folder_path': folder, 'file_extension': 'txt', 'prefix': 'BENCH_'}
+
+
+def _scenario_delete(root, files):
+    folder = os.path.join(root, 'nested')
+    make_tree(folder, files, depth=2, fanout=5, extensions=('.wav', '.tmp', '.txt'))
+    return {'operation': 'delete', 'files': [
+        os.path.join(folder, '**', '*.tmp').replace('\\', '/'),
+        os.path.join(folder, '**', '*.txt').replace('\\', '/')
+    ]}
+
+
+def _scenario_batch(root, files):
+    folder = os.path.join(root, 'batch')
+    paths = make_tree(folder, files)
+    return {'operation': 'batch', 'operations': [
+        {'type': 'rename', 'source': path, 'target': os.path.join(folder, 'renamed', os.path.basename(path))}
+        for path in paths
+    ]}
+
+
+def _scenario_move(root, files):
+    source = os.path.join(root, 'src')
+    make_tree(source, files)
+    return {'operation': 'move', 'files': [os.path.join(source, '*.txt')], 'target_dir': os.path.join(root, 'dst')}
+
+
+SCENARIOS = {
+    'prefix': _scenario_prefix,
+    'delete': _scenario_delete,
+    'batch': _scenario_batch,
+    # batch_transfer 对每个文件都会等待 wait_time 秒，文件数较多时非常慢
+    'move': _scenario_move,
+}
+DEFAULT_SCENARIOS = ['prefix', 'delete', 'batch']
+
+
+def run_scenario(name, files, iterations, backend_options):
+    """运行单个场景，返回各阶段的统计结果"""
+    builder = SCENARIOS[name]
+    watch = Stopwatch()
+    failures = 0
+    plans = {}
+    backend = StubBackend(script=lambda request: plans[request], **backend_options)
+    set_backend(backend)
+
+    for iteration in range(iterations):
+        with temporary_tree() as root:
+            # 构建目录树不计入耗时
+            command = f"bench {name} #{iteration}"
+            plans[command] = builder(root, files)
+
+            with quiet():
+                start = time.perf_counter()
+                with watch.stage('ai'):
+                    response = get_ai_response(command)
+                try:
+                    with watch.stage('parse'):
+                        plan = parse_ai_response(response)
+                except ValueError:
+                    failures += 1
+                    continue
+                with watch.stage('preview'):
+                    preview_plan(plan)
+                with watch.stage('execute'):
+                    execute_plan(plan, confirm=False)
+                watch.samples.setdefault('total', []).append(time.perf_counter() - start)
+
+    return {'files': files, 'iterations': iterations, 'failures': failures, 'stages': watch.report()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmark for AI mode')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='要运行的场景，可重复指定（默认 prefix、delete、batch）')
+    parser.add_argument('--files', type=int, default=1000, help='每个场景的文件数')
+    parser.add_argument('--iterations', type=int, default=10, help='每个场景的重复次数')
+    parser.add_argument('--latency', type=float, default=0.0, help='替身模型的固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='替身模型的随机附加延迟上限（秒）')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='替身模型随机失败的概率')
+    parser.add_argument('--fail-every', type=int, default=0, help='替身模型每第 N 次调用必定失败')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--json', default=None, help='把结果写入 JSON 文件')
+    args = parser.parse_args(argv)
+
+    backend_options = {'latency': args.latency, 'jitter': args.jitter,
+                       'failure_rate': args.failure_rate, 'fail_every': args.fail_every,
+                       'seed': args.seed}
+    results = {'machine': machine_info(), 'backend': backend_options, 'scenarios': {}}
+    for name in args.scenario or DEFAULT_SCENARIOS:
+        result = run_scenario(name, args.files, args.iterations, backend_options)
+        results['scenarios'][name] = result
+        print(f"\n== {name}: {args.files} files x {args.iterations} iterations "
+              f"({result['failures']} failed) ==")
+        print_table(result['stages'])
+
+    if args.json:
+        write_json(args.json, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""大型操作计划的内存与耗时基准测试
+
+构造 N 条重命名操作（不访问真实文件），分别以 FileOperation 对象列表和 PlanStore 两种方式保存，
+测量构建和预览（含校验）两个阶段的耗时与 tracemalloc 峰值内存。
+
+用法:
+    python -m benchmarks.bench_plan --ops 1000000
+    python -m benchmarks.bench_plan --ops 200000 --memory-limit 16 --json plan_bench.json
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import quiet, write_json, machine_info
+from modules.plan_store import FileOperation, PlanStore
+from modules.operation_batch import FileOperationBatch
+
+
+def _renames(count, per_dir=1000):
+    for i in range(count):
+        directory = os.path.join(os.sep, 'bench', 'music', f'album{i // per_dir:05d}')
+        yield (os.path.join(directory, f'track{i:07d}.wav'), os.path.join(directory, f'2024_track{i:07d}.wav'))
+
+
+def _measure(run):
+    """返回 (耗时秒数, 峰值内存字节数, run 的返回值)
+
+    tracemalloc 会让分配密集的代码慢数倍，所以先不跟踪内存计时一次，再跟踪内存运行一次。
+    """
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        result = run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return seconds, peak, result
+
+
+def _store(count, memory_limit):
+    store = PlanStore(memory_limit=memory_limit)
+    for source, target in _renames(count):
+        store.append('rename', source, target)
+    return store
+
+
+def bench(count, memory_limit=None):
+    results = {}
+    layouts = {
+        'objects': lambda: [FileOperation('rename', source, target) for source, target in _renames(count)],
+        'store': lambda: _store(count, memory_limit),
+    }
+    for name, build in layouts.items():
+        seconds, peak, operations = _measure(build)
+        results[f'{name}/build'] = {'seconds': seconds, 'peak_bytes': peak}
+        # 每次预览都新建 FileOperationBatch，避免第二次运行用到第一次的 stat 缓存
+        seconds, peak, _ = _measure(
+            lambda: sum(1 for _ in FileOperationBatch(operations, lang='en').iter_preview())
+        )
+        results[f'{name}/preview'] = {'seconds': seconds, 'peak_bytes': peak}
+        del operations
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Memory and time for very large operation plans')
+    parser.add_argument('--ops', type=int, default=200000, help='重命名操作数')
+    parser.add_argument('--memory-limit', type=int, default=None, help='PlanStore 文件名区的内存上限（MB）')
+    parser.add_argument('--json', default=None, help='把结果写入 JSON 文件')
+    args = parser.parse_args(argv)
+
+    with quiet():
+        results = bench(args.ops, args.memory_limit * 1024 * 1024 if args.memory_limit else None)
+
+    header = f"{'stage':<20}{'seconds':>10}{'peak MB':>12}{'bytes/op':>12}"
+    print(header)
+    print('-' * len(header))
+    for name, stats in results.items():
+        print(f"{name:<20}{stats['seconds']:>10.2f}{stats['peak_bytes'] / 1e6:>12.1f}"
+              f"{stats['peak_bytes'] / args.ops:>12.0f}")
+    if args.json:
+        write_json(args.json, {'machine': machine_info(), 'ops': args.ops, 'results': results})
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""核心文件操作吞吐量基准测试
+
+在合成目录树上非交互地运行 add_prefix、add_suffix、batch_convert、batch_transfer、batch_delete、
+classify_audio_files、文件夹监控和撤回，结果可保存为 JSON，并可与基线对比发现性能退化。
+
+用法:
+    python -m benchmarks.bench_suite --size 1k --repeat 5 --json baseline.json
+    python -m benchmarks.bench_suite --size 1k --compare baseline.json --threshold 0.15
+    python -m benchmarks.bench_suite --size 100k --bench move --bench delete --shape nested
+"""
+import os
+import sys
+import time
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 音频元数据缓存写到临时目录，不影响用户自己的缓存（需在导入 modules 之前设置）
+_CACHE_DIR = None
+if 'BATCHGENIE_CACHE_DIR' not in os.environ:
+    import tempfile
+    _CACHE_DIR = os.environ['BATCHGENIE_CACHE_DIR'] = tempfile.mkdtemp(prefix='batchgenie_bench_cache_')
+
+from benchmarks.common import (
+    make_tree, make_audio_tree, temporary_tree, quiet, Stopwatch, summarize, machine_info,
+    compare_results, write_json
+)
+
+SIZES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+FILE_SIZES = {'small': 0, 'large': 1024 * 1024}
+# nested 形状：两层、每层 10 个子目录，共 100 个叶子目录
+NESTED = {'depth': 2, 'fanout': 10}
+# 监控基准最多投放的文件数（每个文件都要经过一次文件系统事件）
+MONITOR_FILES = 2000
+
+
+def _tree(root, files, shape, size, extensions=('.txt', '.wav')):
+    options = NESTED if shape == 'nested' else {}
+    make_tree(root, files, extensions=extensions, size=size, **options)
+    return root
+
+
+def _glob(root, shape, extension):
+    return os.path.join(root, '**', f'*{extension}') if shape == 'nested' else os.path.join(root, f'*{extension}')
+
+
+def bench_prefix(root, files, shape, size):
+    from modules.prefix_handler import add_prefix
+    folder = _tree(os.path.join(root, 'src'), files, shape, size)
+    return lambda: add_prefix(folder, 'txt', 'BENCH_', confirm=False), files // 2
+
+
+def bench_suffix(root, files, shape, size):
+    from modules.suffix_handler import add_suffix
+    folder = _tree(os.path.join(root, 'src'), files, shape, size)
+    return lambda: add_suffix(folder, 'txt', '_bench', confirm=False), files // 2
+
+
+def bench_convert(root, files, shape, size):
+    from modules.converter import batch_convert
+    folder = _tree(os.path.join(root, 'src'), files, shape, size)
+    return lambda: batch_convert(folder, '.txt', '.dat'), files // 2
+
+
+def _transfer(operation):
+    def bench(root, files, shape, size):
+        from modules.file_transfer import batch_transfer
+        folder = _tree(os.path.join(root, 'src'), files, shape, size)
+        target = os.path.join(root, 'dst')
+        return lambda: batch_transfer([_glob(folder, shape, '.txt')], target, operation, wait_time=0), files // 2
+    return bench
+
+
+def bench_delete(root, files, shape, size):
+    from modules.file_handler import batch_delete
+    folder = _tree(os.path.join(root, 'src'), files, shape, size)
+    return lambda: batch_delete([_glob(folder, shape, '.txt')], confirm=False), files // 2
+
+
+def bench_classify(root, files, shape, size):
+    from modules.audio_classifier import classify_audio_files
+    folder = os.path.join(root, 'audio')
+    make_audio_tree(folder, files, **(NESTED if shape == 'nested' else {}))
+    return lambda: classify_audio_files(folder, recursive=shape == 'nested'), files
+
+
+def bench_monitor(root, files, shape, size):
+    """从投放第一个文件开始，到监控把所有文件移动到目标文件夹为止"""
+    from modules.file_monitor import SmartFolderMonitor
+    files = min(files, MONITOR_FILES)
+    source, target = os.path.join(root, 'watch'), os.path.join(root, 'out')
+    staging = _tree(os.path.join(root, 'staging'), files, 'flat', size, extensions=('.wav',))
+    os.makedirs(source)
+    names = sorted(os.listdir(staging))
+
+    def run():
+        monitor = SmartFolderMonitor(source, target, ['.wav'], wait_time=0)
+        monitor.start()
+        try:
+            for name in names:
+                os.rename(os.path.join(staging, name), os.path.join(source, name))
+            deadline = time.monotonic() + 60 + files * 0.05
+            while time.monotonic() < deadline:
+                if os.path.isdir(target) and len(os.listdir(target)) >= files:
+                    break
+                time.sleep(0.01)
+            else:
+                raise TimeoutError(f"monitor moved {len(os.listdir(target))}/{files} files")
+        finally:
+            monitor.stop()
+    return run, files
+
+
+def bench_undo(root, files, shape, size):
+    """撤回一次 batch_transfer 移动（计时只包括撤回）"""
+    from modules.file_transfer import batch_transfer
+    from modules.undo_handler import UndoHandler
+    folder = _tree(os.path.join(root, 'src'), files, shape, size)
+    with quiet():
+        moved = batch_transfer([_glob(folder, shape, '.txt')], os.path.join(root, 'dst'), 'move', wait_time=0)
+    handler = UndoHandler()
+    handler.record_operation('move_files', moved)
+    return lambda: handler.undo_last_operation(confirm=False), len(moved)
+
+
+BENCHMARKS = {
+    'prefix': (bench_prefix, ('flat',)),
+    'suffix': (bench_suffix, ('flat',)),
+    'convert': (bench_convert, ('flat',)),
+    'move': (_transfer('move'), ('flat', 'nested')),
+    'copy': (_transfer('copy'), ('flat', 'nested')),
+    'delete': (bench_delete, ('flat', 'nested')),
+    'classify': (bench_classify, ('flat', 'nested')),
+    'monitor': (bench_monitor, ('flat',)),
+    'undo': (bench_undo, ('flat', 'nested')),
+}
+
+
+def run_benchmark(name, shape, files, size, repeat):
+    """在新建的目录树上重复运行一个基准，构建目录树不计入耗时"""
+    builder = BENCHMARKS[name][0]
+    watch = Stopwatch()
+    processed = 0
+    for _ in range(repeat):
+        with temporary_tree() as root:
+            run, processed = builder(root, files, shape, size)
+            with quiet(), watch.stage(name):
+                run()
+    stats = summarize(watch.samples[name])
+    return {'benchmark': name, 'shape': shape, 'entries': files, 'processed': processed,
+            'file_size': size, 'repeat': repeat, 'stats': stats,
+            'files_per_second': processed / stats['p50'] if stats['p50'] else 0.0}
+
+
+def print_results(results):
+    header = f"{'benchmark':<20}{'files':>10}{'p50 ms':>12}{'p95 ms':>12}{'max ms':>12}{'files/s':>14}"
+    print(header)
+    print('-' * len(header))
+    for key, result in results.items():
+        stats = result['stats']
+        print(f"{key:<20}{result['processed']:>10}{stats['p50'] * 1000:>12.1f}{stats['p95'] * 1000:>12.1f}"
+              f"{stats['max'] * 1000:>12.1f}{result['files_per_second']:>14.0f}")
+
+
+def print_comparison(rows, threshold):
+    print(f"\n{'benchmark':<20}{'baseline ms':>14}{'current ms':>14}{'change':>10}")
+    for name, before, after, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{name:<20}{before * 1000:>14.1f}{after * 1000:>14.1f}{change:>+10.1%}{flag}")
+    regressions = sum(1 for row in rows if row[4])
+    print(f"\n{regressions} regression(s) beyond {threshold:.0%}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Throughput benchmarks over synthetic directory trees')
+    parser.add_argument('--bench', action='append', choices=sorted(BENCHMARKS),
+                        help='要运行的基准，可重复指定（默认全部）')
+    parser.add_argument('--size', choices=sorted(SIZES), default='1k', help='目录树中的文件数')
+    parser.add_argument('--shape', action='append', choices=['flat', 'nested'],
+                        help='目录树形状，可重复指定（默认各基准支持的全部形状）')
+    parser.add_argument('--file-size', choices=sorted(FILE_SIZES), default='small',
+                        help='small 为空文件，large 为每个 1 MiB')
+    parser.add_argument('--repeat', type=int, default=3, help='每个基准的重复次数')
+    parser.add_argument('--json', default=None, help='把结果写入 JSON 文件（可作为基线）')
+    parser.add_argument('--compare', default=None, help='与基线 JSON 对比，有退化时退出码为 1')
+    parser.add_argument('--threshold', type=float, default=0.10, help='判定为退化的变慢比例')
+    args = parser.parse_args(argv)
+
+    files, size = SIZES[args.size], FILE_SIZES[args.file_size]
+    results = {}
+    try:
+        for name in args.bench or list(BENCHMARKS):
+            for shape in BENCHMARKS[name][1]:
+                if args.shape and shape not in args.shape:
+                    continue
+                key = f"{name}/{shape}"
+                print(f"running {key} ({args.size}, {args.file_size}) ...", file=sys.stderr)
+                results[key] = run_benchmark(name, shape, files, size, args.repeat)
+    finally:
+        if _CACHE_DIR:
+            import shutil
+            shutil.rmtree(_CACHE_DIR, ignore_errors=True)
+
+    print_results(results)
+    if args.json:
+        write_json(args.json, {'machine': machine_info(), 'size': args.size, 'file_size': args.file_size,
+                               'repeat': args.repeat, 'results': results})
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('size') != args.size or baseline.get('file_size') != args.file_size:
+            print(f"warning: baseline was recorded with --size {baseline.get('size')} "
+                  f"--file-size {baseline.get('file_size')}", file=sys.stderr)
+        rows = compare_results(baseline['results'], results, args.threshold)
+        if print_comparison(rows, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import time
+import struct
+import shutil
+import platform
+import tempfile
+import contextlib
+
+
+def percentile(values, p):
+    """计算百分位数（线性插值）
+
+    Args:
+        values (list): 数值列表
+        p (float): 百分位（0~100）
+
+    Returns:
+        float: 百分位数，列表为空时返回 0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def summarize(samples):
+    """汇总一组耗时样本（秒）"""
+    return {
+        'count': len(samples),
+        'mean': sum(samples) / len(samples) if samples else 0.0,
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+        'max': max(samples) if samples else 0.0
+    }
+
+
+def machine_info():
+    """收集运行基准测试的机器信息"""
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation()
+    }
+
+
+def make_tree(root, files, depth=0, fanout=10, extensions=('.txt',), size=0):
+    """生成合成目录树
+
+    Args:
+        root (str): 根目录
+        files (int): 文件总数
+        depth (int): 子目录层数，0 表示所有文件都在根目录下
+        fanout (int): 每层子目录数
+        extensions (tuple): 依次循环使用的扩展名
+        size (int): 每个文件的字节数
+
+    Returns:
+        list: 生成的文件路径列表
+    """
+    directories = [root]
+    for _ in range(depth):
+        directories = [os.path.join(d, f"d{i:03d}") for d in directories for i in range(fanout)]
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+
+    payload = b'\0' * size
+    paths = []
+    for i in range(files):
+        directory = directories[i % len(directories)]
+        path = os.path.join(directory, f"file_{i:07d}{extensions[i % len(extensions)]}")
+        with open(path, 'wb') as f:
+            if payload:
+                f.write(payload)
+        paths.append(path)
+    return paths
+
+
+def wav_header(samplerate=44100, channels=2, bits=16, frames=0):
+    """只含 fmt 和 data 块头的 WAV 文件（data 长度按 frames 填写，不写入实际采样）"""
+    block_align = channels * bits // 8
+    data_size = frames * block_align
+    return (b'RIFF' + struct.pack('<I', 36 + data_size) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, samplerate,
+                                    samplerate * block_align, block_align, bits)
+            + b'data' + struct.pack('<I', data_size))
+
+
+def flac_header(samplerate=44100, channels=2, bits=16, frames=0):
+    """只含 STREAMINFO 元数据块的 FLAC 文件头"""
+    packed = (samplerate << 44) | ((channels - 1) << 41) | ((bits - 1) << 36) | frames
+    streaminfo = struct.pack('>HH', 4096, 4096) + b'\0' * 6 + packed.to_bytes(8, 'big') + b'\0' * 16
+    return b'fLaC' + bytes([0x80]) + len(streaminfo).to_bytes(3, 'big') + streaminfo
+
+
+def dsf_header(samplerate=2822400, channels=2, frames=0):
+    """DSF 文件的 DSD 块和 fmt 块"""
+    return (b'DSD ' + struct.pack('<QQQ', 28, 28 + 52, 0)
+            + b'fmt ' + struct.pack('<QIIIIIIQII', 52, 1, 0, 2, channels, samplerate, 1, frames, 4096, 0))
+
+
+# 合成音频文件使用的 (扩展名, 文件头生成函数, 采样率) 组合
+AUDIO_VARIANTS = (
+    ('.wav', lambda rate: wav_header(rate, frames=rate * 3), 44100),
+    ('.wav', lambda rate: wav_header(rate, bits=24, frames=rate * 3), 48000),
+    ('.flac', lambda rate: flac_header(rate, bits=24, frames=rate * 3), 96000),
+    ('.flac', lambda rate: flac_header(rate, frames=rate * 3), 44100),
+    ('.dsf', lambda rate: dsf_header(rate, frames=rate * 3), 2822400),
+)
+
+
+def make_audio_tree(root, files, depth=0, fanout=10):
+    """生成只有文件头的合成音频文件（WAV/FLAC/DSF，多种采样率），可被 read_audio_header 识别"""
+    directories = [root]
+    for _ in range(depth):
+        directories = [os.path.join(d, f"d{i:03d}") for d in directories for i in range(fanout)]
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+    headers = [(extension, make(rate)) for extension, make, rate in AUDIO_VARIANTS]
+    paths = []
+    for i in range(files):
+        extension, header = headers[i % len(headers)]
+        path = os.path.join(directories[i % len(directories)], f"track_{i:07d}{extension}")
+        with open(path, 'wb') as f:
+            f.write(header)
+        paths.append(path)
+    return paths
+
+
+def compare_results(baseline, current, threshold=0.1, metric='p50'):
+    """与基线结果对比，找出变慢超过 threshold（比例）的项目
+
+    Args:
+        baseline (dict): 基线结果，形如 {名称: {'stats': summarize(...)}}
+        current (dict): 本次结果，格式相同
+        threshold (float): 允许的变慢比例，0.1 表示 10%
+        metric (str): 比较的统计量
+
+    Returns:
+        list: (名称, 基线值, 本次值, 变化比例, 是否退化) 列表，按变化比例从大到小排列
+    """
+    rows = []
+    for name, result in current.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['stats'][metric]
+        after = result['stats'][metric]
+        change = (after - before) / before if before else 0.0
+        rows.append((name, before, after, change, change > threshold))
+    return sorted(rows, key=lambda row: -row[3])
+
+
+@contextlib.contextmanager
+def temporary_tree(prefix='batchgenie_bench_'):
+    """创建临时目录并在结束时删除"""
+    root = tempfile.mkdtemp(prefix=prefix)
+    try:
+        yield root
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽被测函数的逐文件输出，避免终端输出影响计时"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+class Stopwatch:
+    """按阶段累计耗时样本"""
+
+    def __init__(self):
+        self.samples = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - start)
+
+    def report(self):
+        return {name: summarize(values) for name, values in self.samples.items()}
+
+
+def print_table(report, unit=1000.0, unit_name='ms'):
+    """以表格形式打印各阶段的统计结果"""
+    header = f"{'stage':<24}{'n':>6}{'p50':>12}{'p95':>12}{'p99':>12}{'max':>12}  ({unit_name})"
+    print(header)
+    print('-' * len(header))
+    for name, stats in report.items():
+        print(f"{name:<24}{stats['count']:>6}"
+              f"{stats['p50'] * unit:>12.3f}{stats['p95'] * unit:>12.3f}"
+              f"{stats['p99'] * unit:>12.3f}{stats['max'] * unit:>12.3f}")
+
+
+def write_json(path, data):
+    """把结果写入 JSON 文件"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
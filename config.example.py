@@ -7,9 +7,80 @@ SUPPORTED_FORMATS = [".txt", ".doc", ".pdf", ".jpg", ".png"]
 
 # Gemini API Key
 GEMINI_API_KEY = "your_gemini_api_key_here"
+# Gemini 模型名称
+GEMINI_MODEL = "gemini-pro"
 
 # 代理设置（如果需要）
 PROXY = {
     'http': 'http://127.0.0.1:7897',
     'https': 'http://127.0.0.1:7897'
-} 
\ No newline at end of file
+} 
+
+# AI 批量指令模式：同时进行的 AI 请求数和每秒最多发起的请求数
+AI_BATCH_CONCURRENCY = 4
+AI_BATCH_RATE = 1.0
+
+# 音频分类时并发读取文件头的线程数（网络存储或机械硬盘上可适当调大）
+AUDIO_PROBE_WORKERS = 16
+
+# 音频元数据缓存：重复分类同一批文件时跳过读取文件头（设为 False 关闭）
+AUDIO_CACHE = True
+# 缓存目录（默认 ~/.batchgenie，环境变量 BATCHGENIE_CACHE_DIR 优先于此项）
+CACHE_DIR = None
+
+# 音频分类的默认文件夹布局，可用字段 {rate} {bits} {channels} {format} {duration} {level}
+AUDIO_LAYOUT = "{rate}"
+
+# 音频电平分析的进程数（默认 CPU 核心数）
+AUDIO_ANALYSIS_WORKERS = 4
+
+# 音频转码的进程数（默认 CPU 核心数）
+TRANSCODE_WORKERS = 4
+
+# 查找重复文件时计算哈希的线程数
+DUPLICATE_WORKERS = 8
+
+# 图片整理的默认布局，可用字段 {year} {month} {day} {camera} {orientation} {megapixels} {format}
+IMAGE_LAYOUT = "{year}/{year}-{month}"
+# 生成缩略图的进程数（默认 CPU 核心数）
+IMAGE_WORKERS = 4
+
+# 长时间操作的进度显示：auto（终端中显示进度行）、line、json（JSON Lines）、off
+PROGRESS = "auto"
+
+# 大型操作计划在内存中保存文件名的上限（字节），超出部分写入临时文件
+PLAN_MEMORY_LIMIT = 256 * 1024 * 1024
+
+# 文件索引（python batchgenie.py index build）：不带参数时建立索引的根目录
+INDEX_ROOTS = []
+# 建立索引时的扫描线程数，是否同时读取音频/图片文件头
+INDEX_WORKERS = 16
+INDEX_METADATA = True
+# 查询前检查目录修改时间并重新扫描有变化的目录；监控常驻运行时可设为 False 完全信任索引
+INDEX_VERIFY = True
+# 设为 False 时忽略已建立的索引，总是实时扫描
+FS_INDEX = True
+
+# 打包文件时并行压缩的线程数（默认 CPU 核心数）
+ARCHIVE_WORKERS = 4
+
+# 移动/复制时每个设备同时进行的 I/O 数，可按设备类型（nvme、ssd、hdd、network、memory、unknown）
+# 或挂载点覆盖自动判断的默认值（nvme 16、ssd 8、hdd 1、network 2）
+IO_CONCURRENCY = {}
+# IO_CONCURRENCY = {"hdd": 2, "/mnt/nas": 4}
+# 移动/复制线程总数上限
+IO_MAX_WORKERS = 32
+
+# 文件夹监控的工作进程数：0 为单进程（各源文件夹在线程中处理），大于 0 时把源文件夹分配到多个进程，
+# 某个进程崩溃后自动重启并接着处理未完成的文件
+MONITOR_PROCESSES = 0
+# 多进程监控时打印各分片指标（事件/秒、队列长度、延迟）的间隔（秒），0 为只在停止时打印
+MONITOR_STATS_INTERVAL = 60
+
+# 守护进程（python batchgenie.py daemon）的监听地址、端口和工作线程数
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 8765
+DAEMON_WORKERS = 2
+# 请求需要带 X-BatchGenie-Token 请求头；不设置时每次启动随机生成并写入缓存目录下的 daemon.token，
+# 且只能监听本机地址
+# DAEMON_TOKEN = "change-me"
@@ -6,10 +6,25 @@ import time
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # 禁用 TensorFlow 日志
 logging.getLogger('absl').setLevel(logging.ERROR)  # 设置 absl 日志级别
 
+# 子命令在导入交互菜单用到的模块（AI SDK、转码、图片等）之前分派，只导入所选子命令需要的模块
+if __name__ == "__main__" and len(sys.argv) > 1:
+    if sys.argv[1] == 'batch':
+        # 无人值守的批量指令模式：python main.py batch commands.txt
+        from modules.batch_runner import main as batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+    # 非交互子命令：python main.py prefix ...（与 batchgenie.py 相同）
+    from modules.cli import main as cli_main
+    sys.exit(cli_main(sys.argv[1:]))
+
 from modules.ai_controller import interpret_and_execute
 from modules.prefix_handler import add_prefix
 from modules.converter import batch_convert
+from modules.transcoder import is_transcodable
 from modules.audio_classifier import classify_audio_files
+from modules.audio_analysis import analyze_audio_files
+from modules.duplicate_finder import find_and_resolve_duplicates
+from modules.image_organizer import organize_images, generate_thumbnails
+from modules.archiver import archive_files
 from modules.file_monitor import SmartFolderMonitor
 from modules.suffix_handler import add_suffix  # 更新导入
 from modules.undo_handler import UndoHandler  # 导入撤回处理模块
@@ -28,7 +43,11 @@ MESSAGES = {
         'menu_audio': '5. 按采样率分类音频文件',
         'menu_monitor': '6. 文件夹监控',
         'menu_undo': '7. 撤回最后一次操作',  # 新增撤回选项
-        'menu_exit': '8. 退出',
+        'menu_audio_analysis': '8. 分析音频电平（削波、静音、响度）',
+        'menu_duplicates': '9. 查找重复文件',
+        'menu_images': '10. 整理图片 / 生成缩略图',
+        'menu_archive': '11. 打包文件（zip / tar.xz）',
+        'menu_exit': '12. 退出',
         'monitoring_active': "文件夹监控已启动，监控文件类型: {}" ,
         'input_choice': '输入选项编号：',
         'input_folder': '请输入文件夹路径：',
@@ -49,6 +68,17 @@ MESSAGES = {
         'input_prefix_pattern': '请输入需要批量添加前缀的文件格式（如wav）：',
         'input_source_format': '请输入需要修改的格式（例如: .mp4）: ',  # 更新提示
         'input_target_format': '请输入目标格式（例如: .m4a）: ',  # 更新提示
+        'input_audio_layout': '请输入分类布局（可用字段 {rate} {bits} {channels} {format} {duration} {level}，如 {rate}/{bits}bit，直接回车按采样率）：',
+        'input_recursive': '是否包含子文件夹？(y/n)：',
+        'input_transcode': '是否真正转码音频（保留源文件），而不是只修改扩展名？(y/n)：',
+        'input_samplerate': '请输入目标采样率（如 48000，直接回车保持不变）：',
+        'input_bits': '请输入目标位深（16/24，直接回车保持不变）：',
+        'input_image_action': '1. 按拍摄日期、相机或尺寸整理图片\n2. 生成缩略图\n请选择：',
+        'input_image_layout': '请输入整理布局（可用字段 {year} {month} {day} {camera} {orientation} {megapixels} {format}，直接回车按 {year}/{year}-{month}）：',
+        'input_thumbnail_size': '请输入缩略图最长边像素（直接回车为 256）：',
+        'input_duplicate_action': '请选择处理方式（report 仅列出 / delete 删除 / hardlink 替换为硬链接 / move 移动，直接回车仅列出）：',
+        'input_archive_path': '请输入压缩包路径（以 .zip 或 .tar.xz 结尾）：',
+        'input_delete_after': '校验通过后是否删除源文件？(y/n)：',
 
     },
     'en': {
@@ -62,7 +92,12 @@ MESSAGES = {
         'menu_ai': '4. Use AI Model for Natural Language Commands',
         'menu_audio': '5. Classify Audio Files by Sample Rate',
         'menu_monitor': '6. Folder Monitor',
-        'menu_exit': '7. Exit',
+        'menu_undo': '7. Undo Last Operation',  # 新增撤回选项
+        'menu_audio_analysis': '8. Analyze Audio Levels (clipping, silence, loudness)',
+        'menu_duplicates': '9. Find Duplicate Files',
+        'menu_images': '10. Organize Images / Generate Thumbnails',
+        'menu_archive': '11. Archive Files (zip / tar.xz)',
+        'menu_exit': '12. Exit',
         'monitoring_active': "Folder monitoring is active, monitoring file types: {}",
         'input_choice': 'Enter option number: ',
         'input_folder': 'Enter folder path: ',
@@ -83,7 +118,17 @@ MESSAGES = {
         'input_prefix_pattern': 'Enter the file pattern (e.g., *.wav): ',
         'input_source_format': 'Enter source format (e.g., .mp4): ',  # 更新提示
         'input_target_format': 'Enter target format (e.g., .m4a): ',  # 更新提示
-        'menu_undo': '8. Undo Last Operation',  # 新增撤回选项
+        'input_audio_layout': 'Enter folder layout (fields {rate} {bits} {channels} {format} {duration} {level}, e.g. {rate}/{bits}bit; press Enter for sample rate only): ',
+        'input_recursive': 'Include subfolders? (y/n): ',
+        'input_transcode': 'Transcode the audio (keeping the originals) instead of only renaming the extension? (y/n): ',
+        'input_samplerate': 'Enter target sample rate (e.g. 48000, press Enter to keep): ',
+        'input_bits': 'Enter target bit depth (16/24, press Enter to keep): ',
+        'input_image_action': '1. Organize images by date, camera or size\n2. Generate thumbnails\nChoose: ',
+        'input_image_layout': 'Enter layout (fields {year} {month} {day} {camera} {orientation} {megapixels} {format}; press Enter for {year}/{year}-{month}): ',
+        'input_thumbnail_size': 'Enter the longest thumbnail side in pixels (press Enter for 256): ',
+        'input_duplicate_action': 'Choose an action (report / delete / hardlink / move, press Enter to report only): ',
+        'input_archive_path': 'Enter the archive path (ending in .zip or .tar.xz): ',
+        'input_delete_after': 'Delete the source files after the archive is verified? (y/n): ',
     }
 }
 
@@ -113,6 +158,27 @@ def handle_suffix(msg, lang):
     if add_suffix(folder_path, file_extension, suffix, lang):
         print(msg['operation_complete'])
 
+def handle_images(msg, lang, undo_handler):
+    """处理图片整理和缩略图生成"""
+    action = input(msg['input_image_action']).strip()
+    folder_path = input(msg['input_folder']).strip()
+    recursive = input(msg['input_recursive']).strip().lower() == 'y'
+    if action == '1':
+        layout = input(msg['input_image_layout']).strip() or None
+        moved = organize_images(folder_path, layout, recursive, lang)
+        if moved:
+            print(msg['operation_complete'])
+            undo_handler.record_operation('move_files', moved)  # 记录操作
+    elif action == '2':
+        size = input(msg['input_thumbnail_size']).strip()
+        created = generate_thumbnails(folder_path, max_size=int(size) if size else 256,
+                                      recursive=recursive, lang=lang)
+        if created:
+            print(msg['operation_complete'])
+            undo_handler.record_operation('created_files', created)  # 记录操作
+    else:
+        print(msg['invalid_option'])
+
 def handle_monitor(msg, lang):
     """处理文件夹监控操作"""
     source_roots = input(msg['input_source_roots']).split(',')
@@ -150,6 +216,10 @@ def main(lang='zh'):
         print(msg['menu_audio'])  # 按采样率分类音频文件
         print(msg['menu_monitor'])  # 文件夹监控
         print(msg["menu_undo"])  # 新增撤回选项
+        print(msg['menu_audio_analysis'])  # 音频电平分析
+        print(msg['menu_duplicates'])  # 查找重复文件
+        print(msg['menu_images'])  # 图片整理与缩略图
+        print(msg['menu_archive'])  # 打包文件
         print(msg['menu_exit'])  # 退出
         
         try:
@@ -177,7 +247,16 @@ def main(lang='zh'):
                     original_extension = '.' + original_extension  # 确保原始扩展名以点开头
                 if not new_extension.startswith('.'):
                     new_extension = '.' + new_extension  # 确保目标扩展名以点开头
-                if batch_convert(folder_path, original_extension, new_extension, lang):  # 传递原始和目标扩展名
+                if is_transcodable(original_extension, new_extension) and \
+                        input(msg['input_transcode']).strip().lower() == 'y':
+                    # 真正转码：生成新文件，源文件保留，不需要记录撤回
+                    samplerate = input(msg['input_samplerate']).strip()
+                    bits = input(msg['input_bits']).strip()
+                    if batch_convert(folder_path, original_extension, new_extension, lang, transcode=True,
+                                     samplerate=int(samplerate) if samplerate else None,
+                                     bits=int(bits) if bits else None):
+                        print(msg['operation_complete'])
+                elif batch_convert(folder_path, original_extension, new_extension, lang):  # 传递原始和目标扩展名
                     print(msg['operation_complete'])
                     undo_handler.record_operation('rename_format', (folder_path, new_extension, original_extension))  # 记录操作
             elif choice == 4:  # AI 命令
@@ -185,12 +264,31 @@ def main(lang='zh'):
                 interpret_and_execute(command, lang)
             elif choice == 5:  # 音频分类
                 folder_path = input(msg['input_folder'])
-                classify_audio_files(folder_path, lang)
+                layout = input(msg['input_audio_layout']).strip() or None
+                recursive = input(msg['input_recursive']).strip().lower() == 'y'
+                classify_audio_files(folder_path, lang, layout=layout, recursive=recursive)
             elif choice == 6:  # 监控
                 handle_monitor(msg, lang)
             elif choice == 7:  # 撤回最后一次操作
                 undo_handler.undo_last_operation()
-            elif choice == 8:  # 退出
+            elif choice == 8:  # 音频电平分析
+                folder_path = input(msg['input_folder'])
+                recursive = input(msg['input_recursive']).strip().lower() == 'y'
+                analyze_audio_files(folder_path, lang, recursive=recursive)
+            elif choice == 9:  # 查找重复文件
+                folder_path = input(msg['input_folder'])
+                action = input(msg['input_duplicate_action']).strip().lower() or 'report'
+                target_dir = input(msg['input_target_root']).strip() if action == 'move' else None
+                find_and_resolve_duplicates(folder_path, action, lang, target_dir)
+            elif choice == 10:  # 图片整理与缩略图
+                handle_images(msg, lang, undo_handler)
+            elif choice == 11:  # 打包文件
+                files = [f.strip() for f in input(msg['input_files']).split(',') if f.strip()]
+                archive_path = input(msg['input_archive_path']).strip()
+                delete_after = input(msg['input_delete_after']).strip().lower() == 'y'
+                if archive_files(files, archive_path, lang, delete_after=delete_after):
+                    print(msg['operation_complete'])
+            elif choice == 12:  # 退出
                 print(msg['goodbye'])
                 break
             else:
@@ -2,25 +2,26 @@
 import os
 import json
 import time
-import shutil
 from pathlib import Path
 from tenacity import retry, stop_after_attempt, wait_exponential
-import google.generativeai as genai
 from modules.renamer import batch_rename
 from modules.converter import batch_convert
-from config import GEMINI_API_KEY
 import glob
 from .prefix_handler import add_prefix
 from .file_transfer import batch_move, batch_copy
 from .file_monitor import SmartFolderMonitor  # 只导入新的监控类
+from .monitor_supervisor import MonitorSupervisor
 from .file_handler import batch_delete  # 添加导入
 from .suffix_handler import add_suffix  # 确保导入了 add_suffix
-
-# 配置 Gemini
-genai.configure(api_key=GEMINI_API_KEY)
-
-# 获取模型
-model = genai.GenerativeModel('gemini-pro')
+from .operation_batch import FileOperationBatch
+from .plan_store import FileOperation, PlanStore
+from .path_prefetch import PathPrefetcher
+from .pattern_expander import pattern_root, expand_patterns
+from .model_backend import get_backend, REQUEST_MARKER
+from .profiler import span
+from .archiver import archive_files
+from .file_filter import compile_filter
+from utils import get_config_value
 
 # 获取当前用户的主目录
 USER_HOME = Path.home()
@@ -29,6 +30,9 @@ MUSIC_PATH = USER_HOME / "Music"
 PICTURES_PATH = USER_HOME / "Pictures"
 DESKTOP_PATH = USER_HOME / "Desktop"
 
+# 解析出计划后，等待计划用到的目录预取完成的最长时间（秒）；超时后照常实时扫描
+PREFETCH_WAIT_TIMEOUT = 2
+
 MESSAGES = {
     'zh': {
         'connecting': "正在连接 AI 服务...",
@@ -54,7 +58,8 @@ MESSAGES = {
         'file_types': "文件类型: {}",
         'monitoring_active': "所有监控器已启动，按 Ctrl+C 停止...",
         'monitoring_stopped': "所有监控器已停止",
-        'paths_not_exist': "以下路径不存在：\n{}\n请检查路径是否正确。"
+        'paths_not_exist': "以下路径不存在：\n{}\n请检查路径是否正确。",
+        'invalid_filter': "无效的筛选条件: {}"
     },
     'en': {
         'connecting': "Connecting to AI service...",
@@ -80,70 +85,11 @@ MESSAGES = {
         'file_types': "File types: {}",
         'monitoring_active': "All monitors are active, press Ctrl+C to stop...",
         'monitoring_stopped': "All monitors have been stopped",
-        'paths_not_exist': "The following paths do not exist:\n{}\nPlease check if the paths are correct."
+        'paths_not_exist': "The following paths do not exist:\n{}\nPlease check if the paths are correct.",
+        'invalid_filter': "Invalid filter expression: {}"
     }
 }
 
-class FileOperation:
-    def __init__(self, operation_type, source_path, target_path=None, parameters=None):
-        self.type = operation_type  # rename, move, delete, copy, create_dir, create_file 等
-        self.source_path = Path(source_path)
-        self.target_path = Path(target_path) if target_path else None
-        self.parameters = parameters or {}
-
-    def preview(self):
-        """返回此操作将影响的文件列表"""
-        affected_files = []
-        try:
-            if self.type == "rename":
-                affected_files.append(f"{self.source_path} -> {self.target_path}")
-            elif self.type == "move":
-                affected_files.append(f"移动: {self.source_path} -> {self.target_path}")
-            elif self.type == "copy":
-                affected_files.append(f"复制: {self.source_path} -> {self.target_path}")
-            elif self.type == "delete":
-                affected_files.append(f"删除: {self.source_path}")
-            elif self.type == "create_dir":
-                affected_files.append(f"创建目录: {self.source_path}")
-            elif self.type == "create_file":
-                affected_files.append(f"创建文件: {self.source_path}")
-                if self.parameters.get('content'):
-                    affected_files.append(f"文件内容: {self.parameters['content'][:100]}...")
-        except Exception as e:
-            affected_files.append(f"预览错误: {str(e)}")
-        return affected_files
-
-    def execute(self):
-        """执行文件操作"""
-        try:
-            if self.type == "rename":
-                self.source_path.rename(self.target_path)
-            elif self.type == "move":
-                shutil.move(str(self.source_path), str(self.target_path))
-            elif self.type == "copy":
-                shutil.copy2(str(self.source_path), str(self.target_path))
-            elif self.type == "delete":
-                if self.source_path.is_file():
-                    self.source_path.unlink()
-                else:
-                    shutil.rmtree(str(self.source_path))
-            elif self.type == "create_dir":
-                self.source_path.mkdir(parents=True, exist_ok=True)
-            elif self.type == "create_file":
-                # 确保父目录存在
-                self.source_path.parent.mkdir(parents=True, exist_ok=True)
-                # 创建文件并写入内容
-                mode = 'w' if isinstance(self.parameters.get('content', ''), str) else 'wb'
-                with open(self.source_path, mode, encoding='utf-8' if mode == 'w' else None) as f:
-                    if self.parameters.get('content'):
-                        f.write(self.parameters['content'])
-                    else:
-                        f.write('')  # 创建空文件
-            return True
-        except Exception as e:
-            print(f"执行错误: {str(e)}")
-            return False
-
 def replace_placeholders(prompt):
     """替换用户目录的占位符为实际路径"""
     prompt = prompt.replace("桌面", str(DESKTOP_PATH))
@@ -228,17 +174,51 @@ def get_ai_response(prompt, lang='zh'):
             ]
         }}
 
+        8. 批量执行多个具体文件操作（type 可选 rename、move、copy、delete、create_dir、create_file）：
+        {{
+            "operation": "batch",
+            "operations": [
+                {{"type": "rename", "source": "C:/path/a.txt", "target": "C:/path/b.txt"}},
+                {{"type": "create_dir", "source": "C:/path/new_folder"}},
+                {{"type": "create_file", "source": "C:/path/new_folder/readme.txt", "content": "Hello"}}
+            ]
+        }}
+
+        9. 把文件打包为压缩包（支持 .zip 和 .tar.xz，delete_after 为 true 时校验通过后删除源文件）：
+        {{
+            "operation": "archive",
+            "files": [
+                "C:/Users/username/Music/*.wav"
+            ],
+            "archive_path": "C:/Users/username/Backup/music.tar.xz",
+            "delete_after": false
+        }}
+
+        10. 按大小、时间或音频属性筛选（add_prefix、add_suffix、move、copy、delete、archive、smart_monitor 可加 where 字段）：
+        {{
+            "operation": "delete",
+            "files": [
+                "C:/Users/username/Music/**/*.wav"
+            ],
+            "where": "size > 1G and age > 30d"
+        }}
+        where 支持 size、mtime、ctime、age、ext、name、type、samplerate、channels、bits、duration、format 字段，
+        比较符 == != < <= > >= ~（正则）以及 in (...)，可用 and、or、not 和括号组合，
+        例如 "ext in (wav, flac) and samplerate >= 96k"、"name ~ '^take[0-9]+' and mtime >= 2024-01-01"
+
         注意：
         1. 对于批量操作，请使用通配符（如 *.txt）来匹配文件
         2. 确保返回的是标准的 JSON 格式
         3. 路径中的反斜杠需要使用正斜杠替代
         4. 添加前缀和后缀操作的参数需要明确指定
+        5. 只有用户提到大小、时间或音频属性等条件时才添加 where
 
-        用户的请求是: {prompt}"""
+        {REQUEST_MARKER}{prompt}"""
 
         # 这里是与 AI 交互的逻辑
-        response = model.generate_content(system_prompt)
-        return response.text.strip()  # 返回 AI 的响应
+        with span('ai.generate'):
+            response = get_backend().generate(system_prompt)
+        return response.strip()  # 返回 AI 的响应
 
     except Exception as e:
         print(f"获取 AI 响应时出错: {str(e)}")
@@ -248,14 +228,264 @@ def _normalize_path(path):
     """规范化路径字符串，处理空格和斜杠问题"""
     # 替换所有反斜杠为正斜杠
     path = path.replace('\\', '/')
-    # 移除多余的正斜杠
-    path = '/'.join(filter(None, path.split('/')))
+    # 移除多余的正斜杠（保留开头的根目录斜杠）
+    root = '/' if path.startswith('/') else ''
+    path = root + '/'.join(filter(None, path.split('/')))
     # 转换回系统路径格式
     return os.path.normpath(path)
 
+def parse_ai_response(response):
+    """把 AI 返回的文本解析为操作字典
+
+    Args:
+        response (str): AI 响应文本（允许包含 ```json 代码块标记）
+
+    Returns:
+        dict: 操作描述
+
+    Raises:
+        json.JSONDecodeError: 响应不是合法 JSON
+        ValueError: 响应为空或不是 JSON 对象
+    """
+    if not response:
+        raise ValueError("AI 响应为空")
+    text = response.strip()
+    if text.startswith('```'):
+        # 去掉 Markdown 代码块标记
+        text = text.split('\n', 1)[1] if '\n' in text else ''
+        text = text.rsplit('```', 1)[0]
+    result = json.loads(text)
+    if not isinstance(result, dict):
+        raise ValueError("AI 响应不是 JSON 对象")
+    return result
+
+def plan_paths(result):
+    """返回操作涉及的路径（通配符模式取其字面根目录），用于判断操作之间是否冲突
+
+    Args:
+        result (dict): parse_ai_response 返回的操作描述
+
+    Returns:
+        list: 路径列表
+    """
+    paths = []
+    for key in ('folder_path', 'target_dir', 'target_root', 'archive_path'):
+        if result.get(key):
+            paths.append(result[key])
+    paths.extend(result.get('files', []))
+    paths.extend(result.get('source_roots', []))
+    params = result.get('params')
+    if isinstance(params, list) and params:
+        paths.append(params[0])
+    for item in result.get('operations', []):
+        paths.extend(item[key] for key in ('source', 'target') if item.get(key))
+    return [pattern_root(_normalize_path(str(path))) for path in paths]
+
+def _plan_store(result):
+    """把 batch 计划中的操作直接写入紧凑的 PlanStore（不为每个操作创建对象）"""
+    operations = PlanStore()
+    for item in result.get('operations', []):
+        if item.get('source'):
+            operations.append(
+                item.get('type'),
+                _normalize_path(item['source']),
+                _normalize_path(item['target']) if item.get('target') else None,
+                {'content': item['content']} if 'content' in item else None
+            )
+    return operations
+
+def preview_plan(result, lang='zh'):
+    """列出操作将影响的文件，不执行任何修改
+
+    Args:
+        result (dict): parse_ai_response 返回的操作描述
+        lang (str): 语言选项
+
+    Returns:
+        list: 预览行列表
+    """
+    operation = result.get('operation')
+    affected_files = []
+    try:
+        where = compile_filter(result.get('where'))
+    except ValueError as e:
+        print(MESSAGES[lang]['invalid_filter'].format(str(e)))
+        return affected_files
+    if operation in ('add_prefix', 'add_suffix'):
+        folder_path = os.path.normpath(result.get('folder_path', ''))
+        pattern = os.path.join(glob.escape(folder_path), f"*.{result.get('file_extension', '')}")
+        for file_path in expand_patterns([pattern], recursive=False, where=where):
+            if operation == 'add_prefix':
+                new_path = os.path.join(folder_path, result.get('prefix', '') + os.path.basename(file_path))
+            else:
+                base, ext = os.path.splitext(file_path)
+                new_path = base + result.get('suffix', '') + ext
+            affected_files.append(f"{file_path} -> {new_path}")
+    elif operation in ('move', 'copy'):
+        target_dir = result.get('target_dir', '')
+        for file_path in expand_patterns((_normalize_path(f) for f in result.get('files', [])), where=where):
+            affected_files.append(f"{file_path} -> {os.path.join(target_dir, os.path.basename(file_path))}")
+    elif operation == 'delete':
+        affected_files.extend(expand_patterns((_normalize_path(f) for f in result.get('files', [])), where=where))
+    elif operation == 'archive':
+        archive_path = result.get('archive_path', '')
+        for file_path in expand_patterns((_normalize_path(f) for f in result.get('files', [])), where=where):
+            affected_files.append(f"{file_path} -> {archive_path}")
+    elif operation == 'batch':
+        affected_files.extend(FileOperationBatch(_plan_store(result), lang=lang).iter_preview())
+    elif operation == 'smart_monitor':
+        affected_files.extend(result.get('source_roots', []))
+    return affected_files
+
+def execute_plan(result, lang='zh', confirm=True):
+    """执行解析后的 AI 操作
+
+    Args:
+        result (dict): parse_ai_response 返回的操作描述
+        lang (str): 语言选项
+        confirm (bool): 执行前是否需要用户确认
+
+    Returns:
+        bool: 操作是否成功
+    """
+    msg = MESSAGES[lang]
+    # 获取操作类型和参数
+    operation = result.get('operation')
+    try:
+        where = compile_filter(result.get('where'))
+    except ValueError as e:
+        print(msg['invalid_filter'].format(str(e)))
+        return False
+    
+    if operation == 'add_prefix':
+        folder_path = result.get('folder_path')
+        file_extension = result.get('file_extension')
+        prefix = result.get('prefix')
+        if not folder_path or not file_extension or not prefix:
+            print(msg['invalid_params'])
+            return False
+        if not add_prefix(folder_path, file_extension, prefix, lang, confirm=confirm, where=where):
+            print(msg['operation_failed'].format(operation))
+            return False
+    
+    elif operation == 'add_suffix':  # 添加对批量添加后缀的支持
+        folder_path = result.get('folder_path')
+        file_extension = result.get('file_extension')
+        suffix = result.get('suffix')
+        if not folder_path or not file_extension or not suffix:
+            print(msg['invalid_params'])
+            return False
+        if not add_suffix(folder_path, file_extension, suffix, lang, confirm=confirm, where=where):
+            print(msg['operation_failed'].format(operation))
+            return False
+    
+    elif operation == 'smart_monitor':
+        # 获取并规范化监控参数
+        source_roots = [_normalize_path(src) for src in result.get('source_roots', [])]
+        target_root = _normalize_path(result.get('target_root', ''))
+        file_types = result.get('file_types', ['.wav'])
+        
+        if not source_roots or not target_root:
+            print(msg['invalid_params'])
+            return False
+        
+        # 验证所有路径是否存在
+        invalid_paths = []
+        for src in source_roots:
+            if not os.path.exists(src):
+                invalid_paths.append(src)
+        
+        if invalid_paths:
+            print(msg['paths_not_exist'].format('\n'.join(f"- {p}" for p in invalid_paths)))
+            return False
+        
+        # 显示监控设置
+        print(msg['monitor_settings'])
+        print(msg['source_roots'].format('\n'.join(f"- {src}" for src in source_roots)))
+        print(msg['target_root'].format(target_root))
+        print(msg['file_types'].format(', '.join(file_types)))
+        
+        # 创建多个监控器（配置了 MONITOR_PROCESSES 时由一个多进程监督器统一管理）
+        monitors = []
+        if get_config_value('MONITOR_PROCESSES', 0):
+            monitors.append(MonitorSupervisor(source_roots, target_root, file_types, lang, where=where))
+        else:
+            for source_root in source_roots:
+                monitor = SmartFolderMonitor(
+                    source_root,
+                    target_root,
+                    file_types,
+                    lang,
+                    where=where
+                )
+                monitors.append(monitor)
+        
+        # 启动所有监控器
+        for monitor in monitors:
+            monitor.start()
+        
+        print(msg['monitoring_active'])
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            for monitor in monitors:
+                monitor.stop()
+            print(msg['monitoring_stopped'])
+    elif operation == 'move':
+        if not batch_move(result.get('files', []), result.get('target_dir'), lang, where=where):
+            print(msg['operation_failed'].format(operation))
+            return False
+    elif operation == 'copy':
+        if not batch_copy(result.get('files', []), result.get('target_dir'), lang, where=where):
+            print(msg['operation_failed'].format(operation))
+            return False
+    elif operation == 'delete':
+        files = result.get('files', [])
+        if not files:
+            print(msg['invalid_params'])
+            return False
+        if not batch_delete(files, lang, confirm=confirm, where=where):
+            print(msg['operation_failed'].format(operation))
+            return False
+    elif operation == 'archive':
+        files = result.get('files', [])
+        if not files or not result.get('archive_path'):
+            print(msg['invalid_params'])
+            return False
+        if not archive_files([_normalize_path(f) for f in files], _normalize_path(result['archive_path']), lang,
+                             delete_after=bool(result.get('delete_after')), confirm=confirm, where=where):
+            print(msg['operation_failed'].format(operation))
+            return False
+    elif operation == 'batch':
+        operations = _plan_store(result)
+        if not len(operations):
+            print(msg['invalid_params'])
+            return False
+        batch = FileOperationBatch(operations, lang=lang)
+        print(msg['affected_files'])
+        for line in batch.iter_preview():
+            print(line)
+        if confirm and input(msg['confirm_execute']).lower() != 'y':
+            print(msg['operation_cancelled'])
+            return False
+        results = batch.execute()
+        if not any(r.status == 'ok' for r in results):
+            print(msg['operation_failed'].format(operation))
+            return False
+    else:
+        print(msg['invalid_operation'].format(operation))
+        return False
+        
+    print(msg['operation_completed'])
+    return True
+
 def interpret_and_execute(prompt, lang='zh'):
     """解析并执行自然语言命令"""
     msg = MESSAGES[lang]
+    # 在等待 AI 响应期间预取指令中提到的目录
+    prompt = replace_placeholders(prompt)
+    prefetcher = PathPrefetcher().start(prompt)
     try:
         print(msg['connecting'])
         
@@ -264,110 +494,20 @@ def interpret_and_execute(prompt, lang='zh'):
         
         try:
             # 解析 AI 响应
-            result = json.loads(response)
-            
-            # 获取操作类型和参数
-            operation = result.get('operation')
-            
-            if operation == 'add_prefix':
-                folder_path = result.get('folder_path')
-                file_extension = result.get('file_extension')
-                prefix = result.get('prefix')
-                if not folder_path or not file_extension or not prefix:
-                    print(msg['invalid_params'])
-                    return
-                if not add_prefix(folder_path, file_extension, prefix, lang):
-                    print(msg['operation_failed'].format(operation))
-                    return
-            
-            elif operation == 'add_suffix':  # 添加对批量添加后缀的支持
-                folder_path = result.get('folder_path')
-                file_extension = result.get('file_extension')
-                suffix = result.get('suffix')
-                if not folder_path or not file_extension or not suffix:
-                    print(msg['invalid_params'])
-                    return
-                if not add_suffix(folder_path, file_extension, suffix, lang):
-                    print(msg['operation_failed'].format(operation))
-                    return
-            
-            elif operation == 'smart_monitor':
-                # 获取并规范化监控参数
-                source_roots = [_normalize_path(src) for src in result.get('source_roots', [])]
-                target_root = _normalize_path(result.get('target_root', ''))
-                file_types = result.get('file_types', ['.wav'])
-                
-                if not source_roots or not target_root:
-                    print(msg['invalid_params'])
-                    return
-                
-                # 验证所有路径是否存在
-                invalid_paths = []
-                for src in source_roots:
-                    if not os.path.exists(src):
-                        invalid_paths.append(src)
-                
-                if invalid_paths:
-                    print(msg['paths_not_exist'].format('\n'.join(f"- {p}" for p in invalid_paths)))
-                    return
-                
-                # 显示监控设置
-                print(msg['monitor_settings'])
-                print(msg['source_roots'].format('\n'.join(f"- {src}" for src in source_roots)))
-                print(msg['target_root'].format(target_root))
-                print(msg['file_types'].format(', '.join(file_types)))
-                
-                # 创建多个监控器
-                monitors = []
-                for source_root in source_roots:
-                    monitor = SmartFolderMonitor(
-                        source_root,
-                        target_root,
-                        file_types,
-                        lang
-                    )
-                    monitors.append(monitor)
-                
-                # 启动所有监控器
-                for monitor in monitors:
-                    monitor.start()
-                
-                print(msg['monitoring_active'])
-                try:
-                    while True:
-                        time.sleep(1)
-                except KeyboardInterrupt:
-                    for monitor in monitors:
-                        monitor.stop()
-                    print(msg['monitoring_stopped'])
-            elif operation == 'move':
-                if not batch_move(result.get('files', []), result.get('target_dir'), lang):
-                    print(msg['operation_failed'].format(operation))
-                    return
-            elif operation == 'copy':
-                if not batch_copy(result.get('files', []), result.get('target_dir'), lang):
-                    print(msg['operation_failed'].format(operation))
-                    return
-            elif operation == 'delete':
-                files = result.get('files', [])
-                if not files:
-                    print(msg['invalid_params'])
-                    return
-                if not batch_delete(files, lang):
-                    print(msg['operation_failed'].format(operation))
-                    return
-            else:
-                print(msg['invalid_operation'].format(operation))
-                return
-                
-            print(msg['operation_completed'])
-            
-        except json.JSONDecodeError as e:
+            result = parse_ai_response(response)
+        except (json.JSONDecodeError, ValueError) as e:
             print(f"AI 响应解析失败: {str(e)}")
             print(f"原始响应: {response}")
+            return
+        # 只短暂等待计划实际用到的目录的预取，其余的预取不再等待
+        prefetcher.wait(timeout=PREFETCH_WAIT_TIMEOUT, roots=plan_paths(result))
+        
+        execute_plan(result, lang)
             
     except Exception as e:
         print(msg['processing_error'].format(str(e)))
+    finally:
+        prefetcher.stop()
 
 def process_files(files, operation, prefix=''):
     """处理文件操作"""
@@ -0,0 +1,385 @@
+import os
+import io
+import glob
+import lzma
+import time
+import zlib
+import struct
+import tarfile
+import zipfile
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from utils import get_config_value
+from .pattern_expander import expand_patterns
+from .file_handler import batch_delete
+from .progress import Progress
+
+MESSAGES = {
+    'zh': {
+        'no_files': "没有找到匹配的文件",
+        'unsupported_format': "不支持的压缩格式: {}（支持 .zip、.tar.xz）",
+        'archive_exists': "压缩包已存在: {}",
+        'preview': "以下 {} 个文件（{}）将被打包到 {}：",
+        'confirm': "\n确认打包吗？(y/n): ",
+        'cancelled': "打包操作已取消",
+        'adding': "正在添加: {}",
+        'archived': "打包完成：{} 个文件，{} -> {}（{:.1%}），用时 {:.1f} 秒",
+        'verifying': "正在校验压缩包...",
+        'verify_failed': "压缩包校验失败，不会删除源文件: {}",
+        'verified': "压缩包校验通过",
+        'error': "打包时出错: {}"
+    },
+    'en': {
+        'no_files': "No matching files found",
+        'unsupported_format': "Unsupported archive format: {} (supported: .zip, .tar.xz)",
+        'archive_exists': "Archive already exists: {}",
+        'preview': "The following {} files ({}) will be packed into {}:",
+        'confirm': "\nProceed with archiving? (y/n): ",
+        'cancelled': "Archive operation cancelled",
+        'adding': "Adding: {}",
+        'archived': "Archive complete: {} files, {} -> {} ({:.1%}) in {:.1f}s",
+        'verifying': "Verifying archive...",
+        'verify_failed': "Archive verification failed, source files are kept: {}",
+        'verified': "Archive verified",
+        'error': "Error while archiving: {}"
+    }
+}
+
+# 每个并行压缩块的大小；同时在处理中的块数不超过 线程数 × 2，内存占用有上限
+ZIP_CHUNK = 1024 * 1024
+XZ_BLOCK = 8 * 1024 * 1024
+# deflate 的历史窗口，分块压缩时用上一块末尾的这么多字节作为预设字典
+DEFLATE_WINDOW = 32 * 1024
+ZIP64_LIMIT = 0xFFFFFFFF
+
+
+def archive_format(archive_path):
+    """根据扩展名确定压缩格式，返回 'zip'、'tar.xz' 或 None"""
+    lower = archive_path.lower()
+    if lower.endswith('.zip'):
+        return 'zip'
+    if lower.endswith(('.tar.xz', '.txz')):
+        return 'tar.xz'
+    return None
+
+
+def _ordered(executor, jobs, max_pending):
+    """按提交顺序返回结果，同时最多有 max_pending 个任务在执行（读取与压缩重叠进行）"""
+    pending = collections.deque()
+    for func, args in jobs:
+        pending.append(executor.submit(func, *args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _deflate_chunk(data, zdict, final, level):
+    """独立压缩一块数据；非最后一块以同步刷新结束，拼接后仍是合法的 deflate 流"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY,
+                                  **({'zdict': zdict} if zdict else {}))
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def _dos_time(timestamp):
+    t = time.localtime(max(timestamp, 315532800))  # zip 时间从 1980 年开始
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+class ParallelZipWriter:
+    """并行压缩的 zip 写入器
+
+    大文件切成 ZIP_CHUNK 大小的块，各块以上一块末尾 32KB 为预设字典独立压缩（与 pigz 相同的做法），
+    多个块在线程池中同时压缩（zlib 会释放 GIL），主线程按顺序读取下一块并写出已完成的块。
+    本地文件头先写占位，数据写完后回填 CRC 和大小；超过 4GB 的文件和偏移使用 ZIP64 扩展。
+    """
+
+    def __init__(self, path, level=6, max_workers=None):
+        self.file = open(path, 'wb')
+        self.level = level
+        self.max_workers = max_workers or get_config_value('ARCHIVE_WORKERS', os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.entries = []
+
+    def _chunks(self, path):
+        """顺序读取文件，生成压缩任务（读取下一块时前面的块正在压缩）"""
+        with open(path, 'rb') as f:
+            data = f.read(ZIP_CHUNK)
+            zdict = b''
+            while True:
+                following = f.read(ZIP_CHUNK) if data else b''
+                yield data, (_deflate_chunk, (data, zdict, not following, self.level))
+                if not following:
+                    return
+                zdict = data[-DEFLATE_WINDOW:]
+                data = following
+
+    def add(self, path, arcname):
+        st = os.stat(path)
+        name = arcname.replace(os.sep, '/').encode('utf-8')
+        zip64 = st.st_size >= ZIP64_LIMIT - ZIP_CHUNK
+        offset = self.file.tell()
+        dos_time, dos_date = _dos_time(st.st_mtime)
+        extra = struct.pack('<HHQQ', 1, 16, 0, 0) if zip64 else b''
+        version = 45 if zip64 else 20
+        header = struct.pack('<IHHHHHIIIHH', 0x04034b50, version, 0x0800, 8, dos_time, dos_date,
+                             0, 0, 0, len(name), len(extra))
+        self.file.write(header + name + extra)
+
+        crc = 0
+        size = compressed = 0
+        chunks = self._chunks(path)
+        raw = collections.deque()
+
+        def jobs():
+            for data, job in chunks:
+                raw.append(data)
+                yield job
+
+        for block in _ordered(self.executor, jobs(), self.max_workers * 2):
+            data = raw.popleft()
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+            compressed += len(block)
+            self.file.write(block)
+
+        # 回填 CRC 和大小
+        end = self.file.tell()
+        self.file.seek(offset + 14)
+        if zip64:
+            self.file.write(struct.pack('<III', crc, ZIP64_LIMIT, ZIP64_LIMIT))
+            self.file.seek(offset + 30 + len(name) + 4)
+            self.file.write(struct.pack('<QQ', size, compressed))
+        else:
+            self.file.write(struct.pack('<III', crc, compressed, size))
+        self.file.seek(end)
+        self.entries.append((name, crc, size, compressed, offset, dos_time, dos_date,
+                             st.st_mode & 0xFFFF))
+        return size, compressed
+
+    def close(self):
+        self.executor.shutdown()
+        start = self.file.tell()
+        for name, crc, size, compressed, offset, dos_time, dos_date, mode in self.entries:
+            values = []
+            if size >= ZIP64_LIMIT or compressed >= ZIP64_LIMIT or offset >= ZIP64_LIMIT:
+                values = [size, compressed, offset]
+            extra = struct.pack('<HH', 1, 8 * len(values)) + struct.pack(f'<{len(values)}Q', *values) \
+                if values else b''
+            self.file.write(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | 45, 45 if values else 20, 0x0800, 8,
+                dos_time, dos_date, crc,
+                ZIP64_LIMIT if values else compressed, ZIP64_LIMIT if values else size,
+                len(name), len(extra), 0, 0, 0, mode << 16, ZIP64_LIMIT if values else offset
+            ) + name + extra)
+        end = self.file.tell()
+        count = len(self.entries)
+        if count >= 0xFFFF or start >= ZIP64_LIMIT or end - start >= ZIP64_LIMIT:
+            # ZIP64 中央目录结束记录和定位器
+            self.file.write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0,
+                                        count, count, end - start, start))
+            self.file.write(struct.pack('<IIQI', 0x07064b50, 0, end, 1))
+            self.file.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, 0xFFFF, 0xFFFF,
+                                        ZIP64_LIMIT, ZIP64_LIMIT, 0))
+        else:
+            self.file.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, count, count,
+                                        end - start, start, 0))
+        self.file.close()
+
+
+class ParallelXZWriter(io.RawIOBase):
+    """并行压缩的 .xz 输出流
+
+    写入的数据按 XZ_BLOCK 切块，每块在线程池中独立压缩为一个完整的 xz 流（lzma 会释放 GIL）；
+    多个 xz 流首尾相接仍是合法的 .xz 文件，xz 工具和 Python 的 lzma 模块都能直接解压。
+    """
+
+    def __init__(self, path, preset=6, max_workers=None):
+        self.file = open(path, 'wb')
+        self.preset = preset
+        self.max_workers = max_workers or get_config_value('ARCHIVE_WORKERS', os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.pending = collections.deque()
+        self.buffer = bytearray()
+        self.compressed = 0
+
+    def writable(self):
+        return True
+
+    def _submit(self, data):
+        self.pending.append(self.executor.submit(lzma.compress, data, format=lzma.FORMAT_XZ, preset=self.preset))
+        while len(self.pending) > self.max_workers * 2:
+            self._drain_one()
+
+    def _drain_one(self):
+        block = self.pending.popleft().result()
+        self.compressed += len(block)
+        self.file.write(block)
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= XZ_BLOCK:
+            self._submit(bytes(self.buffer[:XZ_BLOCK]))
+            del self.buffer[:XZ_BLOCK]
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        if self.buffer:
+            self._submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        while self.pending:
+            self._drain_one()
+        self.executor.shutdown()
+        self.file.close()
+        super().close()
+
+
+def _arcnames(files):
+    """以所有文件的公共上级目录为根计算压缩包内的路径"""
+    paths = [os.path.abspath(f) for f in files]
+    try:
+        root = os.path.commonpath([os.path.dirname(p) for p in paths])
+    except ValueError:
+        # Windows 上文件位于不同盘符时没有公共目录，去掉盘符保留完整路径
+        return [os.path.splitdrive(p)[1].lstrip('\\/') for p in paths]
+    return [os.path.relpath(p, root) for p in paths]
+
+
+def verify_archive(archive_path, files, arcnames):
+    """完整读取压缩包校验每个成员（zip 检查 CRC，xz 检查每个块的校验和）及大小
+
+    Returns:
+        str: 出错时返回错误描述，校验通过返回 None
+    """
+    expected = {name.replace(os.sep, '/'): os.path.getsize(path) for path, name in zip(files, arcnames)}
+    try:
+        if archive_format(archive_path) == 'zip':
+            with zipfile.ZipFile(archive_path) as archive:
+                bad = archive.testzip()
+                if bad is not None:
+                    return f"CRC 错误: {bad}"
+                actual = {info.filename: info.file_size for info in archive.infolist()}
+        else:
+            actual = {}
+            with tarfile.open(archive_path, 'r:xz') as archive:
+                for member in archive:
+                    if member.isfile():
+                        reader = archive.extractfile(member)
+                        while reader.read(1024 * 1024):
+                            pass
+                        actual[member.name] = member.size
+    except (zipfile.BadZipFile, tarfile.TarError, lzma.LZMAError, OSError, EOFError) as e:
+        return str(e)
+    for name, size in expected.items():
+        if actual.get(name) != size:
+            return f"{name}: 期望 {size} 字节，实际 {actual.get(name)}"
+    return None
+
+
+def archive_files(file_patterns, archive_path, lang='zh', delete_after=False, confirm=True,
+                  level=6, max_workers=None, where=None):
+    """把匹配的文件流式打包为 zip 或 tar.xz
+
+    压缩在线程池中按块并行，读取与压缩重叠进行，同时处理的块数有上限，内存占用与文件大小无关。
+    delete_after 为 True 时，压缩包完整校验通过后再用 batch_delete 删除源文件。
+
+    Args:
+        file_patterns (list): 文件路径或通配符模式
+        archive_path (str): 压缩包路径，格式由扩展名决定（.zip、.tar.xz、.txz）
+        lang (str): 语言选项 ('zh' 或 'en')
+        delete_after (bool): 校验通过后是否删除源文件
+        confirm (bool): 执行前是否需要确认
+        level (int): 压缩级别（zip 为 zlib 级别 0~9，tar.xz 为 lzma 预设 0~9）
+        max_workers (int): 压缩线程数，默认取配置 ARCHIVE_WORKERS（CPU 核心数）
+        where (str): 筛选条件（见 file_filter），如 "size > 1G and age > 30d"
+
+    Returns:
+        bool: 操作是否成功
+    """
+    from .duplicate_finder import format_size
+
+    msg = MESSAGES[lang]
+    fmt = archive_format(archive_path)
+    if fmt is None:
+        print(msg['unsupported_format'].format(archive_path))
+        return False
+    if os.path.exists(archive_path):
+        print(msg['archive_exists'].format(archive_path))
+        return False
+
+    archive_key = os.path.normcase(os.path.abspath(archive_path))
+    try:
+        files = [f for f in expand_patterns((os.path.normpath(p) for p in file_patterns), where=where)
+                 if os.path.isfile(f) and os.path.normcase(os.path.abspath(f)) != archive_key]
+    except ValueError as e:
+        # 筛选条件无法解析
+        print(msg['error'].format(str(e)))
+        return False
+    if not files:
+        print(msg['no_files'])
+        return False
+    total = sum(os.path.getsize(f) for f in files)
+    arcnames = _arcnames(files)
+
+    print(msg['preview'].format(len(files), format_size(total), archive_path))
+    for path, name in zip(files, arcnames):
+        print(f"- {path} -> {name}")
+    if confirm and input(msg['confirm']).lower() != 'y':
+        print(msg['cancelled'])
+        return False
+
+    started = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(archive_path)), exist_ok=True)
+    try:
+        with Progress(len(files), 'archive', lang, bytes_total=total) as progress:
+            if fmt == 'zip':
+                writer = ParallelZipWriter(archive_path, level, max_workers)
+                try:
+                    for path, name in zip(files, arcnames):
+                        if progress.cancelled:
+                            break
+                        print(msg['adding'].format(path))
+                        size, _ = writer.add(path, name)
+                        progress.advance(nbytes=size)
+                finally:
+                    writer.close()
+            else:
+                stream = ParallelXZWriter(archive_path, level, max_workers)
+                try:
+                    with tarfile.open(fileobj=stream, mode='w|', format=tarfile.PAX_FORMAT) as archive:
+                        for path, name in zip(files, arcnames):
+                            if progress.cancelled:
+                                break
+                            print(msg['adding'].format(path))
+                            archive.add(path, arcname=name.replace(os.sep, '/'), recursive=False)
+                            progress.advance(nbytes=os.path.getsize(path))
+                finally:
+                    stream.close()
+    except Exception as e:
+        print(msg['error'].format(str(e)))
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+        return False
+    if progress.cancelled:
+        # 不完整的压缩包没有用，删除后重新运行即可
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+        return False
+
+    size = os.path.getsize(archive_path)
+    print(msg['archived'].format(len(files), format_size(total), format_size(size),
+                                 size / total if total else 0, time.perf_counter() - started))
+
+    if delete_after:
+        print(msg['verifying'])
+        problem = verify_archive(archive_path, files, arcnames)
+        if problem is not None:
+            print(msg['verify_failed'].format(problem))
+            return False
+        print(msg['verified'])
+        # 路径中可能含有通配符字符，转义后按字面路径删除；删除前再按筛选条件检查一次
+        return batch_delete([glob.escape(f) for f in files], lang, confirm, where=where)
+    return True
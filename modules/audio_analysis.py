@@ -0,0 +1,299 @@
+import os
+import math
+import numpy as np
+import soundfile as sf
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from utils import get_config_value
+from .progress import Progress, ignore_interrupt
+
+try:
+    # 可选依赖：有 scipy 时按 ITU-R BS.1770 做 K 计权，否则响度为不计权的近似值
+    from scipy.signal import sosfilt
+except ImportError:
+    sosfilt = None
+
+MESSAGES = {
+    'zh': {
+        'analyzing': "正在分析 {} 个音频文件...",
+        'no_audio_files': "指定目录中没有找到音频文件",
+        'error_reading': "分析文件 '{}' 时出错: {}",
+        'header': "\n{:<40}{:>10}{:>10}{:>10}{:>10}  {}",
+        'row': "{:<40}{:>10}{:>10}{:>10}{:>10}  {}",
+        'columns': ('文件', '峰值dB', '真峰值', 'RMS dB', 'LUFS', '电平'),
+        'summary': "\n共分析 {} 个文件：削波 {}，静音 {}，偏小 {}，偏大 {}",
+        'unweighted': "提示：未安装 scipy，响度未做 K 计权，仅为近似值"
+    },
+    'en': {
+        'analyzing': "Analyzing {} audio files...",
+        'no_audio_files': "No audio files found in the specified directory",
+        'error_reading': "Error analyzing file '{}': {}",
+        'header': "\n{:<40}{:>10}{:>10}{:>10}{:>10}  {}",
+        'row': "{:<40}{:>10}{:>10}{:>10}{:>10}  {}",
+        'columns': ('File', 'Peak dB', 'TruePeak', 'RMS dB', 'LUFS', 'Level'),
+        'summary': "\nAnalyzed {} files: {} clipped, {} silent, {} quiet, {} loud",
+        'unweighted': "Note: scipy is not installed, loudness is unweighted and approximate"
+    }
+}
+
+# 每次读取的块长度（以 100ms 响度分段为单位），内存占用与文件长度无关
+BLOCK_SEGMENTS = 64
+# 真峰值估计的过采样倍数和每个相位的插值滤波器长度
+OVERSAMPLE = 4
+TRUE_PEAK_TAPS = 12
+# 响度门限（BS.1770）
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+# 电平分组阈值
+CLIP_LEVEL = 0.999  # 采样绝对值达到该值视为削波（约 -0.01 dBFS）
+SILENCE_DB = -60.0
+QUIET_LUFS = -30.0
+LOUD_LUFS = -9.0
+LEVELS = ('clipped', 'silent', 'quiet', 'loud', 'normal')
+
+# K 计权的两级滤波器参数（高架 + 高通），按采样率重新计算系数
+_SHELF = (3.99984385397, 0.7071752369554193, 1681.9744509555319)
+_HIGHPASS = (0.5003270373253953, 38.13547087613982)
+
+
+def _db(value):
+    return 20 * math.log10(value) if value > 0 else float('-inf')
+
+
+def _k_weighting_sos(samplerate):
+    """计算 K 计权滤波器的二阶节系数（48kHz 时与 BS.1770 给出的系数一致）"""
+    gain, q, fc = _SHELF
+    k = math.tan(math.pi * fc / samplerate)
+    vh = 10 ** (gain / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    q, fc = _HIGHPASS
+    k = math.tan(math.pi * fc / samplerate)
+    a0 = 1 + k / q + k * k
+    highpass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return np.array([shelf, highpass])
+
+
+def _interpolation_filters():
+    """真峰值估计用的多相插值滤波器（加窗 sinc），每个非零相位一组系数"""
+    n = np.arange(TRUE_PEAK_TAPS) - TRUE_PEAK_TAPS // 2 + 1
+    window = np.hanning(TRUE_PEAK_TAPS + 2)[1:-1]
+    filters = []
+    for phase in range(1, OVERSAMPLE):
+        taps = np.sinc(n - phase / OVERSAMPLE) * window
+        filters.append((taps / taps.sum())[::-1])
+    return filters
+
+
+def _gated_loudness(segments):
+    """由 100ms 分段的均方值计算门限积分响度（400ms 窗口，75% 重叠）"""
+    if len(segments) < 4:
+        windows = np.array([segments.mean()]) if len(segments) else np.array([])
+    else:
+        cumulative = np.concatenate(([0.0], np.cumsum(segments)))
+        windows = (cumulative[4:] - cumulative[:-4]) / 4
+    if not len(windows):
+        return float('-inf')
+    with np.errstate(divide='ignore'):
+        loudness = -0.691 + 10 * np.log10(windows)
+    gated = windows[loudness > ABSOLUTE_GATE]
+    if not len(gated):
+        return float('-inf')
+    threshold = -0.691 + 10 * math.log10(gated.mean()) + RELATIVE_GATE
+    with np.errstate(divide='ignore'):
+        gated = gated[-0.691 + 10 * np.log10(gated) > threshold]
+    return -0.691 + 10 * math.log10(gated.mean()) if len(gated) else float('-inf')
+
+
+def analyze_file(path):
+    """分块读取一个音频文件，计算峰值、RMS、真峰值估计和积分响度
+
+    每次只读取 BLOCK_SEGMENTS 个 100ms 分段，逐块用 NumPy 向量化计算，内存占用与文件长度无关
+    （只保留每个分段的均方值，一小时的音频约 36000 个浮点数）。
+
+    Args:
+        path (str): 音频文件路径
+
+    Returns:
+        dict: peak_db、true_peak_db、rms_db、loudness_lufs、clipped_samples、duration、
+              samplerate、channels、weighted、level
+    """
+    info = sf.info(path)
+    samplerate, channels = info.samplerate, info.channels
+    segment = max(1, int(round(samplerate * 0.1)))
+    sos = _k_weighting_sos(samplerate) if sosfilt is not None else None
+    zi = None
+    filters = _interpolation_filters()
+    history = np.zeros((TRUE_PEAK_TAPS - 1, channels))
+
+    peak = 0.0
+    true_peak = 0.0
+    clipped = 0
+    square_sum = 0.0
+    frames = 0
+    segments = []
+    for block in sf.blocks(path, blocksize=segment * BLOCK_SEGMENTS, dtype='float64', always_2d=True):
+        magnitude = np.abs(block)
+        peak = max(peak, float(magnitude.max()))
+        clipped += int(np.count_nonzero(magnitude >= CLIP_LEVEL))
+        square_sum += float(np.einsum('ij,ij->', block, block))
+        frames += len(block)
+
+        # 真峰值：多相插值得到过采样后的采样点，和原始采样一起取最大值
+        padded = np.concatenate((history, block))
+        for taps in filters:
+            for channel in range(channels):
+                interpolated = np.convolve(padded[:, channel], taps, mode='valid')
+                if len(interpolated):
+                    true_peak = max(true_peak, float(np.abs(interpolated).max()))
+        history = padded[-(TRUE_PEAK_TAPS - 1):]
+
+        # 响度：K 计权（可选）后按 100ms 分段求均方值，各声道等权相加
+        if sos is not None:
+            if zi is None:
+                zi = np.zeros((len(sos), 2, channels))
+            weighted, zi = sosfilt(sos, block, axis=0, zi=zi)
+        else:
+            weighted = block
+        whole = len(weighted) // segment * segment
+        if whole:
+            squares = (weighted[:whole] ** 2).reshape(-1, segment, channels)
+            segments.append(squares.mean(axis=1).sum(axis=1))
+
+    segments = np.concatenate(segments) if segments else np.array([])
+    total_channels = frames * channels
+    result = {
+        'peak_db': _db(peak),
+        'true_peak_db': _db(max(peak, true_peak)),
+        'rms_db': _db(math.sqrt(square_sum / total_channels)) if total_channels else float('-inf'),
+        'loudness_lufs': _gated_loudness(segments),
+        'clipped_samples': clipped,
+        'duration': frames / samplerate if samplerate else None,
+        'samplerate': samplerate,
+        'channels': channels,
+        'weighted': sos is not None
+    }
+    result['level'] = level_bucket(result)
+    return result
+
+
+def level_bucket(result):
+    """把分析结果归为 clipped/silent/quiet/loud/normal 之一，可作为分类或规则字段"""
+    if result['clipped_samples']:
+        return 'clipped'
+    if result['peak_db'] < SILENCE_DB:
+        return 'silent'
+    if result['loudness_lufs'] < QUIET_LUFS:
+        return 'quiet'
+    if result['loudness_lufs'] > LOUD_LUFS:
+        return 'loud'
+    return 'normal'
+
+
+def _analyze(path):
+    """进程池中执行的任务，返回可跨进程传递的结果"""
+    try:
+        return path, analyze_file(path), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def analyze_files(paths, max_workers=None, executor=None):
+    """用进程池并发分析多个音频文件，按完成顺序逐个返回
+
+    Args:
+        paths (list): 音频文件路径列表
+        max_workers (int): 进程数，默认取配置 AUDIO_ANALYSIS_WORKERS（CPU 核心数）
+        executor (ProcessPoolExecutor): 复用的进程池
+
+    Yields:
+        tuple: (路径, 分析结果 dict 或 None, 错误信息或 None)
+    """
+    paths = list(paths)
+    if not paths:
+        return
+    if len(paths) == 1 and executor is None:
+        # 单个文件不值得启动进程池
+        yield _analyze(paths[0])
+        return
+    own_executor = executor is None
+    if own_executor:
+        max_workers = max_workers or get_config_value('AUDIO_ANALYSIS_WORKERS', os.cpu_count() or 1)
+        executor = ProcessPoolExecutor(max_workers=min(max_workers, len(paths)), initializer=ignore_interrupt)
+    futures = []
+    try:
+        futures = [executor.submit(_analyze, path) for path in paths]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # 调用方提前停止（例如被取消）时，还没开始的分析不再执行
+        for future in futures:
+            future.cancel()
+        if own_executor:
+            executor.shutdown()
+
+
+def _format_db(value):
+    return f"{value:.1f}" if value != float('-inf') else '-inf'
+
+
+def analyze_audio_files(folder_path, lang='zh', recursive=False, max_workers=None):
+    """分析文件夹中的音频文件，列出削波、静音和电平偏小/偏大的文件
+
+    Args:
+        folder_path (str): 音频文件所在文件夹路径
+        lang (str): 语言选项 ('zh' 或 'en')
+        recursive (bool): 是否包含子文件夹
+        max_workers (int): 进程数
+
+    Returns:
+        dict: 路径 -> 分析结果；没有音频文件时返回空字典
+    """
+    from .audio_classifier import is_audio_file
+
+    msg = MESSAGES[lang]
+    paths = []
+    for root, dirs, files in os.walk(folder_path):
+        paths.extend(os.path.join(root, name) for name in sorted(files) if is_audio_file(name))
+        if not recursive:
+            break
+    if not paths:
+        print(msg['no_audio_files'])
+        return {}
+
+    print(msg['analyzing'].format(len(paths)))
+    if sosfilt is None:
+        print(msg['unweighted'])
+    results = {}
+    with Progress(len(paths), 'analyze', lang) as progress:
+        analyses = analyze_files(paths, max_workers)
+        for path, result, error in analyses:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            progress.advance(nbytes=size, error=error is not None)
+            if error is not None:
+                print(msg['error_reading'].format(os.path.basename(path), error))
+            else:
+                results[path] = result
+            if progress.cancelled:
+                # 正在分析的文件完成后停止，只列出已分析的文件
+                analyses.close()
+                break
+
+    print(msg['header'].format(*msg['columns']))
+    for path in sorted(results):
+        result = results[path]
+        name = os.path.relpath(path, folder_path)
+        print(msg['row'].format(name[-40:], _format_db(result['peak_db']), _format_db(result['true_peak_db']),
+                                _format_db(result['rms_db']), _format_db(result['loudness_lufs']),
+                                result['level']))
+    counts = {level: 0 for level in LEVELS}
+    for result in results.values():
+        counts[result['level']] += 1
+    print(msg['summary'].format(len(results), counts['clipped'], counts['silent'],
+                                counts['quiet'], counts['loud']))
+    return results
@@ -0,0 +1,220 @@
+import os
+import sqlite3
+import threading
+from utils import get_config_value
+from .audio_header import AudioInfo, AUDIO_EXTENSIONS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audio_metadata (
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    format TEXT,
+    samplerate INTEGER,
+    channels INTEGER,
+    bits INTEGER,
+    frames INTEGER,
+    PRIMARY KEY (dir, name)
+) WITHOUT ROWID
+"""
+
+
+def default_cache_dir():
+    """BatchGenie 缓存目录：环境变量 BATCHGENIE_CACHE_DIR > 配置 CACHE_DIR > ~/.batchgenie
+
+    环境变量优先，单次运行（例如基准测试）可以临时改用别的目录而不必修改配置。
+    """
+    return (os.environ.get('BATCHGENIE_CACHE_DIR')
+            or get_config_value('CACHE_DIR')
+            or os.path.join(os.path.expanduser('~'), '.batchgenie'))
+
+
+def _split(path):
+    path = os.path.abspath(path)
+    return os.path.normcase(os.path.dirname(path)), os.path.basename(path)
+
+
+def _is_audio(path):
+    return os.path.splitext(path)[1].lower() in AUDIO_EXTENSIONS
+
+
+class AudioMetadataCache:
+    """持久化的音频元数据缓存（SQLite）
+
+    以 (目录, 文件名) 为键，保存采样率、声道数、位深、格式和帧数；
+    读取时用文件大小、修改时间和 inode 校验，文件变化后缓存自动失效。
+    """
+
+    def __init__(self, db_path=None):
+        """打开（必要时创建）缓存数据库
+
+        Args:
+            db_path (str): 数据库路径，默认位于缓存目录下的 audio_metadata.sqlite3
+        """
+        self.db_path = db_path or os.path.join(default_cache_dir(), 'audio_metadata.sqlite3')
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    @staticmethod
+    def _valid(row, st):
+        # Windows 上 DirEntry.stat() 的 st_ino 总是 0，任一方没有 inode 时只比较大小和修改时间
+        return (row[0] == st.st_size and row[1] == st.st_mtime_ns
+                and (not row[2] or not st.st_ino or row[2] == st.st_ino))
+
+    @staticmethod
+    def _info(row):
+        return AudioInfo(row[3], row[4], row[5], row[6], row[7])
+
+    def load_directory(self, directory, existing_names=None):
+        """一次查询读出某个目录下的全部缓存记录
+
+        Args:
+            directory (str): 目录路径
+            existing_names (set): 目录中现有的文件名；提供时顺便清理已不存在的文件记录
+
+        Returns:
+            dict: 文件名 -> 缓存记录
+        """
+        key = os.path.normcase(os.path.abspath(directory))
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT name, size, mtime_ns, inode, format, samplerate, channels, bits, frames '
+                'FROM audio_metadata WHERE dir = ?', (key,)
+            ).fetchall()
+            records = {row[0]: row[1:] for row in rows}
+            if existing_names is not None:
+                stale = [(key, name) for name in records if name not in existing_names]
+                if stale:
+                    self._conn.executemany('DELETE FROM audio_metadata WHERE dir = ? AND name = ?', stale)
+                    self._conn.commit()
+        return records
+
+    def lookup(self, records, name, st):
+        """在 load_directory 的结果中查找有效的缓存
+
+        Returns:
+            AudioInfo: 缓存命中且文件未变化时返回，否则返回 None
+        """
+        row = records.get(name)
+        if row is not None and self._valid(row, st):
+            return self._info(row)
+        return None
+
+    def get(self, path, st=None):
+        """查询单个文件的缓存"""
+        directory, name = _split(path)
+        st = st or os.stat(path)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, inode, format, samplerate, channels, bits, frames '
+                'FROM audio_metadata WHERE dir = ? AND name = ?', (directory, name)
+            ).fetchone()
+        if row is not None and self._valid(row, st):
+            return self._info(row)
+        return None
+
+    def put_many(self, items):
+        """批量写入缓存
+
+        Args:
+            items (iterable): (路径, os.stat_result, AudioInfo) 元组
+        """
+        rows = []
+        for path, st, info in items:
+            directory, name = _split(path)
+            rows.append((directory, name, st.st_size, st.st_mtime_ns, st.st_ino,
+                         info.format, info.samplerate, info.channels, info.bits, info.frames))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO audio_metadata VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows
+            )
+            self._conn.commit()
+
+    def record_moves(self, pairs):
+        """文件被移动或重命名后，把缓存记录迁移到新路径
+
+        同一设备内的移动 inode 和修改时间不变，缓存可以继续使用；
+        跨设备移动后校验会失败，下次会重新读取。
+
+        Args:
+            pairs (iterable): (旧路径, 新路径) 元组
+        """
+        updates = []
+        for old_path, new_path in pairs:
+            try:
+                st = os.stat(new_path)
+            except OSError:
+                continue
+            old_dir, old_name = _split(old_path)
+            new_dir, new_name = _split(new_path)
+            updates.append((old_dir, old_name, new_dir, new_name, st))
+        if not updates:
+            return
+        with self._lock:
+            for old_dir, old_name, new_dir, new_name, st in updates:
+                row = self._conn.execute(
+                    'SELECT size, mtime_ns, inode, format, samplerate, channels, bits, frames '
+                    'FROM audio_metadata WHERE dir = ? AND name = ?', (old_dir, old_name)
+                ).fetchone()
+                if row is None:
+                    continue
+                self._conn.execute('DELETE FROM audio_metadata WHERE dir = ? AND name = ?', (old_dir, old_name))
+                if row[0] == st.st_size and row[1] == st.st_mtime_ns:
+                    # 与原记录使用同一种 inode 来源：原记录来自 DirEntry.stat()（inode 为 0）时仍保存 0
+                    inode = st.st_ino if row[2] else 0
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO audio_metadata VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (new_dir, new_name, st.st_size, st.st_mtime_ns, inode) + tuple(row[3:])
+                    )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """返回共享的缓存实例；配置 AUDIO_CACHE = False 时返回 None"""
+    global _cache
+    if not get_config_value('AUDIO_CACHE', True):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = AudioMetadataCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"无法打开音频元数据缓存: {e}")
+                return None
+        return _cache
+
+
+def record_moves(pairs):
+    """BatchGenie 移动或重命名文件后调用，同步更新音频元数据缓存
+
+    只处理音频文件；缓存数据库尚不存在时什么都不做。
+    """
+    pairs = [(old, new) for old, new in pairs if _is_audio(old)]
+    if not pairs:
+        return
+    if _cache is None and not os.path.exists(
+            os.path.join(default_cache_dir(), 'audio_metadata.sqlite3')):
+        return
+    cache = get_cache()
+    if cache is not None:
+        try:
+            cache.record_moves(pairs)
+        except sqlite3.Error as e:
+            print(f"更新音频元数据缓存时出错: {e}")
@@ -1,14 +1,23 @@
 import os
 import shutil
+import string
 import soundfile as sf
 from pathlib import Path
 from mutagen.mp4 import MP4
-from mutagen.dsf import DSF
-import warnings
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from utils import get_config_value
+from .audio_header import read_audio_header, AudioInfo
+from .audio_cache import get_cache, record_moves
+from .file_transfer import _get_unique_path
+from .audio_analysis import analyze_files
+from .profiler import span, timed
+from .progress import Progress, ignore_interrupt
+from .file_filter import compile_filter
 
 MESSAGES = {
     'zh': {
         'moved': "已移动 '{}' 到 {} 文件夹",
+        'would_move': "（预演）'{}' -> {} 文件夹",
         'stats_header': "\n分类统计:",
         'stats_format': "{}: {} 个文件",
         'error_reading': "读取文件 '{}' 时出错: {}",
@@ -16,10 +25,14 @@ MESSAGES = {
         'error_moving': "移动文件 '{}' 时出错: {}",
         'no_audio_files': "指定目录中没有找到音频文件",
         'processing': "正在处理音频文件...",
+        'skipped': "跳过 {} 个非音频文件",
+        'in_place': "{} 个文件已在目标文件夹中",
+        'invalid_layout': "错误：{}",
         'complete': "音频文件分类完成！"
     },
     'en': {
         'moved': "Moved '{}' to {} folder",
+        'would_move': "(dry run) '{}' -> {} folder",
         'stats_header': "\nClassification Statistics:",
         'stats_format': "{}: {} files",
         'error_reading': "Error reading file '{}': {}",
@@ -27,10 +40,179 @@ MESSAGES = {
         'error_moving': "Error moving file '{}': {}",
         'no_audio_files': "No audio files found in the specified directory",
         'processing': "Processing audio files...",
+        'skipped': "Skipped {} non-audio files",
+        'in_place': "{} files are already in their target folder",
+        'invalid_layout': "Error: {}",
         'complete': "Audio file classification completed!"
     }
 }
 
+# DSD 采样率是 44.1kHz（或 48kHz）的整数倍，DSD64 = 64 × 44.1kHz = 2.8224MHz
+DSD_BASE_RATES = (44100, 48000)
+
+
+def _read_mp4(file_path):
+    """用 mutagen 读取 M4A/MP4（AAC、ALAC）的音频信息"""
+    audio = MP4(file_path)
+    info = audio.info
+    frames = int(round(info.length * info.sample_rate)) if info.length and info.sample_rate else None
+    return AudioInfo('M4A', info.sample_rate, info.channels,
+                     getattr(info, 'bits_per_sample', None) or None, frames)
+
+
+def _read_soundfile(file_path):
+    """用 soundfile（libsndfile）读取其他格式的音频信息"""
+    info = sf.info(file_path)
+    return AudioInfo(info.format, info.samplerate, info.channels, None, info.frames)
+
+
+# 扩展名 -> 读取器：分类前只凭扩展名筛选，不是这些扩展名的文件不会被打开
+READERS = {
+    '.wav': read_audio_header,
+    '.wave': read_audio_header,
+    '.rf64': read_audio_header,
+    '.flac': read_audio_header,
+    '.aif': read_audio_header,
+    '.aiff': read_audio_header,
+    '.aifc': read_audio_header,
+    '.dsf': read_audio_header,
+    '.dff': read_audio_header,
+    '.m4a': _read_mp4,
+    '.mp4': _read_mp4,
+    '.ogg': _read_soundfile,
+    '.oga': _read_soundfile,
+    '.mp3': _read_soundfile,
+}
+
+# 文件开头的魔数 -> 读取器：扩展名与实际内容不符时按内容重新选择
+MAGIC_READERS = (
+    (lambda head: head[:4] in (b'RIFF', b'RF64', b'BW64', b'FORM', b'fLaC', b'DSD ', b'FRM8')
+     or head[:3] == b'ID3', read_audio_header),
+    (lambda head: head[4:8] == b'ftyp', _read_mp4),
+    (lambda head: head[:4] == b'OggS', _read_soundfile),
+)
+
+
+def is_audio_file(name):
+    """只根据扩展名判断是否值得读取（不访问磁盘）"""
+    return os.path.splitext(name)[1].lower() in READERS
+
+
+def _sniff(file_path, size=12):
+    with open(file_path, 'rb') as f:
+        return f.read(size)
+
+
+@timed('audio.probe')
+def probe_audio(file_path):
+    """读取音频文件信息
+
+    先按扩展名选择读取器；WAV/AIFF/FLAC/DSF/DFF 用纯 Python 的文件头解析，只读取文件开头几 KB，
+    M4A 交给 mutagen，其他格式交给 soundfile。扩展名对应的读取器无法识别文件内容时，
+    再根据文件开头的魔数选择读取器。
+
+    Args:
+        file_path (str): 音频文件路径
+    Returns:
+        AudioInfo: 音频信息
+    Raises:
+        ValueError: 无法识别的音频格式
+    """
+    tried = None
+    reader = READERS.get(os.path.splitext(file_path)[1].lower())
+    if reader is not None:
+        info = reader(file_path)
+        if info is not None:
+            return info
+        tried = reader
+    head = _sniff(file_path)
+    for matches, reader in MAGIC_READERS:
+        if reader is not tried and matches(head):
+            info = reader(file_path)
+            if info is not None:
+                return info
+    raise ValueError("无法识别的音频格式")
+
+
+def dsd_name(samplerate):
+    """把 DSD 采样率换算为 DSD64/DSD128/DSD256/DSD512 等名称"""
+    for base in DSD_BASE_RATES:
+        if samplerate % base == 0:
+            return f"DSD{samplerate // base}"
+    return f"DSD{round(samplerate / DSD_BASE_RATES[0])}"
+
+
+def is_dsd(info):
+    """DSF/DFF 文件或 1 bit 且采样率在 MHz 级别的音频视为 DSD"""
+    return info.format in ('DSF', 'DFF') or (info.bits == 1 and info.samplerate >= 1000000)
+
+
+def bucket_name(info):
+    """音频应归入的分类文件夹名称：DSD 为 DSD64 等，PCM 为 44.1kHz 等"""
+    if is_dsd(info):
+        return dsd_name(info.samplerate)
+    return f"{info.samplerate/1000:.1f}kHz"
+
+
+# 分类布局中可以使用的字段
+LAYOUT_KEYS = ('rate', 'bits', 'channels', 'format', 'duration', 'level')
+DEFAULT_LAYOUT = '{rate}'
+# 时长分组：(上限秒数, 文件夹名称)
+DURATION_BUCKETS = ((60, 'under_1min'), (300, '1-5min'), (600, '5-10min'), (1800, '10-30min'))
+# 递归分类时每批读取的文件数
+PROBE_CHUNK = 256
+
+
+def duration_bucket(seconds):
+    """把时长换算为分组名称，时长未知时返回 'unknown'"""
+    if seconds is None:
+        return 'unknown'
+    for limit, name in DURATION_BUCKETS:
+        if seconds < limit:
+            return name
+    return 'over_30min'
+
+
+def audio_keys(info, level=None):
+    """从一次读取的音频信息中提取所有分类字段
+
+    Args:
+        info (AudioInfo): 音频信息
+        level (str): 电平分析得到的分组（clipped/silent/quiet/loud/normal），未分析时为 None
+    """
+    return {
+        'level': level or 'unknown',
+        'rate': bucket_name(info),
+        'bits': info.bits or 'unknown',
+        'channels': info.channels or 'unknown',
+        'format': info.format or 'unknown',
+        'duration': duration_bucket(info.duration),
+    }
+
+
+def layout_fields(layout):
+    """返回布局中使用的字段"""
+    return {field for _, field, _, _ in string.Formatter().parse(layout) if field is not None}
+
+
+def check_layout(layout):
+    """检查分类布局，例如 '{rate}/{bits}bit'
+
+    Raises:
+        ValueError: 布局中使用了不支持的字段
+    """
+    fields = layout_fields(layout)
+    unknown = fields - set(LAYOUT_KEYS)
+    if unknown or not fields:
+        raise ValueError(f"无效的分类布局 '{layout}'，可用字段: {', '.join(LAYOUT_KEYS)}")
+
+
+def layout_path(layout, info, level=None):
+    """按布局计算音频文件所属的相对文件夹路径"""
+    parts = layout.format(**audio_keys(info, level)).replace('\\', '/').split('/')
+    return os.path.join(*[part for part in parts if part])
+
+
 def get_m4a_samplerate(file_path):
     """
     获取 m4a 文件的采样率
@@ -41,10 +223,9 @@ def get_m4a_samplerate(file_path):
         int: 采样率
     """
     try:
-        audio = MP4(file_path)
-        return audio.info.sample_rate
+        return _read_mp4(str(file_path)).samplerate
     except Exception as e:
-        print(f"无法读取 m4a 文件 {file_path.name}: {str(e)}")
+        print(f"无法读取 m4a 文件 {Path(file_path).name}: {str(e)}")
         return None
 
 def get_dsd_info(file_path):
@@ -57,91 +238,249 @@ def get_dsd_info(file_path):
         str: DSD格式名称 (如 'DSD64', 'DSD128' 等)
     """
     try:
-        audio = DSF(file_path)
-        # DSD 基准采样率是 2.8224MHz (DSD64)
-        base_rate = 2822400
-        sample_rate = audio.info.sample_rate
-        
-        # 计算 DSD 倍率
-        dsd_multiple = sample_rate / base_rate
-        
-        # 映射到对应的 DSD 格式名称
-        if dsd_multiple == 1:
-            return 'DSD64'
-        elif dsd_multiple == 2:
-            return 'DSD128'
-        elif dsd_multiple == 4:
-            return 'DSD256'
-        elif dsd_multiple == 8:
-            return 'DSD512'
-        else:
-            return f'DSD{int(dsd_multiple*64)}'
+        return dsd_name(probe_audio(str(file_path)).samplerate)
     except Exception as e:
-        print(f"无法读取 DSD 文件 {file_path.name}: {str(e)}")
+        print(f"无法读取 DSD 文件 {Path(file_path).name}: {str(e)}")
         return None
 
-def classify_audio_files(folder_path, lang='zh'):
-    """根据采样率对音频文件进行分类
+def probe_entries(entries, max_workers=None, cache=None, executor=None):
+    """并发读取一批文件的音频信息，按完成顺序逐个返回
+
+    先查询持久化元数据缓存（每个目录一次查询），文件大小、修改时间和 inode 均未变化时直接使用缓存，
+    只有未命中的文件才会被打开读取；新读取的结果写回缓存。
+
+    Args:
+        entries (list): os.DirEntry 或 Path 对象列表
+        max_workers (int): 并发读取文件头的线程数，默认取配置 AUDIO_PROBE_WORKERS
+        cache (AudioMetadataCache): 元数据缓存，默认使用共享缓存
+        executor (ThreadPoolExecutor): 复用的线程池，分批调用时避免反复创建线程
+
+    Yields:
+        tuple: (条目, AudioInfo 或 None, 异常或 None)
+    """
+    max_workers = max_workers or get_config_value(
+        'AUDIO_PROBE_WORKERS', min(32, (os.cpu_count() or 1) * 4)
+    )
+    cache = cache or get_cache()
+
+    # 按目录分组，每个目录只查询一次缓存
+    by_directory = {}
+    for entry in entries:
+        by_directory.setdefault(os.path.dirname(os.fspath(entry)), []).append(entry)
+
+    pending = []
+    for directory, items in by_directory.items():
+        records = cache.load_directory(directory) if cache is not None else {}
+        for entry in items:
+            try:
+                st = entry.stat()
+            except OSError as e:
+                yield entry, None, e
+                continue
+            info = cache.lookup(records, entry.name, st) if records else None
+            if info is not None:
+                yield entry, info, None
+            else:
+                pending.append((entry, st))
+
+    if not pending:
+        return
+    new_records = []
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(probe_audio, os.fspath(entry)): (entry, st) for entry, st in pending}
+        for future in as_completed(futures):
+            entry, st = futures[future]
+            try:
+                info = future.result()
+            except Exception as e:
+                yield entry, None, e
+                continue
+            new_records.append((os.fspath(entry), st, info))
+            yield entry, info, None
+    finally:
+        if own_executor:
+            executor.shutdown()
+    if cache is not None:
+        cache.put_many(new_records)
+
+def _iter_files(folder_path, recursive, skip):
+    """逐个目录列出文件；skip 中的目录（本次分类新建的文件夹）不会进入"""
+    stack = [folder_path]
+    while stack:
+        directory = stack.pop()
+        if os.path.normcase(os.path.abspath(directory)) in skip:
+            continue
+        with os.scandir(directory) as it:
+            entries = list(it)
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    stack.append(entry.path)
+            elif not entry.is_dir():
+                yield entry
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def classify_audio_files(folder_path, lang='zh', max_workers=None, layout=None, recursive=False,
+                         dry_run=False, where=None):
+    """按采样率等字段对音频文件进行分类
+    
+    每个文件只读取一次文件头，从中提取布局需要的全部字段（采样率、位深、声道数、格式、时长分组）；
+    布局使用 {level} 时还会在进程池中做电平分析（削波/静音/偏小/偏大/正常）。
+    遍历、读取和移动以流水线方式分批进行：每批文件用线程池并发读取，读取完成后立即移动，
+    每个目标文件夹只创建一次。采样率字段中 PCM 为 44.1kHz 等，DSD 为 DSD64/DSD128 等。
     
     Args:
         folder_path (str): 音频文件所在文件夹路径
         lang (str): 语言选项 ('zh' 或 'en')
+        max_workers (int): 并发读取文件头的线程数，默认取配置 AUDIO_PROBE_WORKERS
+        layout (str): 目标文件夹布局，例如 '{rate}/{bits}bit'，默认取配置 AUDIO_LAYOUT
+        recursive (bool): 是否包含子文件夹中的文件（全部归入 folder_path 下的布局）
+        dry_run (bool): 只列出每个文件的目标文件夹，不创建文件夹也不移动文件
+        where (str): 筛选条件（见 file_filter），如 "size > 100M and age > 30d"
     """
     try:
         msg = MESSAGES[lang]
+        layout = layout or get_config_value('AUDIO_LAYOUT', DEFAULT_LAYOUT)
+        try:
+            check_layout(layout)
+            where = compile_filter(where)
+        except ValueError as e:
+            print(msg['invalid_layout'].format(str(e)))
+            return False
         print(msg['processing'])
+        max_workers = max_workers or get_config_value(
+            'AUDIO_PROBE_WORKERS', min(32, (os.cpu_count() or 1) * 4)
+        )
+        
+        created = set()
+        skipped = 0
+        in_place = 0
+        bucket_count = {}
+        moved = []
+        # 文件是流式遍历的，总数未知；中断后重新运行即可继续（已归类的文件会被跳过）
+        progress = Progress(None, 'classify', lang)
         
-        # 统计不同采样率的文件数量
-        sample_rate_count = {}
+        def audio_entries():
+            # 按扩展名预筛选：非音频文件不会被打开
+            nonlocal skipped
+            for entry in _iter_files(folder_path, recursive, created):
+                if is_audio_file(entry.name) and (where is None or where.match(entry)):
+                    yield entry
+                else:
+                    skipped += 1
         
-        # 遍历文件夹中的所有文件
-        for filename in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, filename)
+        def place(entry, info, level=None):
+            nonlocal in_place
+            if progress.cancelled:
+                return
+            progress.advance()
+            bucket = layout_path(layout, info, level)
+            target_dir = os.path.join(folder_path, bucket)
+            target = os.path.join(target_dir, entry.name)
+            if os.path.normcase(os.path.abspath(target)) == os.path.normcase(os.path.abspath(entry.path)):
+                in_place += 1
+                return
+            if dry_run:
+                print(msg['would_move'].format(entry.name, bucket))
+                bucket_count[bucket] = bucket_count.get(bucket, 0) + 1
+                return
+            
+            # 每个目标文件夹只创建一次
+            key = os.path.normcase(os.path.abspath(target_dir))
+            if key not in created:
+                try:
+                    os.makedirs(target_dir, exist_ok=True)
+                except Exception as e:
+                    print(msg['error_creating_dir'].format(bucket, str(e)))
+                    progress.advance(0, error=True)
+                    return
+                created.add(key)
             
-            # 跳过文件夹
-            if os.path.isdir(file_path):
-                continue
-                
             try:
-                # 读取音频文件信息
-                with sf.SoundFile(file_path) as audio_file:
-                    sample_rate = audio_file.samplerate
-                    
-                    # 创建对应采样率的文件夹
-                    rate_folder = f"{sample_rate/1000:.1f}kHz"
-                    rate_path = os.path.join(folder_path, rate_folder)
-                    
-                    try:
-                        os.makedirs(rate_path, exist_ok=True)
-                    except Exception as e:
-                        print(msg['error_creating_dir'].format(rate_folder, str(e)))
-                        continue
-                    
-                    # 移动文件
-                    try:
-                        shutil.move(file_path, os.path.join(rate_path, filename))
-                        print(msg['moved'].format(filename, rate_folder))
-                        
-                        # 更新统计
-                        sample_rate_count[rate_folder] = sample_rate_count.get(rate_folder, 0) + 1
-                        
-                    except Exception as e:
-                        print(msg['error_moving'].format(filename, str(e)))
-                        
+                target = _get_unique_path(target)
+                with span('fs.move'):
+                    shutil.move(entry.path, target)
+                moved.append((entry.path, target))
+                print(msg['moved'].format(entry.name, bucket))
+                bucket_count[bucket] = bucket_count.get(bucket, 0) + 1
             except Exception as e:
-                print(msg['error_reading'].format(filename, str(e)))
-                
+                print(msg['error_moving'].format(entry.name, str(e)))
+                progress.advance(0, error=True)
+        
+        # 布局使用 {level} 时需要解码整个文件做电平分析，用进程池并行
+        analysis_pool = None
+        if 'level' in layout_fields(layout):
+            analysis_pool = ProcessPoolExecutor(
+                max_workers=get_config_value('AUDIO_ANALYSIS_WORKERS', os.cpu_count() or 1),
+                initializer=ignore_interrupt
+            )
+        try:
+            with progress, ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for chunk in _chunks(audio_entries(), PROBE_CHUNK):
+                    if progress.cancelled:
+                        break
+                    probed = []
+                    for entry, info, error in probe_entries(chunk, max_workers, executor=executor):
+                        if error is not None:
+                            print(msg['error_reading'].format(entry.name, str(error)))
+                            progress.advance(error=True)
+                        elif analysis_pool is not None:
+                            probed.append((entry, info))
+                        else:
+                            place(entry, info)
+                    if not probed:
+                        continue
+                    levels = {}
+                    for path, result, error in analyze_files([entry.path for entry, _ in probed],
+                                                             executor=analysis_pool):
+                        if error is not None:
+                            print(msg['error_reading'].format(os.path.basename(path), error))
+                        else:
+                            levels[path] = result['level']
+                    for entry, info in probed:
+                        if entry.path in levels:
+                            place(entry, info, levels[entry.path])
+        finally:
+            if analysis_pool is not None:
+                analysis_pool.shutdown()
+        
+        # 缓存记录跟随文件迁移到新路径
+        record_moves(moved)
+        
+        if skipped:
+            print(msg['skipped'].format(skipped))
+        if in_place:
+            print(msg['in_place'].format(in_place))
         # 显示统计信息
-        if sample_rate_count:
+        if bucket_count:
             print(msg['stats_header'])
-            for rate, count in sample_rate_count.items():
-                print(msg['stats_format'].format(rate, count))
+            for bucket, count in sorted(bucket_count.items()):
+                print(msg['stats_format'].format(bucket, count))
+        if progress.cancelled:
+            return False
+        if bucket_count or in_place:
             print(msg['complete'])
-        else:
-            print(msg['no_audio_files'])
+            return True
+        print(msg['no_audio_files'])
+        return False
             
     except Exception as e:
         print(f"Error: {str(e)}")
+        return False
 
 def classify_audio_by_samplerate(folder_path):
     """
@@ -150,9 +489,6 @@ def classify_audio_by_samplerate(folder_path):
     Args:
         folder_path (str): 包含音频文件的文件夹路径
     """
-    # 支持的音频文件扩展名
-    AUDIO_EXTENSIONS = {'.wav', '.flac', '.aif', '.aiff', '.m4a', '.dsf', '.dff'}
-    
     while True:
         try:
             # 确保文件夹路径存在
@@ -179,65 +515,5 @@ def classify_audio_by_samplerate(folder_path):
                 return
             continue
     
-    try:
-        # 用于存储不同采样率的文件
-        samplerate_files = {}
-        
-        # 检查文件夹中是否有支持的音频文件
-        audio_files = [f for f in folder_path.iterdir() 
-                      if f.is_file() and f.suffix.lower() in AUDIO_EXTENSIONS]
-        
-        if not audio_files:
-            print(f"提示：在文件夹 '{folder_path}' 中没有找到支持的音频文件")
-            print(f"支持的格式：{', '.join(AUDIO_EXTENSIONS)}")
-            return
-        
-        # 遍历文件夹中的所有文件
-        for file_path in audio_files:
-            try:
-                # 读取音频文件信息
-                info = sf.info(file_path)
-                samplerate = int(info.samplerate)
-                
-                # 将采样率格式化为标准形式
-                if samplerate >= 1000:
-                    folder_name = f"{samplerate/1000:.1f}kHz".replace(".0", "")
-                else:
-                    folder_name = f"{samplerate}Hz"
-                
-                # 将文件添加到对应采样率的列表中
-                if folder_name not in samplerate_files:
-                    samplerate_files[folder_name] = []
-                samplerate_files[folder_name].append(file_path)
-                
-            except Exception as e:
-                print(f"警告：无法读取文件 '{file_path.name}': {str(e)}")
-                continue
-        
-        if not samplerate_files:
-            print("没有找到可以处理的音频文件")
-            return
-        
-        # 创建子文件夹并移动文件
-        for samplerate, files in samplerate_files.items():
-            # 创建子文件夹
-            subdir = folder_path / samplerate
-            subdir.mkdir(exist_ok=True)
-            
-            # 移动文件
-            for file_path in files:
-                try:
-                    shutil.move(str(file_path), str(subdir / file_path.name))
-                    print(f"已移动 '{file_path.name}' 到 {samplerate} 文件夹")
-                except Exception as e:
-                    print(f"警告：移动文件 '{file_path.name}' 时出错: {str(e)}")
-        
-        # 打印分类统计
-        print("\n分类统计:")
-        for samplerate, files in samplerate_files.items():
-            print(f"{samplerate}: {len(files)} 个文件")
-            
-    except Exception as e:
-        print(f"处理过程中发生错误：{str(e)}")
-        print("操作已取消")
-        return 
\ No newline at end of file
+    # 与主菜单使用同一个分类引擎
+    classify_audio_files(str(folder_path))
@@ -0,0 +1,248 @@
+import os
+import struct
+
+# 第一次读取的字节数，绝大多数文件的格式信息都在这个范围内
+HEADER_BYTES = 4096
+# 遍历块时最多检查的块数，防止损坏文件导致长时间循环
+MAX_CHUNKS = 64
+# 支持分类的音频文件扩展名（与 audio_classifier.READERS 的键一致）
+AUDIO_EXTENSIONS = {'.wav', '.wave', '.rf64', '.flac', '.aif', '.aiff', '.aifc', '.dsf', '.dff',
+                    '.m4a', '.mp4', '.ogg', '.oga', '.mp3'}
+
+
+class AudioInfo:
+    """音频文件头中的基本信息"""
+
+    __slots__ = ('format', 'samplerate', 'channels', 'bits', 'frames')
+
+    def __init__(self, format, samplerate, channels=None, bits=None, frames=None):
+        self.format = format  # WAV, RF64, AIFF, AIFC, FLAC, DSF, DFF 等
+        self.samplerate = samplerate
+        self.channels = channels
+        self.bits = bits
+        self.frames = frames
+
+    @property
+    def duration(self):
+        """时长（秒），帧数未知时返回 None"""
+        if self.frames is None or not self.samplerate:
+            return None
+        return self.frames / self.samplerate
+
+    def to_dict(self):
+        return {
+            'format': self.format,
+            'samplerate': self.samplerate,
+            'channels': self.channels,
+            'bits': self.bits,
+            'frames': self.frames,
+            'duration': self.duration
+        }
+
+    def __repr__(self):
+        return (f"AudioInfo(format={self.format!r}, samplerate={self.samplerate}, "
+                f"channels={self.channels}, bits={self.bits}, frames={self.frames})")
+
+
+class _HeaderReader:
+    """按偏移读取文件内容：优先使用已读取的文件头，超出部分用 pread 补读"""
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.head = b''
+        self.head = self.read(0, HEADER_BYTES)
+
+    def read(self, offset, size):
+        end = offset + size
+        if end <= len(self.head):
+            return self.head[offset:end]
+        if hasattr(os, 'pread'):
+            return os.pread(self.fd, size, offset)
+        os.lseek(self.fd, offset, os.SEEK_SET)
+        return os.read(self.fd, size)
+
+
+def _extended_to_float(data):
+    """把 AIFF 使用的 80 位扩展精度浮点数转换为 float"""
+    exponent = ((data[0] & 0x7F) << 8) | data[1]
+    mantissa = struct.unpack('>Q', data[2:10])[0]
+    if exponent == 0 and mantissa == 0:
+        return 0.0
+    value = mantissa * 2.0 ** (exponent - 16383 - 63)
+    return -value if data[0] & 0x80 else value
+
+
+def _parse_riff(reader, head):
+    """解析 RIFF/RF64/BW64 WAV 文件的 fmt 和 data 块"""
+    form = head[:4].decode('ascii')
+    if head[8:12] != b'WAVE':
+        return None
+    fmt = None
+    data_size = None
+    ds64_data_size = None
+    offset = 12
+    for _ in range(MAX_CHUNKS):
+        header = reader.read(offset, 8)
+        if len(header) < 8:
+            break
+        chunk_id, size = header[:4], struct.unpack('<I', header[4:8])[0]
+        if chunk_id == b'ds64':
+            body = reader.read(offset + 8, 16)
+            if len(body) == 16:
+                ds64_data_size = struct.unpack('<Q', body[8:16])[0]
+        elif chunk_id == b'fmt ':
+            body = reader.read(offset + 8, min(size, 40))
+            if len(body) < 16:
+                raise ValueError("fmt 块不完整")
+            fmt = struct.unpack('<HHIIHH', body[:16])
+            fmt_body = body
+        elif chunk_id == b'data':
+            data_size = ds64_data_size if size == 0xFFFFFFFF and ds64_data_size is not None else size
+        if fmt is not None and data_size is not None:
+            break
+        offset += 8 + size + (size & 1)
+    if fmt is None:
+        raise ValueError("找不到 fmt 块")
+    format_tag, channels, samplerate, _, block_align, bits = fmt
+    if format_tag == 0xFFFE and len(fmt_body) >= 20:
+        # WAVE_FORMAT_EXTENSIBLE：使用有效位数而不是容器位数
+        bits = struct.unpack('<H', fmt_body[18:20])[0] or bits
+    frames = data_size // block_align if data_size is not None and block_align else None
+    return AudioInfo('WAV' if form == 'RIFF' else form, samplerate, channels, bits, frames)
+
+
+def _parse_aiff(reader, head):
+    """解析 AIFF/AIFC 文件的 COMM 块"""
+    form = head[8:12]
+    if form not in (b'AIFF', b'AIFC'):
+        return None
+    offset = 12
+    for _ in range(MAX_CHUNKS):
+        header = reader.read(offset, 8)
+        if len(header) < 8:
+            break
+        chunk_id, size = header[:4], struct.unpack('>I', header[4:8])[0]
+        if chunk_id == b'COMM':
+            body = reader.read(offset + 8, 18)
+            if len(body) < 18:
+                raise ValueError("COMM 块不完整")
+            channels, frames, bits = struct.unpack('>hIh', body[:8])
+            samplerate = _extended_to_float(body[8:18])
+            return AudioInfo(form.decode('ascii'), int(round(samplerate)), channels, bits, frames)
+        offset += 8 + size + (size & 1)
+    raise ValueError("找不到 COMM 块")
+
+
+def _id3_size(head):
+    """返回文件开头 ID3v2 标签的总长度（没有标签时为 0）"""
+    if head[:3] != b'ID3' or len(head) < 10:
+        return 0
+    size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _parse_flac(reader, head, offset=0):
+    """解析 FLAC 文件的 STREAMINFO 块"""
+    if reader.read(offset, 4) != b'fLaC':
+        return None
+    block = reader.read(offset + 4, 4 + 34)
+    if len(block) < 38 or block[0] & 0x7F != 0:
+        raise ValueError("缺少 STREAMINFO 块")
+    info = block[4 + 10:4 + 18]
+    packed = int.from_bytes(info, 'big')
+    samplerate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    bits = ((packed >> 36) & 0x1F) + 1
+    frames = packed & 0xFFFFFFFFF
+    return AudioInfo('FLAC', samplerate, channels, bits, frames or None)
+
+
+def _parse_dsf(reader, head):
+    """解析 DSF 文件的 fmt 块"""
+    size = struct.unpack('<Q', head[4:12])[0]
+    body = reader.read(size, 12 + 40)
+    if len(body) < 52 or body[:4] != b'fmt ':
+        raise ValueError("找不到 fmt 块")
+    _, _, _, channels, samplerate, bits, frames = struct.unpack('<IIIIIIQ', body[12:44])
+    return AudioInfo('DSF', samplerate, channels, bits, frames)
+
+
+def _parse_dff(reader, head):
+    """解析 DSDIFF (DFF) 文件的 PROP/SND 中的 FS、CHNL 块"""
+    if head[12:16] != b'DSD ':
+        return None
+    samplerate = channels = frames = None
+    offset = 16
+    for _ in range(MAX_CHUNKS):
+        header = reader.read(offset, 12)
+        if len(header) < 12:
+            break
+        chunk_id, size = header[:4], struct.unpack('>Q', header[4:12])[0]
+        if chunk_id == b'PROP':
+            # PROP 块内是 'SND ' 类型标识和若干子块
+            sub_offset = offset + 12 + 4
+            end = offset + 12 + size
+            for _ in range(MAX_CHUNKS):
+                if sub_offset + 12 > end:
+                    break
+                sub_header = reader.read(sub_offset, 12)
+                if len(sub_header) < 12:
+                    break
+                sub_id, sub_size = sub_header[:4], struct.unpack('>Q', sub_header[4:12])[0]
+                if sub_id == b'FS  ':
+                    samplerate = struct.unpack('>I', reader.read(sub_offset + 12, 4))[0]
+                elif sub_id == b'CHNL':
+                    channels = struct.unpack('>H', reader.read(sub_offset + 12, 2))[0]
+                sub_offset += 12 + sub_size + (sub_size & 1)
+        elif chunk_id in (b'DSD ', b'DST '):
+            if chunk_id == b'DSD ' and channels:
+                frames = size * 8 // channels
+            break
+        offset += 12 + size + (size & 1)
+    if samplerate is None:
+        raise ValueError("找不到 FS 块")
+    return AudioInfo('DFF', samplerate, channels, 1, frames)
+
+
+def read_audio_header(path):
+    """只读取文件头，解析 WAV/RF64/AIFF/FLAC/DSF/DFF 的采样率等信息
+
+    首次只读取前 HEADER_BYTES 字节，格式块位于更后面时用 pread 按需补读，不会初始化解码器。
+
+    Args:
+        path (str): 音频文件路径
+
+    Returns:
+        AudioInfo: 文件头信息；不是支持的格式时返回 None
+
+    Raises:
+        OSError: 文件无法打开
+        ValueError: 文件头损坏
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        reader = _HeaderReader(fd)
+        head = reader.head
+        if len(head) < 12:
+            return None
+        magic = head[:4]
+        try:
+            if magic in (b'RIFF', b'RF64', b'BW64'):
+                return _parse_riff(reader, head)
+            if magic == b'FORM':
+                return _parse_aiff(reader, head)
+            if magic == b'fLaC':
+                return _parse_flac(reader, head)
+            if head[:3] == b'ID3':
+                # 带 ID3v2 标签的 FLAC 文件
+                return _parse_flac(reader, head, _id3_size(head))
+            if magic == b'DSD ':
+                return _parse_dsf(reader, head)
+            if magic == b'FRM8':
+                return _parse_dff(reader, head)
+        except struct.error as e:
+            raise ValueError(f"文件头损坏: {e}")
+        return None
+    finally:
+        os.close(fd)
@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from utils import get_config_value
+
+MESSAGES = {
+    'zh': {
+        'no_commands': "没有读取到任何指令",
+        'start': "开始批量执行 {} 条指令（并发 {}，每秒最多 {} 个请求）",
+        'command_done': "[{}/{}] {}: {}",
+        'summary': "批量指令完成：成功 {}，失败 {}，耗时 {:.2f} 秒",
+        'unsupported': "批量模式不支持该操作: {}"
+    },
+    'en': {
+        'no_commands': "No commands were read",
+        'start': "Running {} commands (concurrency {}, at most {} requests/s)",
+        'command_done': "[{}/{}] {}: {}",
+        'summary': "Batch finished: {} succeeded, {} failed in {:.2f}s",
+        'unsupported': "Operation not supported in batch mode: {}"
+    }
+}
+
+# 会一直阻塞运行的操作，无法在无人值守的批量模式中执行
+UNSUPPORTED_OPERATIONS = {'smart_monitor'}
+
+
+class RateLimiter:
+    """令牌桶限速器：平均每秒最多 rate 次，允许 burst 次突发"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """阻塞直到获得一个令牌"""
+        if not self.rate or self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+def _path_key(path):
+    return os.path.normcase(os.path.abspath(path)).rstrip(os.sep) + os.sep
+
+
+def _overlaps(paths_a, paths_b):
+    """判断两组路径是否有相同、祖先或子孙关系"""
+    for a in paths_a:
+        for b in paths_b:
+            if a.startswith(b) or b.startswith(a):
+                return True
+    return False
+
+
+class OrderedPathScheduler:
+    """按指令顺序串行化路径有重叠的执行，互不相关的执行可以并行
+
+    一条指令只有在所有排在它前面、且尚未完成的指令都已知晓涉及路径并且与它没有重叠时才能执行；
+    前面指令的 AI 响应还没返回时，无法判断是否冲突，只能等待。
+    """
+
+    def __init__(self, count):
+        self._paths = [None] * count  # None 表示尚未获得执行计划
+        self._finished = [False] * count
+        self._condition = threading.Condition()
+
+    def _ready(self, index, paths):
+        for earlier in range(index):
+            if self._finished[earlier]:
+                continue
+            if self._paths[earlier] is None or _overlaps(self._paths[earlier], paths):
+                return False
+        return True
+
+    def acquire(self, index, paths):
+        """登记指令 index 涉及的路径并等待可以执行"""
+        keys = [_path_key(path) for path in paths]
+        with self._condition:
+            self._paths[index] = keys
+            self._condition.notify_all()
+            self._condition.wait_for(lambda: self._ready(index, keys))
+
+    def release(self, index):
+        """标记指令 index 已完成（包括失败或没有执行计划的情况）"""
+        with self._condition:
+            self._finished[index] = True
+            self._condition.notify_all()
+
+
+def read_commands(source):
+    """从文件或标准输入读取指令，每行一条，忽略空行和 # 开头的注释
+
+    Args:
+        source (str): 文件路径，'-' 表示标准输入
+
+    Returns:
+        list: 指令列表
+    """
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+
+def run_batch(commands, lang='zh', concurrency=None, rate=None, report=None):
+    """并发地把多条自然语言指令提交给 AI，并把结果写成 JSON Lines 报告
+
+    AI 请求在限速和并发上限内同时进行；执行阶段路径有重叠的指令按顺序串行执行。
+    批量模式下所有操作都不再请求确认。
+
+    Args:
+        commands (list): 指令列表
+        lang (str): 语言选项
+        concurrency (int): 同时进行的 AI 请求数
+        rate (float): 每秒最多发起的 AI 请求数，0 表示不限速
+        report: 报告输出的文件对象，默认为标准输出
+
+    Returns:
+        list: 每条指令的结果字典
+    """
+    from .ai_controller import (
+        get_ai_response, parse_ai_response, plan_paths, execute_plan, replace_placeholders
+    )
+
+    msg = MESSAGES[lang]
+    concurrency = concurrency or get_config_value('AI_BATCH_CONCURRENCY', 4)
+    rate = get_config_value('AI_BATCH_RATE', 1.0) if rate is None else rate
+    report = report or sys.stdout
+    if not commands:
+        print(msg['no_commands'], file=sys.stderr)
+        return []
+
+    limiter = RateLimiter(rate, burst=concurrency)
+    scheduler = OrderedPathScheduler(len(commands))
+    report_lock = threading.Lock()
+    results = [None] * len(commands)
+    started = time.perf_counter()
+    print(msg['start'].format(len(commands), concurrency, rate or '∞'), file=sys.stderr)
+
+    def run_one(index, command):
+        entry = {'index': index, 'command': command, 'plan': None, 'status': 'error',
+                 'ai_seconds': None, 'wait_seconds': None, 'exec_seconds': None, 'error': None}
+        try:
+            limiter.acquire()
+            t0 = time.perf_counter()
+            response = get_ai_response(replace_placeholders(command), lang)
+            entry['ai_seconds'] = round(time.perf_counter() - t0, 3)
+            try:
+                plan = parse_ai_response(response)
+            except ValueError as e:  # json.JSONDecodeError 是 ValueError 的子类
+                entry['error'] = str(e)
+                return entry
+            entry['plan'] = plan
+            if plan.get('operation') in UNSUPPORTED_OPERATIONS:
+                entry['status'] = 'unsupported'
+                entry['error'] = msg['unsupported'].format(plan.get('operation'))
+                return entry
+
+            t1 = time.perf_counter()
+            scheduler.acquire(index, plan_paths(plan))
+            entry['wait_seconds'] = round(time.perf_counter() - t1, 3)
+            t2 = time.perf_counter()
+            ok = execute_plan(plan, lang, confirm=False)
+            entry['exec_seconds'] = round(time.perf_counter() - t2, 3)
+            entry['status'] = 'ok' if ok else 'failed'
+        except Exception as e:
+            entry['error'] = str(e)
+        finally:
+            scheduler.release(index)
+            results[index] = entry
+            with report_lock:
+                report.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                report.flush()
+                print(msg['command_done'].format(index + 1, len(commands), entry['status'], command),
+                      file=sys.stderr)
+        return entry
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_one, i, c) for i, c in enumerate(commands)]
+        for future in futures:
+            future.result()
+
+    succeeded = sum(1 for r in results if r['status'] == 'ok')
+    print(msg['summary'].format(succeeded, len(results) - succeeded, time.perf_counter() - started),
+          file=sys.stderr)
+    return results
+
+
+def main(argv=None):
+    """批量指令模式的命令行入口
+
+    用法: python main.py batch commands.txt [--concurrency N] [--rate R] [--report out.jsonl] [--lang en]
+    """
+    parser = argparse.ArgumentParser(prog='batch', description='Run natural-language commands in batch')
+    parser.add_argument('source', help="指令文件路径，'-' 表示从标准输入读取")
+    parser.add_argument('--concurrency', type=int, default=None, help='同时进行的 AI 请求数')
+    parser.add_argument('--rate', type=float, default=None, help='每秒最多发起的 AI 请求数，0 表示不限速')
+    parser.add_argument('--report', default=None, help='JSON Lines 报告文件，默认输出到标准输出')
+    parser.add_argument('--lang', choices=['zh', 'en'], default='zh')
+    args = parser.parse_args(argv)
+
+    commands = read_commands(args.source)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as report:
+            results = run_batch(commands, args.lang, args.concurrency, args.rate, report)
+    else:
+        # 报告占用标准输出，各操作的过程信息改写到标准错误
+        report = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            results = run_batch(commands, args.lang, args.concurrency, args.rate, report)
+    return 0 if results and all(r['status'] == 'ok' for r in results) else 1
@@ -0,0 +1,462 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import contextlib
+
+MESSAGES = {
+    'zh': {
+        'dry_run': "（预演）以下操作不会被执行：",
+        'dry_run_empty': "（预演）没有匹配的文件",
+        'plan_line': "  {}",
+        'monitor_plan': "（预演）将监控 {} -> {}，文件类型: {}",
+        'monitoring': "文件夹监控已启动，按 Ctrl+C 停止",
+        'interrupted': "操作已中断",
+        'plan_invalid': "无法读取执行计划 {}: {}",
+        'index_watching': "正在保持索引最新: {}（按 Ctrl+C 停止）"
+    },
+    'en': {
+        'dry_run': "(dry run) The following would be done:",
+        'dry_run_empty': "(dry run) No matching files",
+        'plan_line': "  {}",
+        'monitor_plan': "(dry run) Would monitor {} -> {}, file types: {}",
+        'monitoring': "Folder monitoring started, press Ctrl+C to stop",
+        'interrupted': "Operation interrupted",
+        'plan_invalid': "Cannot read plan {}: {}",
+        'index_watching': "Keeping the index up to date: {} (press Ctrl+C to stop)"
+    }
+}
+
+
+def _plan_affix(folder_path, file_extension, rename, where=None):
+    """列出前缀/后缀操作会影响的文件，与 add_prefix/add_suffix 使用相同的匹配方式"""
+    from .pattern_expander import expand_patterns
+
+    folder_path = os.path.normpath(folder_path)
+    pattern = os.path.join(glob.escape(folder_path), f"*.{file_extension}")
+    return [(path, rename(path)) for path in expand_patterns([pattern], recursive=False, where=where)]
+
+
+def _plan_convert(folder_path, original_extension, target_extension, where=None):
+    """列出批量格式重命名（或转码）的源文件和目标文件"""
+    if not os.path.isdir(folder_path):
+        return []
+    with os.scandir(folder_path) as it:
+        entries = sorted((entry for entry in it if entry.name.lower().endswith(original_extension.lower())
+                          and (where is None or where.match(entry))), key=lambda entry: entry.name)
+    return [(entry.path, entry.path[:-len(original_extension)] + target_extension) for entry in entries]
+
+
+def _extension(value):
+    return value if value.startswith('.') else '.' + value
+
+
+def cmd_prefix(args):
+    from .prefix_handler import add_prefix
+
+    extension = args.extension.lstrip('.')
+    plan = _plan_affix(args.folder, extension,
+                       lambda path: os.path.join(os.path.dirname(path), args.prefix + os.path.basename(path)),
+                       args.where)
+    if args.dry_run:
+        return True, plan
+    return add_prefix(args.folder, extension, args.prefix, args.lang, confirm=not args.yes, where=args.where), plan
+
+
+def cmd_suffix(args):
+    from .suffix_handler import add_suffix
+
+    extension = args.extension.lstrip('.')
+    plan = _plan_affix(args.folder, extension,
+                       lambda path: os.path.splitext(path)[0] + args.suffix + os.path.splitext(path)[1],
+                       args.where)
+    if args.dry_run:
+        return True, plan
+    return add_suffix(args.folder, extension, args.suffix, args.lang, confirm=not args.yes, where=args.where), plan
+
+
+def cmd_rename(args):
+    from .renamer import batch_rename
+
+    plan = [(os.path.normpath(args.source), os.path.join(os.path.dirname(os.path.normpath(args.source)), args.name))]
+    if args.dry_run:
+        return os.path.exists(args.source), plan
+    return batch_rename(args.source, args.name, args.lang, confirm=not args.yes), plan
+
+
+def cmd_convert(args):
+    from .converter import batch_convert
+
+    original, target = _extension(args.source_ext), _extension(args.target_ext)
+    plan = _plan_convert(args.folder, original, target, args.where)
+    if args.dry_run:
+        return bool(plan), plan
+    return batch_convert(args.folder, original, target, args.lang, transcode=args.transcode,
+                         samplerate=args.samplerate, bits=args.bits, max_workers=args.workers,
+                         where=args.where), plan
+
+
+def cmd_transfer(args):
+    from .file_transfer import batch_transfer, _expand_sources
+
+    if args.dry_run:
+        plan = [(path, os.path.join(args.target, os.path.basename(path)))
+                for path, literal in _expand_sources(args.files, args.where) if os.path.exists(path)
+                and not (literal and args.where is not None and not args.where.match(path))]
+        return bool(plan), plan
+    results = batch_transfer(args.files, args.target, args.command, args.lang, wait_time=args.wait,
+                             where=args.where)
+    return bool(results), results
+
+
+def cmd_delete(args):
+    from .file_handler import batch_delete
+    from .pattern_expander import expand_patterns
+
+    plan = list(expand_patterns((os.path.normpath(pattern) for pattern in args.files), where=args.where))
+    if args.dry_run:
+        return bool(plan), plan
+    return batch_delete(args.files, args.lang, confirm=not args.yes, where=args.where), plan
+
+
+def cmd_archive(args):
+    from .archiver import archive_files
+    from .pattern_expander import expand_patterns
+
+    plan = [path for path in expand_patterns((os.path.normpath(pattern) for pattern in args.files), where=args.where)
+            if os.path.isfile(path)]
+    if args.dry_run:
+        return bool(plan), [(path, args.archive) for path in plan]
+    return archive_files(args.files, args.archive, args.lang, delete_after=args.delete_after,
+                         confirm=not args.yes, level=args.level, max_workers=args.workers, where=args.where), plan
+
+
+def cmd_classify(args):
+    from .audio_classifier import classify_audio_files
+
+    # 分类本身不需要确认；预演时由 classify_audio_files 逐个列出目标文件夹
+    return classify_audio_files(args.folder, args.lang, max_workers=args.workers, layout=args.layout,
+                                recursive=args.recursive, dry_run=args.dry_run, where=args.where), None
+
+
+def cmd_monitor(args):
+    msg = MESSAGES[args.lang]
+    if args.dry_run:
+        for source in args.sources:
+            print(msg['monitor_plan'].format(source, args.target, ', '.join(args.types or ['*'])))
+        return True, None
+
+    from utils import get_config_value
+
+    processes = args.processes if args.processes is not None else get_config_value('MONITOR_PROCESSES', 0)
+    if processes:
+        # 多进程模式：源文件夹分配到各工作进程，主进程定期打印各分片的指标
+        from .monitor_supervisor import MonitorSupervisor
+
+        supervisor = MonitorSupervisor(args.sources, args.target, args.types, args.lang, args.wait, args.where,
+                                       processes=processes)
+        monitors = [supervisor]
+        report = supervisor.print_metrics
+    else:
+        from .file_monitor import SmartFolderMonitor
+
+        monitors = [SmartFolderMonitor(source, args.target, args.types, args.lang, args.wait, args.where)
+                    for source in args.sources]
+        report = None
+    interval = get_config_value('MONITOR_STATS_INTERVAL', 60)
+    for monitor in monitors:
+        monitor.start()
+    print(msg['monitoring'])
+    try:
+        last = time.monotonic()
+        while True:
+            time.sleep(1)
+            if report is not None and interval and time.monotonic() - last >= interval:
+                report()
+                last = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for monitor in monitors:
+            monitor.stop()
+        if report is not None:
+            report()
+    return True, None
+
+
+def cmd_index(args):
+    """建立、查看、删除、监控文件索引，或从索引查找文件"""
+    from . import fs_index
+    from .progress import Progress
+
+    msg = fs_index.MESSAGES[args.lang]
+    if args.action == 'find':
+        paths = []
+        for root in args.paths or [os.curdir]:
+            found = fs_index.find_files(root, args.ext, args.min_size, args.max_size,
+                                        recursive=not args.no_recursive)
+            paths.extend(found if args.where is None else args.where.filter(found))
+        for path in paths:
+            print(path)
+        return True, paths
+
+    from utils import get_config_value
+    roots = args.paths or list(get_config_value('INDEX_ROOTS', []))
+    index = fs_index.get_index(create=args.action == 'build')
+    if index is None:
+        print(msg['no_roots'])
+        return args.action == 'status', None
+
+    if args.action == 'build':
+        if not roots:
+            print(msg['no_roots'])
+            return False, None
+        ok = True
+        for root in roots:
+            if not os.path.isdir(root):
+                print(msg['not_a_folder'].format(root))
+                ok = False
+                continue
+            print(msg['building'].format(root))
+            if args.dry_run:
+                continue
+            started = time.perf_counter()
+            with Progress(None, 'index', args.lang) as progress:
+                counts = index.build(root, args.workers, progress)
+            if counts is None:
+                print(msg['cancelled'].format(root))
+                return False, None
+            print(msg['built'].format(root, counts[0], counts[1], time.perf_counter() - started))
+        return ok, None
+
+    if args.action == 'drop':
+        ok = True
+        for root in roots:
+            if args.dry_run:
+                print(msg['dropped'].format(root))
+            elif index.drop(root):
+                print(msg['dropped'].format(root))
+            else:
+                print(msg['not_indexed'].format(root))
+                ok = False
+        return ok, None
+
+    if args.action == 'watch':
+        from .file_monitor import IndexMonitor
+
+        monitor = IndexMonitor(index)
+        watched = monitor.start()
+        if not watched:
+            monitor.stop()
+            print(msg['no_roots'])
+            return False, None
+        for root in watched:
+            print(MESSAGES[args.lang]['index_watching'].format(root))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            monitor.stop()
+        return True, None
+
+    status = index.status()
+    if not status:
+        print(msg['no_roots'])
+    for root, count, built in status:
+        print(msg['status_line'].format(root, count, time.strftime('%Y-%m-%d %H:%M', time.localtime(built))))
+    return True, None
+
+
+def cmd_plan(args):
+    """执行保存的计划（AI 返回的 JSON 或中断后保存的剩余操作）"""
+    from .ai_controller import preview_plan, execute_plan
+
+    try:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+    except (OSError, ValueError) as e:
+        print(MESSAGES[args.lang]['plan_invalid'].format(args.file, str(e)))
+        return False, None
+    if args.dry_run:
+        return True, preview_plan(plan, args.lang)
+    return execute_plan(plan, args.lang, confirm=not args.yes), None
+
+
+def build_parser():
+    """构建命令行解析器；子命令只在执行时才导入对应的模块"""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('-y', '--yes', action='store_true', help='跳过所有确认提示')
+    common.add_argument('-n', '--dry-run', action='store_true', help='只列出将要执行的操作，不修改任何文件')
+    common.add_argument('--json', action='store_true', help='以 JSON 输出结果（过程信息写到标准错误）')
+    common.add_argument('--lang', choices=['zh', 'en'], default='zh')
+    common.add_argument('--timings', action='store_true', help='统计各阶段耗时并在结束时打印汇总')
+    common.add_argument('--trace', metavar='PATH', default=None, help='把各阶段的时间线写成 Chrome trace JSON')
+    common.add_argument('--profile', nargs='?', const='', default=None, metavar='PATH',
+                        help='同时用 cProfile 分析，可指定保存原始数据的路径')
+    common.add_argument('--progress', choices=['auto', 'line', 'json', 'off'], default=None,
+                        help='进度显示方式：进度行、JSON Lines（均写到标准错误）或关闭，默认取配置 PROGRESS')
+    common.add_argument('--where', metavar='EXPR', default=None,
+                        help='只处理满足条件的文件，例如 "size > 1G and age > 30d" 或 "ext in (wav, flac) and samplerate >= 96000"')
+
+    parser = argparse.ArgumentParser(prog='batchgenie', description='BatchGenie 非交互命令行')
+    sub = parser.add_subparsers(dest='command', metavar='command')
+    sub.required = True
+
+    p = sub.add_parser('prefix', parents=[common], help='批量添加前缀')
+    p.add_argument('folder')
+    p.add_argument('extension', help='文件扩展名，如 wav')
+    p.add_argument('prefix')
+    p.set_defaults(func=cmd_prefix)
+
+    p = sub.add_parser('suffix', parents=[common], help='批量添加后缀')
+    p.add_argument('folder')
+    p.add_argument('extension', help='文件扩展名，如 wav')
+    p.add_argument('suffix')
+    p.set_defaults(func=cmd_suffix)
+
+    p = sub.add_parser('rename', parents=[common], help='重命名单个文件')
+    p.add_argument('source')
+    p.add_argument('name', help='新文件名（不包含路径）')
+    p.set_defaults(func=cmd_rename)
+
+    p = sub.add_parser('convert', parents=[common], help='批量格式重命名或音频转码')
+    p.add_argument('folder')
+    p.add_argument('source_ext', help='源扩展名，如 .mp4')
+    p.add_argument('target_ext', help='目标扩展名，如 .m4a')
+    p.add_argument('--transcode', action='store_true', help='真正转码音频（保留源文件）')
+    p.add_argument('--samplerate', type=int, default=None)
+    p.add_argument('--bits', type=int, default=None)
+    p.add_argument('--workers', type=int, default=None)
+    p.set_defaults(func=cmd_convert)
+
+    for name, text in (('move', '批量移动文件'), ('copy', '批量复制文件')):
+        p = sub.add_parser(name, parents=[common], help=text)
+        p.add_argument('files', nargs='+', help='文件路径或通配符模式')
+        p.add_argument('-t', '--target', required=True, help='目标文件夹')
+        p.add_argument('--wait', type=float, default=3, help='最近这么多秒内修改过的文件先等待写入完成')
+        p.set_defaults(func=cmd_transfer)
+
+    p = sub.add_parser('delete', parents=[common], help='批量删除文件')
+    p.add_argument('files', nargs='+', help='文件路径或通配符模式')
+    p.set_defaults(func=cmd_delete)
+
+    p = sub.add_parser('archive', parents=[common], help='打包为 zip 或 tar.xz')
+    p.add_argument('files', nargs='+', help='文件路径或通配符模式')
+    p.add_argument('-o', '--archive', required=True, help='压缩包路径（.zip、.tar.xz）')
+    p.add_argument('--delete-after', action='store_true', help='校验通过后删除源文件')
+    p.add_argument('--level', type=int, default=6)
+    p.add_argument('--workers', type=int, default=None)
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser('classify', parents=[common], help='按采样率等字段分类音频文件')
+    p.add_argument('folder')
+    p.add_argument('--layout', default=None, help='目标文件夹布局，如 {rate}/{bits}bit')
+    p.add_argument('-r', '--recursive', action='store_true')
+    p.add_argument('--workers', type=int, default=None)
+    p.set_defaults(func=cmd_classify)
+
+    p = sub.add_parser('monitor', parents=[common], help='监控文件夹并自动整理新文件')
+    p.add_argument('sources', nargs='+', help='源文件夹')
+    p.add_argument('-t', '--target', required=True, help='目标文件夹')
+    p.add_argument('--types', nargs='*', default=None, help='监控的文件类型，如 .wav .flac')
+    p.add_argument('--wait', type=float, default=3, help='移动每个新文件前等待写入完成的秒数')
+    p.add_argument('--processes', type=int, default=None,
+                   help='把源文件夹分配到多个工作进程（0 为单进程），默认取配置 MONITOR_PROCESSES')
+    p.set_defaults(func=cmd_monitor)
+
+    p = sub.add_parser('index', parents=[common], help='文件索引：建立、查看状态、删除、保持更新或查找文件')
+    p.add_argument('action', choices=['build', 'status', 'drop', 'watch', 'find'])
+    p.add_argument('paths', nargs='*', help='根目录（build 默认取配置 INDEX_ROOTS；find 默认当前目录）')
+    p.add_argument('--ext', nargs='*', default=None, help='find：扩展名，如 .wav .flac')
+    p.add_argument('--min-size', type=int, default=None, help='find：最小字节数')
+    p.add_argument('--max-size', type=int, default=None, help='find：最大字节数')
+    p.add_argument('--no-recursive', action='store_true', help='find：不包括子文件夹')
+    p.add_argument('--workers', type=int, default=None, help='build：扫描线程数')
+    p.set_defaults(func=cmd_index)
+
+    p = sub.add_parser('plan', parents=[common], help='执行保存的 JSON 计划，例如中断后保存的剩余操作')
+    p.add_argument('file', help='计划文件路径')
+    p.set_defaults(func=cmd_plan)
+
+    p = sub.add_parser('batch', help='批量执行自然语言指令（参数同 python main.py batch）')
+    p.add_argument('args', nargs=argparse.REMAINDER)
+
+    p = sub.add_parser('daemon', help='启动常驻进程，通过本机 HTTP 接口接收任务')
+    p.add_argument('--host', default=None, help='监听地址，默认 127.0.0.1')
+    p.add_argument('--port', type=int, default=None, help='监听端口，默认 8765')
+    p.add_argument('--workers', type=int, default=None, help='工作线程数')
+    p.add_argument('--lang', choices=['zh', 'en'], default='zh')
+    return parser
+
+
+def _plan_lines(plan):
+    for item in plan:
+        yield ' -> '.join(item) if isinstance(item, tuple) else item
+
+
+def main(argv=None):
+    """命令行入口：python batchgenie.py <子命令> [参数]
+
+    返回值作为进程退出码：0 表示成功，1 表示失败或没有处理任何文件，130 表示被中断
+    （第一次 Ctrl+C 让当前操作在文件之间停止并保存剩余的工作，可用 plan 子命令继续）。
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'batch':
+        from .batch_runner import main as batch_main
+        return batch_main(args.args)
+    if args.command == 'daemon':
+        from .daemon import serve
+        return serve(args.host, args.port, args.workers, args.lang)
+
+    from . import progress
+    if args.progress:
+        progress.configure(args.progress)
+
+    msg = MESSAGES[args.lang]
+    started = time.perf_counter()
+    # JSON 占用标准输出，各操作的过程信息改写到标准错误
+    output = contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext()
+    profiling = args.timings or args.trace or args.profile is not None
+    if profiling:
+        from . import profiler
+        timing = profiler.profiling(args.lang, trace_path=args.trace, cprofile=args.profile is not None,
+                                    cprofile_path=args.profile or None)
+    else:
+        timing = contextlib.nullcontext()
+    error = None
+    try:
+        with output, timing:
+            if args.where:
+                from .file_filter import compile_filter
+                args.where = compile_filter(args.where)
+            else:
+                args.where = None
+            ok, plan = args.func(args)
+            if args.dry_run and plan is not None and not args.json:
+                print(msg['dry_run'] if plan else msg['dry_run_empty'])
+                for line in _plan_lines(plan):
+                    print(msg['plan_line'].format(line))
+    except KeyboardInterrupt:
+        print(msg['interrupted'], file=sys.stderr)
+        return 130
+    except Exception as e:
+        ok, plan, error = False, None, str(e)
+        print(error, file=sys.stderr)
+
+    interrupted = progress.interrupted()
+    if args.json:
+        result = {'command': args.command, 'ok': bool(ok), 'dry_run': args.dry_run, 'interrupted': interrupted,
+                  'seconds': round(time.perf_counter() - started, 3), 'error': error}
+        if plan is not None:
+            result['files'] = [list(item) if isinstance(item, tuple) else item for item in plan]
+        if profiling:
+            result['timings'] = profiler.summary()
+        print(json.dumps(result, ensure_ascii=False))
+    if interrupted:
+        return 130
+    return 0 if ok else 1
@@ -1,4 +1,8 @@
 import os
+from .audio_cache import record_moves
+from .profiler import span
+from .progress import Progress
+from .file_filter import compile_filter
 
 MESSAGES = {
     'zh': {
@@ -21,25 +25,47 @@ MESSAGES = {
     }
 }
 
-def batch_convert(folder_path, original_extension, target_extension, lang='zh'):
-    """批量修改文件扩展名"""
+def batch_convert(folder_path, original_extension, target_extension, lang='zh',
+                  transcode=False, samplerate=None, bits=None, max_workers=None, where=None):
+    """批量修改文件扩展名
+
+    transcode 为 True 时真正转码音频（WAV/AIFF/FLAC/OGG），而不是只改扩展名，源文件保留；
+    samplerate、bits、max_workers 只在转码时使用，详见 transcoder.batch_transcode。
+    where 为筛选条件（见 file_filter），只处理满足条件的文件。
+    """
+    if transcode:
+        from .transcoder import batch_transcode
+        return batch_transcode(folder_path, original_extension, target_extension, lang,
+                               samplerate=samplerate, bits=bits, max_workers=max_workers, where=where)
     msg = MESSAGES[lang]
     try:
         if not os.path.exists(folder_path):
             print(msg['folder_not_exist'].format(folder_path))
             return False
+        where = compile_filter(where)
             
         count = 0
-        files = os.listdir(folder_path)
-        for filename in files:
-            if filename.lower().endswith(original_extension):
+        renamed = []
+        with span('fs.listdir'), os.scandir(folder_path) as it:
+            # 筛选条件使用 scandir 缓存的 stat 信息
+            files = [entry.name for entry in it if entry.name.lower().endswith(original_extension)
+                     and (where is None or where.match(entry))]
+        # 中断后重新运行即可继续：已处理的文件不再匹配原扩展名
+        with Progress(len(files), 'convert', lang) as progress:
+            for filename in files:
+                if progress.cancelled:
+                    break
                 old_path = os.path.join(folder_path, filename)
                 new_filename = filename[:-len(original_extension)] + target_extension
                 new_path = os.path.join(folder_path, new_filename)
-                os.rename(old_path, new_path)
+                with span('fs.rename'):
+                    os.rename(old_path, new_path)
+                renamed.append((old_path, new_path))
                 print(msg['renamed'].format(filename, new_filename))
                 count += 1
+                progress.advance()
         
+        record_moves(renamed)
         if count > 0:
             print(msg['complete'].format(count))
             return True  # 返回 True 表示成功处理文件
@@ -0,0 +1,496 @@
+import io
+import os
+import sys
+import hmac
+import json
+import time
+import queue
+import secrets
+import ipaddress
+import itertools
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from utils import get_config_value
+from .batch_runner import _path_key, _overlaps
+from .pattern_expander import pattern_root
+from .file_filter import compile_filter
+from .audio_cache import default_cache_dir
+from . import progress
+
+MESSAGES = {
+    'zh': {
+        'started': "BatchGenie 守护进程已启动: http://{}:{}/ （{} 个工作线程），按 Ctrl+C 停止",
+        'stopping': "正在停止守护进程...",
+        'stopped': "守护进程已停止",
+        'warm_failed': "预加载 {} 失败: {}",
+        'job_done': "[任务 {}] {}: {}",
+        'unsupported': "不支持的任务: {}",
+        'invalid_arguments': "参数无效: {}",
+        'token_file': "访问令牌已写入 {}，请求需要带 X-BatchGenie-Token 请求头",
+        'not_loopback': "错误：监听非本机地址 {} 需要在 config.py 中设置 DAEMON_TOKEN"
+    },
+    'en': {
+        'started': "BatchGenie daemon listening on http://{}:{}/ ({} workers), press Ctrl+C to stop",
+        'stopping': "Stopping daemon...",
+        'stopped': "Daemon stopped",
+        'warm_failed': "Failed to preload {}: {}",
+        'job_done': "[job {}] {}: {}",
+        'unsupported': "Unsupported job: {}",
+        'invalid_arguments': "Invalid arguments: {}",
+        'token_file': "Access token written to {}; requests must send it in the X-BatchGenie-Token header",
+        'not_loopback': "Error: listening on the non-local address {} requires DAEMON_TOKEN in config.py"
+    }
+}
+
+# 每个任务保留的输出上限（字符），防止长时间运行的守护进程内存持续增长
+OUTPUT_LIMIT = 64 * 1024
+# 已完成任务最多保留的条数
+FINISHED_LIMIT = 1000
+# 命令参数中表示路径的字段，用于判断任务之间是否冲突
+PATH_ARGUMENTS = ('folder', 'files', 'target', 'source', 'sources', 'archive')
+# 未配置 DAEMON_TOKEN 时，启动时生成的令牌写入缓存目录下的这个文件（仅当前用户可读）
+TOKEN_FILE = 'daemon.token'
+
+
+def _is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _write_token(token):
+    """把令牌写入缓存目录下权限为 0600 的文件，返回文件路径"""
+    directory = default_cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, TOKEN_FILE)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        # 文件之前已存在时 os.open 不会修改权限
+        os.chmod(path, 0o600)
+        f.write(token)
+    return path
+
+
+class _ThreadOutput(io.TextIOBase):
+    """按线程分流的标准输出：任务线程的 print 写入各自的任务输出，其他线程照常输出"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        job = getattr(self.local, 'job', None)
+        if job is None:
+            return self.stream.write(text)
+        job.append_output(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class Job:
+    """守护进程中的一个任务"""
+
+    def __init__(self, job_id, kind, payload, priority):
+        self.id = job_id
+        self.kind = kind  # command / ai / plan
+        self.payload = payload
+        self.priority = priority
+        self.status = 'queued'  # queued / waiting / running / ok / failed / error / cancelled
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.output = []
+        self._output_size = 0
+        self.thread = None
+        self.cancel_requested = False
+
+    def append_output(self, text):
+        if self._output_size < OUTPUT_LIMIT:
+            self.output.append(text)
+            self._output_size += len(text)
+
+    def to_dict(self, output=False):
+        data = {'id': self.id, 'kind': self.kind, 'payload': self.payload, 'priority': self.priority,
+                'status': self.status, 'submitted': self.submitted, 'started': self.started,
+                'finished': self.finished, 'result': self.result, 'error': self.error}
+        if self.status == 'running' and self.thread is not None:
+            data['progress'] = progress.snapshots(self.thread)
+        if output:
+            data['output'] = ''.join(self.output)
+        return data
+
+
+class PathLocks:
+    """正在执行的任务所涉及的路径；路径有重叠（相同、祖先或子孙）的任务不会同时执行"""
+
+    def __init__(self):
+        self._active = {}
+        self._condition = threading.Condition()
+
+    def acquire(self, owner, paths):
+        keys = [_path_key(path) for path in paths]
+        with self._condition:
+            self._condition.wait_for(lambda: not any(_overlaps(keys, other) for other in self._active.values()))
+            self._active[owner] = keys
+
+    def release(self, owner):
+        with self._condition:
+            self._active.pop(owner, None)
+            self._condition.notify_all()
+
+
+class BatchGenieDaemon:
+    """常驻进程：模型客户端、元数据缓存和已导入的模块在任务之间复用
+
+    任务按优先级（数值越小越先执行，相同优先级按提交顺序）进入队列，由工作线程池执行；
+    路径有重叠的任务串行执行。文件夹监控也在这个进程内运行。
+    """
+
+    def __init__(self, workers=None, lang='zh'):
+        self.lang = lang
+        self.msg = MESSAGES[lang]
+        self.workers = workers or get_config_value('DAEMON_WORKERS', 2)
+        self.queue = queue.PriorityQueue()
+        self.jobs = {}
+        self.monitors = {}
+        self.locks = PathLocks()
+        self.started = time.time()
+        self._ids = itertools.count(1)
+        self._monitor_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._output = None
+
+    def warm_up(self):
+        """预先导入各操作模块并创建模型客户端和元数据缓存，之后的任务不再承担这些开销"""
+        from . import cli, ai_controller  # noqa: F401 — ai_controller 导入了全部操作模块
+        from .audio_cache import get_cache
+        from .model_backend import get_backend
+
+        for name, load in (('audio cache', get_cache), ('model backend', get_backend)):
+            try:
+                load()
+            except Exception as e:
+                print(self.msg['warm_failed'].format(name, str(e)))
+
+    def start(self):
+        # 进度通过 GET /jobs/<id> 查询，不在终端上绘制
+        progress.configure('off')
+        self._output = _ThreadOutput(sys.stdout)
+        sys.stdout = self._output
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        for _ in self._threads:
+            self.queue.put((float('inf'), float('inf'), None))
+        for thread in self._threads:
+            thread.join()
+        for monitor in list(self.monitors.values()):
+            monitor['monitor'].stop()
+        self.monitors.clear()
+        if self._output is not None:
+            sys.stdout = self._output.stream
+
+    # 任务
+
+    def submit(self, request):
+        """提交任务
+
+        Args:
+            request (dict): {"command": "prefix", "args": [...]}、{"ai": "自然语言指令"}
+                            或 {"plan": {...}}（与 AI 返回的格式相同），可带 "priority"（默认 5）
+
+        Returns:
+            Job: 新建的任务
+
+        Raises:
+            ValueError: 请求格式无效
+        """
+        if 'command' in request:
+            kind, payload = 'command', {'command': request['command'], 'args': list(request.get('args', []))}
+        elif 'ai' in request:
+            kind, payload = 'ai', request['ai']
+        elif 'plan' in request and isinstance(request['plan'], dict):
+            kind, payload = 'plan', request['plan']
+        else:
+            raise ValueError(self.msg['unsupported'].format(json.dumps(request, ensure_ascii=False)))
+        priority = int(request.get('priority', 5))
+        with self._lock:
+            job = Job(next(self._ids), kind, payload, priority)
+            self.jobs[job.id] = job
+        self.queue.put((priority, job.id, job))
+        return job
+
+    def cancel(self, job_id):
+        """取消任务：排队中的任务直接取消；执行中的任务在当前文件完成后停止，剩余的工作保存为计划"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.finished = time.time()
+                return True
+            if job.status != 'running' or not progress.cancel(job.thread):
+                return False
+            job.cancel_requested = True
+            return True
+
+    def _worker(self):
+        while True:
+            _, _, job = self.queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if job.status != 'queued':
+                    continue
+                job.status = 'waiting'
+            self._output.local.job = job
+            job.thread = threading.get_ident()
+            try:
+                self._run(job)
+                if job.cancel_requested:
+                    job.status = 'cancelled'
+            except Exception as e:
+                job.status, job.error = 'error', str(e)
+            finally:
+                self._output.local.job = None
+                self.locks.release(job.id)
+                job.finished = time.time()
+                self._prune()
+                print(self.msg['job_done'].format(job.id, job.status, job.kind))
+
+    def _prune(self):
+        with self._lock:
+            finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+            for job_id in finished[:-FINISHED_LIMIT]:
+                del self.jobs[job_id]
+
+    def _begin(self, job, paths):
+        self.locks.acquire(job.id, [pattern_root(str(path)) for path in paths])
+        job.status = 'running'
+        job.started = time.time()
+
+    def _run(self, job):
+        if job.kind == 'command':
+            return self._run_command(job)
+
+        from .ai_controller import (
+            get_ai_response, parse_ai_response, plan_paths, execute_plan, replace_placeholders
+        )
+        if job.kind == 'ai':
+            plan = parse_ai_response(get_ai_response(replace_placeholders(job.payload), self.lang))
+            job.result = {'plan': plan}
+        else:
+            plan = job.payload
+        if plan.get('operation') == 'smart_monitor':
+            # 监控在守护进程中常驻运行，不占用工作线程
+            ids = [self.add_monitor(source, plan.get('target_root', ''), plan.get('file_types'), plan.get('where'))
+                   for source in plan.get('source_roots', [])]
+            job.result = dict(job.result or {}, monitors=ids)
+            job.status = 'ok'
+            return
+        self._begin(job, plan_paths(plan))
+        job.status = 'ok' if execute_plan(plan, self.lang, confirm=False) else 'failed'
+
+    def _run_command(self, job):
+        from .cli import build_parser
+
+        command, args = job.payload['command'], job.payload['args']
+        if command in ('batch', 'daemon'):
+            raise ValueError(self.msg['unsupported'].format(command))
+        try:
+            # 守护进程中没有人回答确认提示
+            namespace = build_parser().parse_args([command] + args + ['--yes', '--lang', self.lang])
+        except SystemExit:
+            raise ValueError(self.msg['invalid_arguments'].format(' '.join([command] + args)))
+        namespace.where = compile_filter(namespace.where)
+        if command == 'monitor' and not namespace.dry_run:
+            ids = [self.add_monitor(source, namespace.target, namespace.types, namespace.where)
+                   for source in namespace.sources]
+            job.result = {'monitors': ids}
+            job.status = 'ok'
+            return
+
+        paths = []
+        for name in PATH_ARGUMENTS:
+            value = getattr(namespace, name, None)
+            if value:
+                paths.extend(value if isinstance(value, list) else [value])
+        self._begin(job, paths)
+        ok, plan = namespace.func(namespace)
+        job.result = {'files': [list(item) if isinstance(item, tuple) else item for item in plan]
+                      if plan is not None else None}
+        job.status = 'ok' if ok else 'failed'
+
+    # 文件夹监控
+
+    def add_monitor(self, source_root, target_root, file_types=None, where=None):
+        from .file_monitor import SmartFolderMonitor
+
+        monitor = SmartFolderMonitor(source_root, target_root, file_types, self.lang, where=compile_filter(where))
+        monitor.start()
+        monitor_id = next(self._monitor_ids)
+        self.monitors[monitor_id] = {'id': monitor_id, 'source': source_root, 'target': target_root,
+                                     'types': file_types, 'monitor': monitor}
+        return monitor_id
+
+    def remove_monitor(self, monitor_id):
+        entry = self.monitors.pop(monitor_id, None)
+        if entry is None:
+            return False
+        entry['monitor'].stop()
+        return True
+
+    def status(self):
+        with self._lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {'uptime': round(time.time() - self.started, 1), 'workers': self.workers,
+                'queued': counts.get('queued', 0), 'jobs': counts, 'monitors': len(self.monitors)}
+
+
+def _make_handler(daemon, token):
+    class Handler(BaseHTTPRequestHandler):
+        """本机 HTTP 接口
+
+        GET /status、GET /jobs、GET /jobs/<id>、POST /jobs、DELETE /jobs/<id>、
+        GET /monitors、POST /monitors、DELETE /monitors/<id>
+
+        每个请求都要带 X-BatchGenie-Token 请求头；带 Origin 请求头的请求（来自浏览器中的网页）一律拒绝，
+        POST 的 Content-Type 必须是 application/json，网页不能不经 CORS 预检就发出这样的请求。
+        """
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, code, data):
+            body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _route(self):
+            if self.headers.get('Origin') is not None:
+                self._send(403, {'error': 'cross-origin requests are not allowed'})
+                return None
+            if not hmac.compare_digest(self.headers.get('X-BatchGenie-Token', '').encode(), token.encode()):
+                self._send(403, {'error': 'forbidden'})
+                return None
+            if self.command == 'POST':
+                content_type = self.headers.get('Content-Type', '').split(';', 1)[0].strip().lower()
+                if content_type != 'application/json':
+                    self._send(415, {'error': 'Content-Type must be application/json'})
+                    return None
+            parts = [part for part in self.path.split('?', 1)[0].split('/') if part]
+            if len(parts) == 2:
+                try:
+                    parts[1] = int(parts[1])
+                except ValueError:
+                    self._send(404, {'error': 'not found'})
+                    return None
+            return parts
+
+        def _body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return json.loads(self.rfile.read(length) or b'{}')
+
+        def do_GET(self):
+            parts = self._route()
+            if parts is None:
+                return
+            if parts == ['status']:
+                self._send(200, daemon.status())
+            elif parts == ['jobs']:
+                self._send(200, [job.to_dict() for job in list(daemon.jobs.values())])
+            elif len(parts) == 2 and parts[0] == 'jobs' and parts[1] in daemon.jobs:
+                self._send(200, daemon.jobs[parts[1]].to_dict(output=True))
+            elif parts == ['monitors']:
+                self._send(200, [{key: value for key, value in entry.items() if key != 'monitor'}
+                                 for entry in list(daemon.monitors.values())])
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            parts = self._route()
+            if parts is None:
+                return
+            try:
+                body = self._body()
+                if parts == ['jobs']:
+                    job = daemon.submit(body)
+                    self._send(202, job.to_dict())
+                elif parts == ['monitors']:
+                    ids = [daemon.add_monitor(source, body['target'], body.get('types'), body.get('where'))
+                           for source in body['sources']]
+                    self._send(201, {'monitors': ids})
+                else:
+                    self._send(404, {'error': 'not found'})
+            except (ValueError, KeyError, TypeError, OSError) as e:
+                self._send(400, {'error': str(e)})
+
+        def do_DELETE(self):
+            parts = self._route()
+            if parts is None:
+                return
+            if len(parts) == 2 and parts[0] == 'jobs':
+                ok = daemon.cancel(parts[1])
+            elif len(parts) == 2 and parts[0] == 'monitors':
+                ok = daemon.remove_monitor(parts[1])
+            else:
+                self._send(404, {'error': 'not found'})
+                return
+            self._send(200 if ok else 409, {'ok': ok})
+
+    return Handler
+
+
+def serve(host=None, port=None, workers=None, lang='zh'):
+    """启动守护进程并阻塞运行，直到 Ctrl+C
+
+    请求需要带 X-BatchGenie-Token 请求头：令牌取配置 DAEMON_TOKEN，未配置时每次启动随机生成，
+    写入缓存目录下的 daemon.token（仅当前用户可读）。未配置令牌时只允许监听本机地址。
+    """
+    msg = MESSAGES[lang]
+    host = host or get_config_value('DAEMON_HOST', '127.0.0.1')
+    port = port if port is not None else get_config_value('DAEMON_PORT', 8765)
+    token = get_config_value('DAEMON_TOKEN')
+    if not token and not _is_loopback(host):
+        print(msg['not_loopback'].format(host))
+        return 1
+    token_file = None
+    if not token:
+        token = secrets.token_urlsafe(32)
+        token_file = _write_token(token)
+    daemon = BatchGenieDaemon(workers, lang)
+    daemon.warm_up()
+    server = ThreadingHTTPServer((host, port), _make_handler(daemon, token))
+    server.daemon_threads = True
+    daemon.start()
+    print(daemon.msg['started'].format(host, server.server_address[1], daemon.workers))
+    if token_file:
+        print(daemon.msg['token_file'].format(token_file))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(daemon.msg['stopping'])
+    finally:
+        server.server_close()
+        daemon.stop()
+        if token_file:
+            os.remove(token_file)
+        print(daemon.msg['stopped'])
+    return 0
@@ -0,0 +1,327 @@
+import os
+import re
+import glob
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from utils import get_config_value
+from .file_handler import batch_delete
+from .file_transfer import batch_transfer
+from .file_filter import compile_filter
+from .progress import Progress
+
+MESSAGES = {
+    'zh': {
+        'scanning': "正在扫描 {} ...",
+        'scan_stats': "共 {} 个文件（{}），其中 {} 个文件大小相同需要比对",
+        'no_duplicates': "没有找到重复文件",
+        'group': "\n重复组 {}（{} 个副本，每个 {}）：",
+        'keep': "  保留: {}",
+        'duplicate': "  重复: {}",
+        'summary': "\n共 {} 组重复文件，可释放 {}；读取了 {}（占全部文件的 {:.2%}）",
+        'confirm_hardlink': "\n确认把以上重复文件替换为指向保留文件的硬链接吗？(y/n): ",
+        'cancelled': "操作已取消",
+        'linked': "已替换为硬链接: {}",
+        'link_error': "无法为 '{}' 创建硬链接: {}",
+        'link_complete': "硬链接替换完成，共 {} 个文件",
+        'invalid_action': "无效的处理方式: {}",
+        'missing_target': "移动重复文件需要指定目标文件夹"
+    },
+    'en': {
+        'scanning': "Scanning {} ...",
+        'scan_stats': "{} files ({}), {} share a size with another file and need comparing",
+        'no_duplicates': "No duplicate files found",
+        'group': "\nDuplicate group {} ({} copies, {} each):",
+        'keep': "  keep:      {}",
+        'duplicate': "  duplicate: {}",
+        'summary': "\n{} duplicate groups, {} can be freed; read {} ({:.2%} of all file data)",
+        'confirm_hardlink': "\nReplace the duplicates above with hard links to the kept files? (y/n): ",
+        'cancelled': "Operation cancelled",
+        'linked': "Replaced with hard link: {}",
+        'link_error': "Cannot hard-link '{}': {}",
+        'link_complete': "Hard-linking complete, {} files replaced",
+        'invalid_action': "Invalid action: {}",
+        'missing_target': "A target folder is required to move duplicates"
+    }
+}
+
+# 部分哈希读取文件开头和结尾各多少字节
+PARTIAL_BYTES = 4096
+# 完整哈希每次读取的字节数（hashlib 处理大块数据时会释放 GIL）
+CHUNK_BYTES = 1024 * 1024
+ACTIONS = ('report', 'delete', 'hardlink', 'move')
+# _get_unique_path 生成的 "_1"、"_2" 后缀
+_UNIQUE_SUFFIX = re.compile(r'_\d+$')
+
+
+def format_size(size):
+    """把字节数格式化为便于阅读的字符串"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def _walk(root, recursive, where=None):
+    """用 scandir 遍历文件，返回 (路径, stat) ；不跟随符号链接，where 直接作用于 DirEntry"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False) and (where is None or where.match(entry)):
+                            yield entry.path, entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+def _drop_hardlinks(paths, size, stats):
+    """去掉大小相同的文件中指向同一文件的硬链接
+
+    Windows 上 DirEntry.stat() 的 st_ino、st_dev、st_nlink 总是 0，遍历时无法去重；
+    这里只对大小相同的候选文件补一次 os.stat，大小唯一的文件仍然不需要额外的系统调用。
+    """
+    kept = []
+    seen_inodes = set()
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            kept.append(path)
+            continue
+        if st.st_ino and st.st_nlink > 1:
+            inode = (st.st_dev, st.st_ino)
+            if inode in seen_inodes:
+                stats['files'] -= 1
+                stats['total_bytes'] -= size
+                continue
+            seen_inodes.add(inode)
+        kept.append(path)
+    return kept
+
+
+def _partial_hash(path, size):
+    """文件开头和结尾各 PARTIAL_BYTES 字节的哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(PARTIAL_BYTES))
+        if size > PARTIAL_BYTES:
+            f.seek(max(PARTIAL_BYTES, size - PARTIAL_BYTES))
+            digest.update(f.read(PARTIAL_BYTES))
+    return digest.hexdigest()
+
+
+def _full_hash(path):
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _refine(groups, hash_func, executor):
+    """对每组候选文件计算哈希，只保留哈希相同的文件组成新的候选组"""
+    jobs = [(key, path) for key, group in groups.items() for path in group]
+    refined = {}
+    for (key, path), digest in zip(jobs, executor.map(hash_func, [path for _, path in jobs])):
+        if digest is not None:
+            refined.setdefault(key + (digest,), []).append(path)
+    return {key: group for key, group in refined.items() if len(group) > 1}
+
+
+def find_duplicates(roots, recursive=True, min_size=1, max_workers=None, lang='zh', where=None):
+    """查找内容完全相同的文件
+
+    分三级筛选，绝大多数文件只需要 stat：
+    1. scandir 遍历，按文件大小分组，大小唯一的文件直接排除；
+    2. 大小相同的文件只读取开头和结尾各 PARTIAL_BYTES 字节计算哈希；
+    3. 部分哈希仍相同的文件才完整读取计算哈希（线程池并行，hashlib 会释放 GIL）。
+    同一文件的多个硬链接只计一次。
+
+    Args:
+        roots (list): 要扫描的文件夹
+        recursive (bool): 是否包含子文件夹
+        min_size (int): 忽略小于该字节数的文件（默认忽略空文件）
+        max_workers (int): 计算哈希的线程数，默认取配置 DUPLICATE_WORKERS
+        lang (str): 语言选项 ('zh' 或 'en')
+        where (str|FileFilter): 筛选条件，只比较满足条件的文件
+
+    Returns:
+        tuple: (重复组列表（每组为路径列表，按 choose_keeper 排序，第一个为保留文件）,
+                统计信息 dict：files、total_bytes、bytes_read、candidates)
+    """
+    msg = MESSAGES[lang]
+    if isinstance(roots, str):
+        roots = [roots]
+    where = compile_filter(where)
+    max_workers = max_workers or get_config_value('DUPLICATE_WORKERS', min(16, (os.cpu_count() or 1) * 2))
+
+    by_size = {}
+    seen_inodes = set()
+    no_inode = False  # 是否有文件的 stat 不含 inode（Windows 上的 DirEntry）
+    stats = {'files': 0, 'total_bytes': 0, 'bytes_read': 0, 'candidates': 0}
+    mtimes = {}
+    for root in roots:
+        print(msg['scanning'].format(root))
+        for path, st in _walk(root, recursive, where):
+            if st.st_size < min_size:
+                continue
+            if not st.st_ino:
+                no_inode = True
+            # POSIX 上 DirEntry.stat() 带有 inode 和链接数，只有多链接的文件才需要去重
+            if st.st_ino and st.st_nlink > 1:
+                inode = (st.st_dev, st.st_ino)
+                if inode in seen_inodes:
+                    continue
+                seen_inodes.add(inode)
+            stats['files'] += 1
+            stats['total_bytes'] += st.st_size
+            mtimes[path] = st.st_mtime
+            by_size.setdefault(st.st_size, []).append(path)
+
+    candidates = {}
+    for size, paths in by_size.items():
+        if len(paths) > 1 and no_inode:
+            paths = _drop_hardlinks(paths, size, stats)
+        if len(paths) > 1:
+            candidates[(size,)] = paths
+    stats['candidates'] = sum(len(paths) for paths in candidates.values())
+    print(msg['scan_stats'].format(stats['files'], format_size(stats['total_bytes']), stats['candidates']))
+
+    sizes = {path: key[0] for key, paths in candidates.items() for path in paths}
+
+    def partial(path):
+        try:
+            return _partial_hash(path, sizes[path])
+        except OSError:
+            return None
+
+    def full(path):
+        try:
+            return _full_hash(path)
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        groups = _refine(candidates, partial, executor)
+        stats['bytes_read'] = sum(min(size, 2 * PARTIAL_BYTES) for size in sizes.values())
+        # 不超过 2 * PARTIAL_BYTES 的文件部分哈希已经覆盖全部内容
+        small = {key: group for key, group in groups.items() if key[0] <= 2 * PARTIAL_BYTES}
+        large = {key: group for key, group in groups.items() if key[0] > 2 * PARTIAL_BYTES}
+        stats['bytes_read'] += sum(key[0] * len(group) for key, group in large.items())
+        groups = list(small.values()) + list(_refine(large, full, executor).values())
+
+    groups = [choose_keeper(group, mtimes) for group in groups]
+    groups.sort(key=lambda group: -sizes[group[0]] * (len(group) - 1))
+    return groups, stats
+
+
+def choose_keeper(paths, mtimes=None):
+    """给一组重复文件排序，第一个作为保留文件
+
+    优先保留没有 "_1" 这类重名后缀的文件，其次是修改时间最早的，再次是路径最短的。
+    """
+    mtimes = mtimes or {}
+
+    def key(path):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return (bool(_UNIQUE_SUFFIX.search(stem)), mtimes.get(path, 0), len(path), path)
+
+    return sorted(paths, key=key)
+
+
+def _hardlink(keeper, duplicate):
+    """把 duplicate 原子地替换为指向 keeper 的硬链接"""
+    temporary = duplicate + '.bglink'
+    os.link(keeper, temporary)
+    try:
+        os.replace(temporary, duplicate)
+    except OSError:
+        os.remove(temporary)
+        raise
+
+
+def resolve_duplicates(groups, action='report', lang='zh', target_dir=None, confirm=True):
+    """处理重复文件：报告、删除、替换为硬链接或移动到指定文件夹
+
+    删除和移动分别交给 batch_delete 和 batch_transfer，沿用它们的预览、确认和输出。
+
+    Args:
+        groups (list): find_duplicates 返回的重复组
+        action (str): report / delete / hardlink / move
+        lang (str): 语言选项 ('zh' 或 'en')
+        target_dir (str): action 为 move 时的目标文件夹
+        confirm (bool): 执行前是否需要确认
+
+    Returns:
+        bool: 操作是否成功
+    """
+    msg = MESSAGES[lang]
+    if action not in ACTIONS:
+        print(msg['invalid_action'].format(action))
+        return False
+    if not groups:
+        print(msg['no_duplicates'])
+        return action == 'report'
+
+    duplicates = []
+    for number, group in enumerate(groups, 1):
+        print(msg['group'].format(number, len(group), format_size(os.path.getsize(group[0]))))
+        print(msg['keep'].format(group[0]))
+        for path in group[1:]:
+            print(msg['duplicate'].format(path))
+            duplicates.append((group[0], path))
+
+    if action == 'report':
+        return True
+    # 路径中可能含有通配符字符，转义后按字面路径处理
+    escaped = [glob.escape(path) for _, path in duplicates]
+    if action == 'delete':
+        return batch_delete(escaped, lang, confirm)
+    if action == 'move':
+        if not target_dir:
+            print(msg['missing_target'])
+            return False
+        # 重复文件不会被其他程序占用，不需要等待
+        return bool(batch_transfer(escaped, target_dir, 'move', lang, wait_time=0))
+
+    if confirm and input(msg['confirm_hardlink']).lower() != 'y':
+        print(msg['cancelled'])
+        return False
+    linked = 0
+    # 中断后重新运行即可继续：已替换为硬链接的文件不再算作重复
+    with Progress(len(duplicates), 'hardlink', lang) as progress:
+        for keeper, path in duplicates:
+            if progress.cancelled:
+                break
+            try:
+                _hardlink(keeper, path)
+                linked += 1
+                print(msg['linked'].format(path))
+                progress.advance()
+            except OSError as e:
+                print(msg['link_error'].format(path, str(e)))
+                progress.advance(error=True)
+    print(msg['link_complete'].format(linked))
+    return linked > 0 and not progress.cancelled
+
+
+def find_and_resolve_duplicates(folder_path, action='report', lang='zh', target_dir=None,
+                                recursive=True, confirm=True, where=None):
+    """查找文件夹中的重复文件并按 action 处理"""
+    msg = MESSAGES[lang]
+    groups, stats = find_duplicates([folder_path], recursive=recursive, lang=lang, where=where)
+    result = resolve_duplicates(groups, action, lang, target_dir, confirm)
+    if groups:
+        reclaimable = sum(os.path.getsize(group[0]) * (len(group) - 1)
+                          for group in groups if os.path.exists(group[0]))
+        print(msg['summary'].format(len(groups), format_size(reclaimable), format_size(stats['bytes_read']),
+                                    stats['bytes_read'] / stats['total_bytes'] if stats['total_bytes'] else 0))
+    return result
@@ -0,0 +1,438 @@
+import os
+import re
+import stat
+import time
+from datetime import datetime
+from .audio_header import AUDIO_EXTENSIONS, AudioInfo, read_audio_header
+
+# 大小单位（按 1024 进位）
+SIZE_UNITS = {'': 1, 'b': 1, 'k': 1024, 'kb': 1024, 'm': 1024 ** 2, 'mb': 1024 ** 2,
+              'g': 1024 ** 3, 'gb': 1024 ** 3, 't': 1024 ** 4, 'tb': 1024 ** 4}
+# 时长单位（秒）
+DURATION_UNITS = {'': 1, 's': 1, 'min': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400, 'y': 365 * 86400}
+
+# 可用字段及其类型：size 为字节数，time 为时间点，age 为距今时长，audio 开头的需要读取音频文件头
+FIELDS = {
+    'size': 'size',
+    'mtime': 'time',
+    'ctime': 'time',
+    'age': 'duration',
+    'ext': 'ext',
+    'name': 'text',
+    'type': 'type',
+    'samplerate': 'audio_number',
+    'channels': 'audio_number',
+    'bits': 'audio_number',
+    'duration': 'audio_duration',
+    'format': 'audio_text',
+}
+TYPES = ('file', 'dir', 'link')
+
+# 给 AI 和 --help 的简要说明
+SYNTAX_HELP = (
+    "size > 1G and age > 30d; ext in (wav, flac); name ~ '^take[0-9]+'; "
+    "mtime >= 2024-01-01; samplerate >= 96000 or bits == 24; not type == dir"
+)
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<op>==|!=|<=|>=|!~|=|<|>|~)
+  | (?P<punct>[(),])
+  | "(?P<dq>[^"]*)"
+  | '(?P<sq>[^']*)'
+  | (?P<word>[^\s(),=!<>~"']+)
+)""", re.VERBOSE)
+
+_NUMBER_UNIT = re.compile(r'(\d+(?:\.\d+)?)\s*([a-z]*)', re.IGNORECASE)
+_COMPARE = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+# 读取音频文件头的代价远高于比较 stat 字段，同一个 and 中排在最后
+_AUDIO_COST = 2
+
+
+def parse_size(text):
+    """'1.5G' -> 字节数"""
+    match = _NUMBER_UNIT.fullmatch(text.strip())
+    if not match or match.group(2).lower() not in SIZE_UNITS:
+        raise ValueError(f"无效的大小: {text}（示例: 500K、1.5G）")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+
+def parse_duration(text):
+    """'30d' -> 秒数；单位 s、min、h、d、w、y，不带单位时为秒"""
+    match = _NUMBER_UNIT.fullmatch(text.strip())
+    if not match or match.group(2).lower() not in DURATION_UNITS:
+        raise ValueError(f"无效的时长: {text}（示例: 90s、10min、12h、30d、2w、1y）")
+    return float(match.group(1)) * DURATION_UNITS[match.group(2).lower()]
+
+
+def parse_time(text, now):
+    """日期（2024-01-31、'2024-01-31 08:00'）或相对时长（30d 表示 30 天前）-> 时间戳"""
+    for fmt in ('%Y-%m-%d', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return datetime.strptime(text.strip(), fmt).timestamp()
+        except ValueError:
+            pass
+    try:
+        return now - parse_duration(text)
+    except ValueError:
+        raise ValueError(f"无效的时间: {text}（示例: 2024-01-31、'2024-01-31 08:00'、30d）") from None
+
+
+def _extension(value):
+    value = value.lower()
+    return value if value.startswith('.') or not value else '.' + value
+
+
+class _Subject:
+    """被检查的文件：复用 DirEntry（或文件索引条目）缓存的 stat 结果，只有路径时才调用 os.stat"""
+
+    __slots__ = ('path', 'name', '_entry', '_stat', '_audio')
+
+    def __init__(self, item):
+        if isinstance(item, (str, bytes, os.PathLike)) and not hasattr(item, 'stat'):
+            self.path = os.fspath(item)
+            self.name = os.path.basename(self.path)
+            self._entry = None
+        else:
+            self.path = item.path
+            self.name = item.name
+            self._entry = item
+        self._stat = None
+        self._audio = False
+
+    def stat(self):
+        if self._stat is None:
+            if self._entry is not None:
+                try:
+                    self._stat = self._entry.stat()
+                except OSError:
+                    self._stat = self._entry.stat(follow_symlinks=False)
+            else:
+                try:
+                    self._stat = os.stat(self.path)
+                except OSError:
+                    self._stat = os.lstat(self.path)
+        return self._stat
+
+    def is_link(self):
+        if self._entry is not None:
+            return self._entry.is_symlink()
+        return os.path.islink(self.path)
+
+    def audio(self):
+        if self._audio is False:
+            self._audio = audio_info(self.path)
+        return self._audio
+
+
+def audio_info(path):
+    """读取音频信息：优先使用文件索引和音频元数据缓存，非音频文件或无法识别时返回 None"""
+    if os.path.splitext(path)[1].lower() not in AUDIO_EXTENSIONS:
+        return None
+    from .fs_index import get_index
+    index = get_index()
+    if index is not None and index.root_for(path) is not None:
+        try:
+            meta = index.metadata(path)
+        except Exception:
+            meta = None
+        if meta and 'audio' in meta:
+            audio = meta['audio']
+            return AudioInfo(audio['format'], audio['samplerate'], audio['channels'], audio['bits'], audio['frames'])
+    from .audio_cache import get_cache
+    cache = get_cache()
+    try:
+        st = os.stat(path)
+        info = cache.get(path, st) if cache is not None else None
+        if info is not None:
+            return info
+        info = read_audio_header(path)
+        if info is None:
+            # MP3/M4A/OGG 等没有纯 Python 解析器的格式交给分类模块（需要 soundfile、mutagen）
+            try:
+                from .audio_classifier import probe_audio
+            except ImportError:
+                return None
+            info = probe_audio(path)
+    except (OSError, ValueError, RuntimeError):
+        return None
+    if cache is not None:
+        cache.put_many([(path, st, info)])
+    return info
+
+
+class _Parser:
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = []
+        position = 0
+        while position < len(expression):
+            match = _TOKEN.match(expression, position)
+            if match is None or match.end() == position:
+                if expression[position:].strip():
+                    raise ValueError(f"无法解析的筛选条件: {expression[position:]}")
+                break
+            position = match.end()
+            kind = match.lastgroup
+            if kind in ('dq', 'sq'):
+                self.tokens.append(('value', match.group(kind)))
+            else:
+                self.tokens.append((kind, match.group(kind)))
+        self.position = 0
+        self.now = time.time()
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def keyword(self, word):
+        kind, value = self.peek()
+        if kind == 'word' and value.lower() == word:
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, punct):
+        kind, value = self.take()
+        if kind != 'punct' or value != punct:
+            raise ValueError(f"筛选条件中缺少 '{punct}': {self.expression}")
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("筛选条件为空")
+        node = self.parse_or()
+        if self.position < len(self.tokens):
+            raise ValueError(f"筛选条件中有多余的内容: {self.tokens[self.position][1]}")
+        return node
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.keyword('or'):
+            nodes.append(self.parse_and())
+        if len(nodes) == 1:
+            return nodes[0]
+        nodes.sort(key=lambda node: node[1])
+        tests = [test for test, _ in nodes]
+        return (lambda subject: any(test(subject) for test in tests)), max(cost for _, cost in nodes)
+
+    def parse_and(self):
+        nodes = [self.parse_not()]
+        while self.keyword('and'):
+            nodes.append(self.parse_not())
+        if len(nodes) == 1:
+            return nodes[0]
+        # 先比较便宜的条件，不满足时不再读取音频文件头
+        nodes.sort(key=lambda node: node[1])
+        tests = [test for test, _ in nodes]
+        return (lambda subject: all(test(subject) for test in tests)), max(cost for _, cost in nodes)
+
+    def parse_not(self):
+        if self.keyword('not'):
+            test, cost = self.parse_not()
+            return (lambda subject: not test(subject)), cost
+        kind, value = self.peek()
+        if kind == 'punct' and value == '(':
+            self.take()
+            node = self.parse_or()
+            self.expect(')')
+            return node
+        return self.parse_comparison()
+
+    def parse_values(self):
+        """in 后面的 (a, b, c)；也接受单个值"""
+        kind, value = self.peek()
+        if kind != 'punct' or value != '(':
+            return [self.value()]
+        self.take()
+        values = [self.value()]
+        while self.peek() == ('punct', ','):
+            self.take()
+            values.append(self.value())
+        self.expect(')')
+        return values
+
+    def value(self):
+        kind, value = self.take()
+        if kind not in ('word', 'value'):
+            raise ValueError(f"筛选条件中缺少值: {self.expression}")
+        return value
+
+    def parse_comparison(self):
+        kind, field = self.take()
+        if kind is None:
+            raise ValueError(f"筛选条件不完整: {self.expression}")
+        if kind != 'word' or field.lower() not in FIELDS:
+            raise ValueError(f"未知的筛选字段: {field}（可用: {', '.join(FIELDS)}）")
+        field = field.lower()
+        if self.keyword('in'):
+            return self.membership(field, self.parse_values(), False)
+        if self.keyword('not'):
+            if not self.keyword('in'):
+                raise ValueError(f"'{field} not' 后面应为 in")
+            return self.membership(field, self.parse_values(), True)
+        kind, op = self.take()
+        if kind != 'op':
+            raise ValueError(f"字段 {field} 后面缺少比较运算符")
+        op = '==' if op == '=' else op
+        return self.compare(field, op, self.value())
+
+    def membership(self, field, values, negate):
+        kind = FIELDS[field]
+        if kind == 'ext':
+            allowed = {_extension(value) for value in values}
+            get = self.getter(field)
+        elif kind in ('text', 'audio_text', 'type'):
+            allowed = {value.lower() for value in values}
+            base = self.getter(field)
+            get = lambda subject: (base(subject) or '').lower() if kind != 'type' else base(subject)
+            if kind == 'type' and not allowed <= set(TYPES):
+                raise ValueError(f"type 只能是 {', '.join(TYPES)}")
+        else:
+            allowed = {self.convert(field, value) for value in values}
+            get = self.getter(field)
+        cost = _AUDIO_COST if kind.startswith('audio') else 1
+
+        def test(subject):
+            value = get(subject)
+            if value is None:
+                return negate
+            if kind == 'type':
+                return (not value.isdisjoint(allowed)) != negate
+            return (value in allowed) != negate
+        return test, cost
+
+    def convert(self, field, text):
+        kind = FIELDS[field]
+        if kind == 'size':
+            return parse_size(text)
+        if kind == 'time':
+            return parse_time(text, self.now)
+        if kind in ('duration', 'audio_duration'):
+            return parse_duration(text)
+        if kind == 'audio_number':
+            try:
+                return float(text[:-1]) * 1000 if field == 'samplerate' and text.lower().endswith('k') \
+                    else float(text)
+            except ValueError:
+                raise ValueError(f"{field} 应为数字: {text}") from None
+        return text
+
+    def getter(self, field):
+        """返回从 _Subject 取字段值的函数；取不到（如非音频文件的采样率）时返回 None"""
+        now = self.now
+        if field == 'size':
+            return lambda subject: subject.stat().st_size
+        if field == 'mtime':
+            return lambda subject: subject.stat().st_mtime
+        if field == 'ctime':
+            return lambda subject: subject.stat().st_ctime
+        if field == 'age':
+            return lambda subject: now - subject.stat().st_mtime
+        if field == 'ext':
+            return lambda subject: os.path.splitext(subject.name)[1].lower()
+        if field == 'name':
+            return lambda subject: subject.name
+        if field == 'type':
+            def types(subject):
+                mode = subject.stat().st_mode
+                kinds = {'dir'} if stat.S_ISDIR(mode) else {'file'} if stat.S_ISREG(mode) else set()
+                if subject.is_link():
+                    kinds.add('link')
+                return kinds
+            return types
+        if field == 'duration':
+            return lambda subject: subject.audio().duration if subject.audio() else None
+        return lambda subject: getattr(subject.audio(), field, None)
+
+    def compare(self, field, op, text):
+        kind = FIELDS[field]
+        get = self.getter(field)
+        cost = _AUDIO_COST if kind.startswith('audio') else (0 if kind in ('ext', 'text') else 1)
+        if op in ('~', '!~'):
+            if kind not in ('text', 'ext', 'audio_text'):
+                raise ValueError("正则匹配（~）只能用于 name、ext、format")
+            try:
+                pattern = re.compile(text)
+            except re.error as e:
+                raise ValueError(f"无效的正则表达式 {text}: {e}") from None
+            negate = op == '!~'
+
+            def test(subject):
+                value = get(subject)
+                return value is not None and (pattern.search(value) is not None) != negate
+            return test, cost
+        if kind == 'type':
+            if op not in ('==', '!=') or text.lower() not in TYPES:
+                raise ValueError(f"type 只能用 == 或 != 比较 {', '.join(TYPES)}")
+            return self.membership(field, [text], op == '!=')
+        if kind in ('ext', 'text', 'audio_text'):
+            if op not in ('==', '!='):
+                raise ValueError(f"{field} 只能用 ==、!=、in 或 ~ 比较")
+            return self.membership(field, [text], op == '!=')
+        expected = self.convert(field, text)
+        compare = _COMPARE[op]
+
+        def test(subject):
+            value = get(subject)
+            return value is not None and compare(value, expected)
+        return test, cost
+
+
+class FileFilter:
+    """编译后的筛选条件
+
+    条件只用到 DirEntry.stat() 中已有的字段（大小、修改/创建时间、类型）和文件名，
+    scandir 遍历时不会产生额外的系统调用；音频字段（采样率、位深、声道数、时长、格式）
+    只在其他条件都满足时才读取文件头，并使用文件索引和音频元数据缓存。
+
+    示例: "size > 1G and age > 30d"、"ext in (wav, flac) and samplerate >= 96k"、"name ~ '^take[0-9]+'"
+    """
+
+    def __init__(self, expression):
+        """
+        Raises:
+            ValueError: 条件无法解析
+        """
+        self.expression = expression.strip()
+        self._test, cost = _Parser(self.expression).parse()
+        self.needs_audio = cost >= _AUDIO_COST
+
+    def match(self, item):
+        """判断 DirEntry、文件索引条目或路径是否满足条件；文件无法访问时返回 False"""
+        try:
+            return self._test(_Subject(item))
+        except OSError:
+            return False
+
+    __call__ = match
+
+    def filter(self, items):
+        """逐个产出满足条件的项"""
+        for item in items:
+            if self.match(item):
+                yield item
+
+    def __repr__(self):
+        return f"FileFilter({self.expression!r})"
+
+
+def compile_filter(where):
+    """把筛选条件字符串编译为 FileFilter；None 或空字符串返回 None，FileFilter 原样返回
+
+    Raises:
+        ValueError: 条件无法解析
+    """
+    if where is None or isinstance(where, FileFilter):
+        return where
+    where = str(where).strip()
+    return FileFilter(where) if where else None
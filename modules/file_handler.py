@@ -1,6 +1,10 @@
 import os
 import glob
 from pathlib import Path
+from .pattern_expander import expand_patterns
+from .file_filter import compile_filter
+from .profiler import span
+from .progress import Progress
 
 MESSAGES = {
     'zh': {
@@ -10,6 +14,7 @@ MESSAGES = {
         'delete_cancelled': "删除操作已取消",
         'deleting': "正在删除: {}",
         'delete_complete': "删除完成，共删除 {} 个文件",
+        'filtered_out': "不再满足筛选条件，跳过: {}",
         'delete_error': "删除文件时出错: {}"
     },
     'en': {
@@ -19,30 +24,30 @@ MESSAGES = {
         'delete_cancelled': "Delete operation cancelled",
         'deleting': "Deleting: {}",
         'delete_complete': "Deletion complete, {} files deleted",
+        'filtered_out': "No longer matches the filter, skipped: {}",
         'delete_error': "Error deleting file: {}"
     }
 }
 
-def batch_delete(file_patterns, lang='zh', confirm=True):
+def batch_delete(file_patterns, lang='zh', confirm=True, where=None):
     """批量删除文件
     
     Args:
         file_patterns (list): 文件匹配模式列表
         lang (str): 语言选项
         confirm (bool): 是否需要确认
+        where (str): 筛选条件（见 file_filter），如 "size > 1G and age > 30d"
     
     Returns:
         bool: 操作是否成功
     """
     msg = MESSAGES[lang]
     try:
-        # 收集所有匹配的文件
-        files_to_delete = []
-        for pattern in file_patterns:
-            # 规范化路径
-            pattern = os.path.normpath(pattern)
-            # 展开通配符
-            files_to_delete.extend(glob.glob(pattern, recursive=True))
+        where = compile_filter(where)
+        # 收集所有匹配的文件（同一根目录下的多个模式只遍历一次）
+        files_to_delete = list(expand_patterns(
+            (os.path.normpath(pattern) for pattern in file_patterns), where=where
+        ))
         
         if not files_to_delete:
             print(msg['no_files'])
@@ -60,16 +65,31 @@ def batch_delete(file_patterns, lang='zh', confirm=True):
         
         # 执行删除
         deleted_count = 0
-        for file_path in files_to_delete:
-            try:
-                print(msg['deleting'].format(file_path))
-                os.remove(file_path)
-                deleted_count += 1
-            except Exception as e:
-                print(msg['delete_error'].format(str(e)))
+        with Progress(len(files_to_delete), 'delete', lang) as progress:
+            for index, file_path in enumerate(files_to_delete):
+                if progress.cancelled:
+                    progress.save_resume({
+                        'operation': 'delete',
+                        'files': [glob.escape(os.path.abspath(path)) for path in files_to_delete[index:]]
+                    })
+                    break
+                # 确认期间文件可能被修改，删除前按实时的 stat 再检查一次
+                if where is not None and not where.match(file_path):
+                    print(msg['filtered_out'].format(file_path))
+                    progress.advance()
+                    continue
+                try:
+                    print(msg['deleting'].format(file_path))
+                    with span('fs.remove'):
+                        os.remove(file_path)
+                    deleted_count += 1
+                    progress.advance()
+                except Exception as e:
+                    print(msg['delete_error'].format(str(e)))
+                    progress.advance(error=True)
         
         print(msg['delete_complete'].format(deleted_count))
-        return True
+        return not progress.cancelled
         
     except Exception as e:
         print(msg['delete_error'].format(str(e)))
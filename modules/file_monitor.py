@@ -3,7 +3,10 @@ import os
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from .file_transfer import batch_transfer
+from .file_filter import compile_filter
 from .prefix_handler import add_prefix
+from .profiler import span
+from . import fs_index
 
 MESSAGES = {
     'zh': {
@@ -33,7 +36,7 @@ MESSAGES = {
 }
 
 class SmartFileHandler(FileSystemEventHandler):
-    def __init__(self, source_root, target_root, file_types=None, lang='zh'):
+    def __init__(self, source_root, target_root, file_types=None, lang='zh', wait_time=3, where=None):
         """初始化智能文件处理器
         
         Args:
@@ -41,11 +44,15 @@ class SmartFileHandler(FileSystemEventHandler):
             target_root (str): 目标文件夹根目录
             file_types (list): 要处理的文件类型列表（如 ['.wav']）
             lang (str): 语言选项
+            wait_time (float): 等待写入完成的秒数：新文件距上次修改不足这么多秒时先等够再移动（见 batch_transfer）
+            where (str|FileFilter): 筛选条件，只移动满足条件的新文件（写入完成后检查）
         """
         self.source_root = os.path.abspath(source_root)
         self.target_root = os.path.abspath(target_root)
         self.file_types = file_types or ['.wav']
         self.lang = lang
+        self.wait_time = wait_time
+        self.where = compile_filter(where)
         self.msg = MESSAGES[lang]
         
     def _get_relative_path(self, path):
@@ -59,6 +66,10 @@ class SmartFileHandler(FileSystemEventHandler):
         
     def on_created(self, event):
         """当检测到新文件或文件夹时触发"""
+        self.process(event)
+
+    def process(self, event):
+        """处理一个新建事件，返回是否成功（不需要处理的文件也算成功）"""
         try:
             if event.is_directory:
                 # 处理新文件夹
@@ -70,7 +81,7 @@ class SmartFileHandler(FileSystemEventHandler):
                 # 处理新文件
                 file_path = event.src_path
                 if not any(file_path.lower().endswith(ext.lower()) for ext in self.file_types):
-                    return
+                    return True
                     
                 print(self.msg['new_file'].format(file_path))
                 
@@ -83,27 +94,94 @@ class SmartFileHandler(FileSystemEventHandler):
                 
                 # 移动文件
                 print(self.msg['processing'].format(file_path))
-                results = batch_transfer(
-                    [file_path],
-                    target_dir,
-                    'move',
-                    self.lang
-                )
+                with span('monitor.ingest'):
+                    results = batch_transfer(
+                        [file_path],
+                        target_dir,
+                        'move',
+                        self.lang,
+                        wait_time=self.wait_time,
+                        where=self.where
+                    )
                 
                 if results:
                     print(self.msg['process_complete'].format(results[0][1]))
+            return True
                     
         except Exception as e:
             print(self.msg['error'].format(str(e)))
+            return False
+
+class IndexEventHandler(FileSystemEventHandler):
+    """把监控到的文件变化写入文件索引（fs_index），使索引保持最新"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def _apply(self, update, *paths):
+        try:
+            update(*paths)
+        except Exception as e:
+            print(fs_index.MESSAGES['zh']['error'].format(str(e)))
+
+    def on_created(self, event):
+        self._apply(self.index.update_path, event.src_path)
+
+    def on_modified(self, event):
+        # 目录的修改事件只表示其中的条目有变化，条目本身会有各自的事件
+        if not event.is_directory:
+            self._apply(self.index.update_path, event.src_path)
+
+    def on_deleted(self, event):
+        self._apply(self.index.remove_path, event.src_path)
+
+    def on_moved(self, event):
+        self._apply(self.index.move_path, event.src_path, event.dest_path)
+
+
+class IndexMonitor:
+    """只维护文件索引的监控器：监控所有已建立索引的根目录"""
+
+    def __init__(self, index=None):
+        self.index = index or fs_index.get_index()
+        self.observer = None
+        self.roots = []
+
+    def start(self):
+        """开始监控，返回被监控的根目录列表"""
+        self.roots = [root for root in self.index.roots() if os.path.isdir(root)]
+        handler = IndexEventHandler(self.index)
+        self.observer = Observer()
+        for root in self.roots:
+            self.observer.schedule(handler, root, recursive=True)
+        self.observer.start()
+        for root in self.roots:
+            self.index.watch(root)
+        return self.roots
+
+    def stop(self):
+        if self.observer:
+            for root in self.roots:
+                self.index.unwatch(root)
+            self.observer.stop()
+            self.observer.join()
+
 
 class SmartFolderMonitor:
-    def __init__(self, source_root, target_root, file_types=None, lang='zh'):
-        """初始化智能文件夹监控器"""
+    def __init__(self, source_root, target_root, file_types=None, lang='zh', wait_time=3, where=None):
+        """初始化智能文件夹监控器
+
+        wait_time 为等待写入完成的秒数：新文件距上次修改不足 wait_time 秒时先等够再移动，
+        已经超过的直接移动（而不是每个文件都固定等待 wait_time 秒）。
+        """
         self.source_root = source_root
         self.target_root = target_root
         self.file_types = file_types
         self.lang = lang
+        self.wait_time = wait_time
+        self.where = where
         self.observer = None
+        self.index = None
         self.msg = MESSAGES[lang]
         
     def start(self):
@@ -115,7 +193,9 @@ class SmartFolderMonitor:
             self.source_root,
             self.target_root,
             self.file_types,
-            self.lang
+            self.lang,
+            self.wait_time,
+            self.where
         )
         
         self.observer = Observer()
@@ -124,11 +204,21 @@ class SmartFolderMonitor:
             self.source_root,
             recursive=True  # 递归监控所有子文件夹
         )
+        # 源文件夹已建立索引时，同一个监控器顺便保持索引最新
+        index = fs_index.get_index()
+        if index is not None and index.root_for(self.source_root) is not None:
+            self.observer.schedule(IndexEventHandler(index), self.source_root, recursive=True)
+            self.index = index
         self.observer.start()
+        if self.index is not None:
+            self.index.watch(self.source_root)
         
     def stop(self):
         """停止监控"""
         if self.observer:
+            if self.index is not None:
+                self.index.unwatch(self.source_root)
+                self.index = None
             self.observer.stop()
             self.observer.join()
             print(self.msg['stop_monitoring']) 
\ No newline at end of file
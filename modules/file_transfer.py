@@ -1,7 +1,14 @@
 import os
+import glob
 import shutil
 import time
 import psutil  # 用于检查文件占用
+from .pattern_expander import expand_patterns, has_magic
+from .file_filter import compile_filter
+from .audio_cache import record_moves
+from . import profiler
+from .progress import Progress
+from .io_scheduler import IOScheduler
 
 MESSAGES = {
     'zh': {
@@ -13,7 +20,10 @@ MESSAGES = {
         'copy_complete': "批量复制完成！",
         'error': "操作过程中出错：{}",
         'file_in_use': "文件正在被其他程序使用：{}",
-        'waiting': "等待文件释放: {}"
+        'waiting': "等待文件释放: {}",
+        'filtered_out': "不满足筛选条件，跳过: {}",
+        'file_failed': "处理失败 {}: {}",
+        'no_space': "目标磁盘空间不足：需要 {}，可用 {}（{}），未执行任何复制"
     },
     'en': {
         'source_not_exist': "Error: Source file/folder '{}' does not exist",
@@ -24,22 +34,41 @@ MESSAGES = {
         'copy_complete': "Batch copy completed!",
         'error': "Error during operation: {}",
         'file_in_use': "File is in use by another program: {}",
-        'waiting': "Waiting for file to be released: {}"
+        'waiting': "Waiting for file to be released: {}",
+        'filtered_out': "Skipped, does not match the filter: {}",
+        'file_failed': "Failed {}: {}",
+        'no_space': "Not enough free space on the target: {} needed, {} available ({}); nothing was copied"
     }
 }
 
-def _get_unique_path(target_path):
-    """获取唯一的目标路径，通过添加数字后缀避免冲突"""
-    if not os.path.exists(target_path):
+def _get_unique_path(target_path, reserved=()):
+    """获取唯一的目标路径，通过添加数字后缀避免冲突（reserved 为本批已分配的路径）"""
+    if not os.path.exists(target_path) and target_path not in reserved:
         return target_path
         
     base, ext = os.path.splitext(target_path)
     counter = 1
-    while os.path.exists(target_path):
+    while os.path.exists(target_path) or target_path in reserved:
         target_path = f"{base}_{counter}{ext}"
         counter += 1
     return target_path
 
+def _claim_unique_path(target_path):
+    """原子地占用一个还不存在的目标路径，冲突时依次尝试 _1、_2 …
+
+    用 O_CREAT|O_EXCL 创建空的占位文件，之后的移动或复制只替换这个占位，
+    不会覆盖其他程序或同时运行的任务（例如共用目标文件夹的多个监控）写入的同名文件。
+    """
+    base, ext = os.path.splitext(target_path)
+    counter = 0
+    while True:
+        candidate = f"{base}_{counter}{ext}" if counter else target_path
+        try:
+            os.close(os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return candidate
+        except FileExistsError:
+            counter += 1
+
 def is_file_in_use(file_path):
     """检查文件是否被占用"""
     try:
@@ -59,50 +88,167 @@ def is_file_in_use(file_path):
     except (IOError, OSError):
         return True
 
-def batch_transfer(files, target_dir, operation='move', lang='zh', wait_time=3):
-    """批量移动或复制文件到指定目录"""
+def _expand_sources(files, where=None):
+    """展开源路径中的通配符，字面路径保持原样（不存在时由调用方报告）
+
+    Yields:
+        tuple: (路径, 是否为字面路径)；通配符展开的结果已按 where 筛选，调用方在处理前还会再检查一次
+    """
+    patterns = []
+    for file_path in files:
+        if has_magic(file_path) and not os.path.lexists(file_path):
+            patterns.append(file_path)
+        else:
+            yield file_path, True
+    # 所有通配符模式共享一次目录遍历
+    for file_path in expand_patterns(patterns, where=where):
+        yield file_path, False
+
+def _settle(file_path, mtime, wait_time, msg):
+    """只等待最近修改过的文件：距上次修改已超过 wait_time 秒的文件不再等待"""
+    remaining = wait_time - (time.time() - mtime)
+    if remaining > 0:
+        print(msg['waiting'].format(file_path))
+        with profiler.span('transfer.wait'):
+            time.sleep(remaining)
+
+def _check_free_space(jobs, target_dir, msg):
+    """批量复制开始前检查目标设备的剩余空间，不够时返回 False"""
+    from .duplicate_finder import format_size
+
+    needed = sum(job['size'] for job in jobs if not job['rename'])
+    if not needed:
+        return True
+    free = shutil.disk_usage(target_dir).free
+    if needed > free:
+        print(msg['no_space'].format(format_size(needed), format_size(free), target_dir))
+        return False
+    return True
+
+def batch_transfer(files, target_dir, operation='move', lang='zh', wait_time=3, where=None):
+    """批量移动或复制文件到指定目录
+
+    按设备调度（见 io_scheduler）：源和目标在同一设备上的移动只是重命名，先于数据复制执行；
+    需要复制数据的文件按源、目标设备的并发上限并行处理（机械硬盘和网络存储很小，NVMe 较大），
+    开始复制前检查目标设备的剩余空间。单个文件失败时记为错误并继续，返回实际完成的文件。
+
+    wait_time 的含义：只有最近 wait_time 秒内修改过的文件才会等待，等到距上次修改满 wait_time 秒为止；
+    更早修改的文件直接处理（以前是每个文件前都固定等待 wait_time 秒）。
+
+    where 为筛选条件（见 file_filter）；每个文件在等待写入完成后、移动或复制之前按实时的 stat 再检查一次，
+    监控传入的新文件按大小筛选时看到的是完整的文件。
+    """
     try:
+        msg = MESSAGES[lang]
+        where = compile_filter(where)
         # 确保目标目录存在
         os.makedirs(target_dir, exist_ok=True)
-        msg = MESSAGES[lang]
         
-        results = []
-        for file_path in files:
-            if not os.path.exists(file_path):
+        scheduler = IOScheduler()
+        target_device = scheduler.register(target_dir)
+        sources = list(_expand_sources(files, where))
+        jobs = []
+        missing = 0
+        for file_path, _ in sources:
+            try:
+                st = os.stat(file_path)
+            except OSError:
                 print(msg['source_not_exist'].format(file_path))
+                missing += 1
                 continue
-            
-            # 等待指定时间
-            print(msg['waiting'].format(file_path))
-            time.sleep(wait_time)
-            
-            # 检查文件是否被占用
-            if is_file_in_use(file_path):
-                print(msg['file_in_use'].format(file_path))
-                continue
-            
-            # 构建目标文件路径
-            filename = os.path.basename(file_path)
-            target_path = os.path.join(target_dir, filename)
-            
-            # 获取唯一的目标路径
-            target_path = _get_unique_path(target_path)
-            
-            # 执行操作
-            if operation == 'move':
-                shutil.move(file_path, target_path)
-                print(msg['moved'].format(file_path, target_path))
-            else:  # copy
-                shutil.copy2(file_path, target_path)
-                print(msg['copied'].format(file_path, target_path))
-                
-            results.append((file_path, target_path))
+            source_device = scheduler.register(file_path)
+            # 实际的目标文件名在等待写入完成之后才占用（见 _claim_unique_path）
+            target_path = os.path.join(target_dir, os.path.basename(file_path))
+            jobs.append({'source': file_path, 'target': target_path, 'mtime': st.st_mtime,
+                         'size': st.st_size, 'devices': (source_device, target_device),
+                         'rename': operation == 'move' and source_device == target_device})
+
+        if not _check_free_space(jobs, target_dir, msg):
+            return []
+
+        done = {}
+
+        with Progress(len(sources), operation, lang,
+                      bytes_total=sum(job['size'] for job in jobs)) as progress:
+            if missing:
+                progress.advance(missing, error=True)
+
+            def settle(job):
+                # 在占用设备名额之前等待，等待写入的文件不会挡住同一设备上的其他文件
+                if not progress.cancelled:
+                    _settle(job['source'], job['mtime'], wait_time, msg)
+
+            def transfer(job):
+                if progress.cancelled:
+                    return
+                try:
+                    _transfer(job)
+                except Exception as e:
+                    # 单个文件失败（文件消失、权限不足等）不影响其他文件，已完成的移动照常返回和记录
+                    print(msg['file_failed'].format(job['source'], str(e)))
+                    done[id(job)] = None
+                    progress.advance(error=True)
+
+            def _transfer(job):
+                file_path = job['source']
+
+                # 检查文件是否被占用
+                with profiler.span('transfer.in_use_check'):
+                    in_use = is_file_in_use(file_path)
+                if in_use:
+                    print(msg['file_in_use'].format(file_path))
+                    progress.advance(error=True)
+                    done[id(job)] = None
+                    return
+
+                if where is not None and not where.match(file_path):
+                    print(msg['filtered_out'].format(file_path))
+                    progress.advance()
+                    done[id(job)] = None
+                    return
+
+                # 执行操作（等待期间文件可能仍在写入，重新取大小）
+                size = os.path.getsize(file_path)
+                target_path = _claim_unique_path(job['target'])
+                span = ('fs.rename' if job['rename'] else 'fs.move') if operation == 'move' else 'fs.copy'
+                with profiler.span(span, size):
+                    try:
+                        if operation == 'move' and job['rename']:
+                            # 同一设备上原子地替换占位
+                            os.replace(file_path, target_path)
+                        else:
+                            shutil.copy2(file_path, target_path)
+                    except BaseException:
+                        # 删除占位（以及复制了一半的内容），源文件仍在原处
+                        os.unlink(target_path)
+                        raise
+                    if operation == 'move' and not job['rename']:
+                        os.unlink(file_path)
+                print(msg['moved' if operation == 'move' else 'copied'].format(file_path, target_path))
+                done[id(job)] = (file_path, target_path)
+                progress.advance(nbytes=size)
+
+            # 同一设备上的移动只改元数据，先执行；需要读写数据的复制随后按设备并发执行
+            renames = [job for job in jobs if job['rename']]
+            copies = [job for job in jobs if not job['rename']]
+            for group in (renames, copies):
+                scheduler.run([(job['devices'], lambda job=job: transfer(job), lambda job=job: settle(job))
+                               for job in group])
+
+            if progress.cancelled:
+                progress.save_resume({
+                    'operation': operation,
+                    'files': [glob.escape(os.path.abspath(job['source'])) for job in jobs if id(job) not in done],
+                    'target_dir': os.path.abspath(target_dir)
+                })
+
+        results = [done[id(job)] for job in jobs if done.get(id(job))]
             
         # 显示完成消息
         if operation == 'move':
-            print(msg['move_complete'])
-        else:
-            print(msg['copy_complete'])
+            record_moves(results)
+        if not progress.cancelled:
+            print(msg['move_complete'] if operation == 'move' else msg['copy_complete'])
             
         return results
         
@@ -110,10 +256,10 @@ def batch_transfer(files, target_dir, operation='move', lang='zh', wait_time=3):
         print(msg['error'].format(str(e)))
         raise
 
-def batch_move(files, target_dir, lang='zh'):
+def batch_move(files, target_dir, lang='zh', where=None):
     """批量移动文件到指定目录（向后兼容）"""
-    return batch_transfer(files, target_dir, 'move', lang)
+    return batch_transfer(files, target_dir, 'move', lang, where=where)
 
-def batch_copy(files, target_dir, lang='zh'):
+def batch_copy(files, target_dir, lang='zh', where=None):
     """批量复制文件到指定目录"""
-    return batch_transfer(files, target_dir, 'copy', lang) 
\ No newline at end of file
+    return batch_transfer(files, target_dir, 'copy', lang, where=where) 
\ No newline at end of file
@@ -0,0 +1,781 @@
+import os
+import stat
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils import get_config_value
+from .audio_cache import default_cache_dir
+from .audio_header import AUDIO_EXTENSIONS, read_audio_header
+from .profiler import span
+
+MESSAGES = {
+    'zh': {
+        'not_a_folder': "错误：'{}' 不是文件夹",
+        'building': "正在建立索引: {}",
+        'built': "索引完成: {}（{} 个条目，{} 个文件夹，耗时 {:.1f} 秒）",
+        'cancelled': "建立索引已中断: {}",
+        'no_roots': "没有已建立索引的文件夹（用 python batchgenie.py index build <文件夹> 建立）",
+        'status_line': "  {}: {} 个条目，建立于 {}",
+        'dropped': "已删除索引: {}",
+        'not_indexed': "'{}' 没有建立索引",
+        'error': "更新文件索引时出错: {}"
+    },
+    'en': {
+        'not_a_folder': "Error: '{}' is not a folder",
+        'building': "Indexing: {}",
+        'built': "Indexed {} ({} entries, {} folders, {:.1f}s)",
+        'cancelled': "Indexing interrupted: {}",
+        'no_roots': "No indexed folders (create one with python batchgenie.py index build <folder>)",
+        'status_line': "  {}: {} entries, built {}",
+        'dropped': "Index removed: {}",
+        'not_indexed': "'{}' is not indexed",
+        'error': "Error updating the file index: {}"
+    }
+}
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS entries (
+        dir TEXT NOT NULL,
+        name TEXT NOT NULL,
+        kind INTEGER NOT NULL,
+        mode INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        ctime_ns INTEGER NOT NULL,
+        ext TEXT NOT NULL,
+        meta TEXT,
+        PRIMARY KEY (dir, name)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS entries_ext ON entries (ext, dir)",
+    """
+    CREATE TABLE IF NOT EXISTS directories (
+        dir TEXT PRIMARY KEY,
+        mtime_ns INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS roots (
+        path TEXT PRIMARY KEY,
+        built REAL NOT NULL
+    )
+    """,
+)
+
+# kind 字段的位：跟随符号链接后是目录 / 是符号链接 / 跟随符号链接后是普通文件
+KIND_DIR = 1
+KIND_LINK = 2
+KIND_FILE = 4
+# 每写入这么多条记录提交一次
+COMMIT_ROWS = 5000
+# 数据库不存在时，隔多久（秒）再检查一次；其他进程修改索引根目录后，隔多久重新读取
+RECHECK_INTERVAL = 60
+
+_ENTRY_COLUMNS = 'name, kind, mode, size, mtime_ns, ctime_ns'
+
+
+def _key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _subtree(key):
+    """返回 key 目录下所有后代目录键的范围 [low, high)（按字符串比较）"""
+    low = key if key.endswith(os.sep) else key + os.sep
+    return low, low[:-1] + chr(ord(os.sep) + 1)
+
+
+def _image_reader():
+    """返回读取图片文件头的函数和图片扩展名；没有安装 Pillow 时返回 (None, ())"""
+    try:
+        from .image_organizer import read_image_info, IMAGE_EXTENSIONS
+    except ImportError:
+        return None, ()
+    return read_image_info, IMAGE_EXTENSIONS
+
+
+def probe_metadata(path, ext=None, image_reader=None):
+    """读取音频或图片的文件头信息，返回 JSON 字符串；不是支持的格式或读取失败时返回 None"""
+    ext = ext if ext is not None else os.path.splitext(path)[1].lower()
+    try:
+        if ext in AUDIO_EXTENSIONS:
+            info = read_audio_header(path)
+            return json.dumps({'audio': info.to_dict()}) if info is not None else None
+        read_image_info, image_extensions = image_reader or _image_reader()
+        if read_image_info is not None and ext in image_extensions:
+            info = read_image_info(path)
+            info['date'] = info['date'].isoformat()
+            return json.dumps({'image': info})
+    except Exception:
+        return None
+    return None
+
+
+def _entry_row(entry_or_path, name, metadata, image_reader):
+    """根据 DirEntry 或路径生成 (name, kind, mode, size, mtime_ns, ctime_ns, ext, meta)
+
+    与 DirEntry.stat() 一样跟随符号链接；指向不存在目标的链接使用链接自身的信息。
+    """
+    if isinstance(entry_or_path, os.DirEntry):
+        is_link = entry_or_path.is_symlink()
+        try:
+            st = entry_or_path.stat()
+        except OSError:
+            st = entry_or_path.stat(follow_symlinks=False)
+        path = entry_or_path.path
+    else:
+        path = entry_or_path
+        is_link = os.path.islink(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = os.lstat(path)
+    kind = (KIND_DIR if stat.S_ISDIR(st.st_mode) else 0) | (KIND_LINK if is_link else 0) | \
+        (KIND_FILE if stat.S_ISREG(st.st_mode) else 0)
+    ext = os.path.splitext(name)[1].lower() if kind & KIND_FILE else ''
+    meta = probe_metadata(path, ext, image_reader) if metadata and kind & KIND_FILE else None
+    return (name, kind, st.st_mode, st.st_size, st.st_mtime_ns, st.st_ctime_ns, ext, meta)
+
+
+def _scan_directory(directory, metadata=False, image_reader=None):
+    """列出一个目录：返回 (目录, 目录 mtime_ns, 条目行列表, 需要继续扫描的子目录列表)
+
+    不进入符号链接指向的目录，避免循环；目录无法访问时 mtime_ns 为 None。
+    """
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+        with span('fs.scandir'), os.scandir(directory) as it:
+            entries = list(it)
+    except OSError:
+        return directory, None, [], []
+    rows = []
+    subdirs = []
+    for entry in entries:
+        try:
+            row = _entry_row(entry, entry.name, metadata, image_reader)
+        except OSError:
+            continue
+        rows.append(row)
+        if row[1] & KIND_DIR and not row[1] & KIND_LINK:
+            subdirs.append(entry.path)
+    return directory, mtime_ns, rows, subdirs
+
+
+class IndexedStat:
+    """索引中保存的 stat 信息，字段名与 os.stat_result 相同"""
+
+    __slots__ = ('st_mode', 'st_size', 'st_mtime_ns', 'st_ctime_ns')
+
+    def __init__(self, mode, size, mtime_ns, ctime_ns):
+        self.st_mode = mode
+        self.st_size = size
+        self.st_mtime_ns = mtime_ns
+        self.st_ctime_ns = ctime_ns
+
+    @property
+    def st_mtime(self):
+        return self.st_mtime_ns / 1e9
+
+    @property
+    def st_ctime(self):
+        return self.st_ctime_ns / 1e9
+
+
+class IndexedEntry:
+    """索引中的目录条目，接口与 os.DirEntry 相同（模式展开可以直接使用）
+
+    原地修改文件（追加、覆盖写入）不会改变所在目录的 mtime，没有监控时索引中的大小和修改时间可能过期：
+    trusted 为 False 时 stat() 与 DirEntry 一样实时读取并缓存，只有监控正在更新索引时才直接返回索引中的值。
+    """
+
+    __slots__ = ('name', '_directory', '_kind', '_row', '_trusted', '_stat')
+
+    def __init__(self, directory, name, kind, mode, size, mtime_ns, ctime_ns, trusted=False):
+        self.name = name
+        self._directory = directory
+        self._kind = kind
+        self._row = (mode, size, mtime_ns, ctime_ns)
+        self._trusted = trusted
+        self._stat = None
+
+    @property
+    def path(self):
+        # 大多数条目只用到 name，路径在需要时才拼接
+        return os.path.join(self._directory, self.name)
+
+    def is_dir(self, follow_symlinks=True):
+        if not follow_symlinks and self._kind & KIND_LINK:
+            return False
+        return bool(self._kind & KIND_DIR)
+
+    def is_file(self, follow_symlinks=True):
+        if not follow_symlinks and self._kind & KIND_LINK:
+            return False
+        return bool(self._kind & KIND_FILE)
+
+    def is_symlink(self):
+        return bool(self._kind & KIND_LINK)
+
+    def stat(self, follow_symlinks=True):
+        if not follow_symlinks and self._kind & KIND_LINK:
+            return os.lstat(self.path)
+        if self._trusted:
+            return IndexedStat(*self._row)
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def __fspath__(self):
+        return self.path
+
+    def __repr__(self):
+        return f"<IndexedEntry {self.name!r}>"
+
+
+class FileIndex:
+    """持久化的文件系统元数据索引（SQLite）
+
+    对配置的根目录做一次并行扫描，保存每个条目的类型、大小、修改时间、扩展名，
+    以及音频和图片的文件头信息；之后由 watchdog 监控（file_monitor.IndexEventHandler）增量更新。
+
+    查询某个目录时先比较目录的 mtime：文件的增删和重命名都会改变所在目录的 mtime，
+    不一致时只重新扫描这一个目录，所以即使监控没有运行，列表也不会过期。
+    文件大小和修改时间只有监控更新，本进程中没有监控覆盖的目录，条目的 stat() 实时读取（见 watch）。
+    配置 INDEX_VERIFY = False 时完全信任索引，适合监控常驻运行的场景。
+    """
+
+    def __init__(self, db_path=None):
+        """打开（必要时创建）索引数据库
+
+        Args:
+            db_path (str): 数据库路径，默认位于缓存目录下的 fs_index.sqlite3
+        """
+        self.db_path = db_path or default_index_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.verify = get_config_value('INDEX_VERIFY', True)
+        self.with_metadata = get_config_value('INDEX_METADATA', True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+        self._roots = []
+        self._roots_loaded = 0.0
+        self._image_reader = None
+        # 本进程中正在由监控更新的目录键 -> 监控数
+        self._watched = {}
+
+    # 根目录
+
+    def roots(self):
+        """已建立索引的根目录（规范化后的绝对路径）"""
+        if time.monotonic() - self._roots_loaded > RECHECK_INTERVAL:
+            with self._lock:
+                self._roots = [row[0] for row in self._conn.execute('SELECT path FROM roots')]
+            self._roots_loaded = time.monotonic()
+        return self._roots
+
+    def root_for(self, path):
+        """返回包含 path 的索引根目录，没有时返回 None"""
+        key = _key(path)
+        for root in self.roots():
+            if key == root or key.startswith(_subtree(root)[0]):
+                return root
+        return None
+
+    def watch(self, root):
+        """登记监控开始把 root 下的变化写入索引；监控覆盖的目录中，条目的 stat() 直接使用索引中的值"""
+        key = _key(root)
+        with self._lock:
+            self._watched[key] = self._watched.get(key, 0) + 1
+
+    def unwatch(self, root):
+        """监控停止"""
+        key = _key(root)
+        with self._lock:
+            count = self._watched.get(key, 0) - 1
+            if count > 0:
+                self._watched[key] = count
+            else:
+                self._watched.pop(key, None)
+
+    def watched(self, path):
+        """path 是否在本进程中正在运行的监控范围内"""
+        if not self._watched:
+            return False
+        key = _key(path)
+        with self._lock:
+            return any(key == root or key.startswith(_subtree(root)[0]) for root in self._watched)
+
+    def status(self):
+        """返回 [(根目录, 条目数, 建立时间)]"""
+        with self._lock:
+            rows = self._conn.execute('SELECT path, built FROM roots ORDER BY path').fetchall()
+            return [(root, self._conn.execute(
+                'SELECT COUNT(*) FROM entries WHERE dir = ? OR (dir >= ? AND dir < ?)',
+                (root,) + _subtree(root)).fetchone()[0], built) for root, built in rows]
+
+    # 建立索引
+
+    def build(self, root, max_workers=None, progress=None):
+        """并行扫描整个根目录，替换其中已有的索引记录
+
+        Args:
+            root (str): 根目录
+            max_workers (int): 扫描线程数，默认取配置 INDEX_WORKERS
+            progress (Progress): 进度对象，每扫描完一个目录前进一步；取消后不登记根目录
+
+        Returns:
+            tuple: (条目数, 目录数)；被取消时返回 None
+        """
+        root = os.path.abspath(root)
+        key = _key(root)
+        self._delete_tree(key, include_root=True)
+        counts = self._scan_tree(root, max_workers, progress)
+        if progress is not None and progress.cancelled:
+            return None
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO roots VALUES (?, ?)', (key, time.time()))
+            self._conn.commit()
+        self._roots_loaded = 0.0
+        return counts
+
+    def drop(self, root):
+        """删除根目录的索引；root 不是索引根目录时返回 False"""
+        key = _key(root)
+        with self._lock:
+            if self._conn.execute('SELECT 1 FROM roots WHERE path = ?', (key,)).fetchone() is None:
+                return False
+            self._conn.execute('DELETE FROM roots WHERE path = ?', (key,))
+            self._conn.commit()
+        self._roots_loaded = 0.0
+        # 仍被上级索引根目录包含时保留记录
+        if self.root_for(key) is None:
+            self._delete_tree(key, include_root=True)
+        return True
+
+    def _reader(self):
+        if self._image_reader is None:
+            self._image_reader = _image_reader()
+        return self._image_reader
+
+    def _scan_tree(self, top, max_workers=None, progress=None):
+        """用线程池逐层扫描 top 下的所有目录：每个目录一个任务，扫描到的子目录立即提交"""
+        max_workers = max_workers or get_config_value('INDEX_WORKERS', min(32, (os.cpu_count() or 1) * 4))
+        image_reader = self._reader() if self.with_metadata else None
+        entries = directories = 0
+        batch = []
+        with span('index.scan'), ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {executor.submit(_scan_directory, top, self.with_metadata, image_reader)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    directory, mtime_ns, rows, subdirs = future.result()
+                    if mtime_ns is None:
+                        continue
+                    if progress is None or not progress.cancelled:
+                        for subdir in subdirs:
+                            pending.add(executor.submit(_scan_directory, subdir, self.with_metadata, image_reader))
+                    batch.append((_key(directory), mtime_ns, rows))
+                    entries += len(rows)
+                    directories += 1
+                    if progress is not None:
+                        progress.advance(len(rows))
+                    if sum(len(item[2]) for item in batch) >= COMMIT_ROWS:
+                        self._store(batch)
+                        batch = []
+        self._store(batch)
+        return entries, directories
+
+    def _store(self, batch):
+        """写入 [(目录键, 目录 mtime_ns, 条目行列表)]，替换这些目录原有的记录"""
+        if not batch:
+            return
+        with self._lock:
+            for key, mtime_ns, rows in batch:
+                self._conn.execute('DELETE FROM entries WHERE dir = ?', (key,))
+                self._conn.executemany('INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                       [(key,) + row for row in rows])
+                self._conn.execute('INSERT OR REPLACE INTO directories VALUES (?, ?)', (key, mtime_ns))
+            self._conn.commit()
+
+    def _delete_tree(self, key, include_root=True):
+        """删除目录 key 下的全部记录（include_root 为 True 时包括 key 本身的条目列表）"""
+        low, high = _subtree(key)
+        with self._lock:
+            for table in ('entries', 'directories'):
+                self._conn.execute(f'DELETE FROM {table} WHERE dir >= ? AND dir < ?', (low, high))
+                if include_root:
+                    self._conn.execute(f'DELETE FROM {table} WHERE dir = ?', (key,))
+            self._conn.commit()
+
+    # 查询
+
+    def _rescan(self, directory, key):
+        """目录 mtime 变化后重新列出这一个目录，保留未变化文件的元数据，清理已消失的子目录"""
+        with self._lock:
+            old = {row[0]: row[1:] for row in self._conn.execute(
+                'SELECT name, kind, size, mtime_ns, meta FROM entries WHERE dir = ?', (key,))}
+        _, mtime_ns, rows, _ = _scan_directory(directory)
+        if mtime_ns is None:
+            self._delete_tree(key)
+            return
+        names = {}
+        for i, row in enumerate(rows):
+            names[row[0]] = row
+            previous = old.get(row[0])
+            if previous is not None and previous[1:3] == (row[3], row[4]):
+                rows[i] = row[:7] + (previous[3],)
+        for name, (kind, _, _, _) in old.items():
+            if kind & KIND_DIR and not kind & KIND_LINK:
+                current = names.get(name)
+                if current is None or not current[1] & KIND_DIR or current[1] & KIND_LINK:
+                    self._delete_tree(os.path.join(key, os.path.normcase(name)))
+        self._store([(key, mtime_ns, rows)])
+
+    def listing(self, directory):
+        """列出目录内容（IndexedEntry 列表）；目录不在任何索引根目录下时返回 None
+
+        Raises:
+            OSError: 目录不存在或无法访问（与 os.scandir 一致）
+        """
+        if self.root_for(directory) is None:
+            return None
+        key = _key(directory)
+        with span('index.listing'):
+            mtime_ns = os.stat(directory).st_mtime_ns
+            with self._lock:
+                row = self._conn.execute('SELECT mtime_ns FROM directories WHERE dir = ?', (key,)).fetchone()
+            if row is None and os.path.realpath(directory) != os.path.abspath(directory):
+                # 经由符号链接到达的目录不写入索引，否则同一批文件会以两个路径出现在查询结果中
+                return None
+            # 新出现的子目录还没有记录，总是需要扫描
+            if row is None or (self.verify and row[0] != mtime_ns):
+                self._rescan(directory, key)
+            with self._lock:
+                rows = self._conn.execute(
+                    f'SELECT {_ENTRY_COLUMNS} FROM entries WHERE dir = ?', (key,)).fetchall()
+        trusted = self.watched(directory)
+        return [IndexedEntry(directory, *row, trusted=trusted) for row in rows]
+
+    def _refresh_tree(self, key):
+        """查询整棵树之前调用：重新扫描 mtime 已变化的目录，并扫描还没有记录的新子目录"""
+        low, high = _subtree(key)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT dir, mtime_ns FROM directories WHERE dir = ? OR (dir >= ? AND dir < ?)',
+                (key, low, high)).fetchall()
+        if not rows:
+            self._scan_tree(key)
+            return
+        for directory, mtime_ns in rows:
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime_ns:
+                self._rescan(directory, directory)
+        with self._lock:
+            known = {row[0] for row in self._conn.execute(
+                'SELECT dir FROM directories WHERE dir = ? OR (dir >= ? AND dir < ?)', (key, low, high))}
+            subdirs = self._conn.execute(
+                'SELECT dir, name FROM entries WHERE (dir = ? OR (dir >= ? AND dir < ?)) AND kind & ? = ?',
+                (key, low, high, KIND_DIR | KIND_LINK, KIND_DIR)).fetchall()
+        scanned = []
+        for path in sorted(os.path.join(directory, os.path.normcase(name)) for directory, name in subdirs):
+            if path not in known and not any(path.startswith(_subtree(done)[0]) for done in scanned):
+                self._scan_tree(path)
+                scanned.append(path)
+
+    def walk(self, root):
+        """返回 root 下的全部条目 [(相对路径, IndexedEntry 参数)]，相对路径以 / 分隔，不进入符号链接指向的目录
+
+        整棵树只需一次查询，供 ** 模式使用；root 不在任何索引根目录下时返回 None。
+        IndexedEntry 参数为 (目录, 文件名, kind, mode, size, mtime_ns, ctime_ns)，需要 stat 信息时才创建条目
+        （没有监控时条目的 stat() 实时读取，见 IndexedEntry）。
+        """
+        if self.root_for(root) is None or not os.path.isdir(root):
+            return None
+        key = _key(root)
+        low, high = _subtree(key)
+        with span('index.walk'):
+            if self.verify:
+                self._refresh_tree(key)
+            with self._lock:
+                rows = self._conn.execute(
+                    f'SELECT dir, {_ENTRY_COLUMNS} FROM entries WHERE dir = ? OR (dir >= ? AND dir < ?)',
+                    (key, low, high)).fetchall()
+        cut = len(low)
+        if os.sep == '/':
+            return [(row[1] if row[0] == key else f"{row[0][cut:]}/{row[1]}", row) for row in rows]
+        return [(row[1] if row[0] == key else f"{row[0][cut:].replace(os.sep, '/')}/{row[1]}", row)
+                for row in rows]
+
+    def query(self, root, extensions=None, min_size=None, max_size=None,
+              modified_after=None, modified_before=None, recursive=True):
+        """按属性查询 root 下的文件；root 不在任何索引根目录下时返回 None
+
+        Args:
+            root (str): 查询的文件夹
+            extensions (iterable): 扩展名集合，如 {'.wav', '.flac'}
+            min_size (int): 最小字节数
+            max_size (int): 最大字节数
+            modified_after (float): 修改时间不早于此时间戳（秒）
+            modified_before (float): 修改时间早于此时间戳（秒）
+            recursive (bool): 是否包括子文件夹
+
+        Returns:
+            list: 匹配的文件路径
+        """
+        if self.root_for(root) is None:
+            return None
+        key = _key(root)
+        with span('index.query'):
+            if self.verify:
+                if recursive:
+                    self._refresh_tree(key)
+                else:
+                    self.listing(root)
+            conditions = ['kind & ? != 0']
+            values = [KIND_FILE]
+            if recursive:
+                low, high = _subtree(key)
+                conditions.append('(dir = ? OR (dir >= ? AND dir < ?))')
+                values += [key, low, high]
+            else:
+                conditions.append('dir = ?')
+                values.append(key)
+            if extensions:
+                extensions = sorted({e.lower() if e.startswith('.') else '.' + e.lower() for e in extensions})
+                conditions.append(f"ext IN ({', '.join('?' * len(extensions))})")
+                values += extensions
+            if min_size is not None:
+                conditions.append('size >= ?')
+                values.append(min_size)
+            if max_size is not None:
+                conditions.append('size <= ?')
+                values.append(max_size)
+            if modified_after is not None:
+                conditions.append('mtime_ns >= ?')
+                values.append(int(modified_after * 1e9))
+            if modified_before is not None:
+                conditions.append('mtime_ns < ?')
+                values.append(int(modified_before * 1e9))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT dir, name FROM entries WHERE {' AND '.join(conditions)} ORDER BY dir, name",
+                    values).fetchall()
+        return [os.path.join(directory, name) for directory, name in rows]
+
+    def metadata(self, path):
+        """返回文件的音频或图片文件头信息（dict，如 {'audio': {...}}）
+
+        索引中没有缓存时读取文件头并写回索引；不是音频或图片时返回 None。
+        """
+        directory = os.path.dirname(_key(path))
+        with self._lock:
+            row = self._conn.execute('SELECT meta FROM entries WHERE dir = ? AND name = ?',
+                                     (directory, os.path.basename(path))).fetchone()
+        if row is not None and row[0] is not None:
+            return json.loads(row[0])
+        meta = probe_metadata(path, image_reader=self._reader())
+        if meta is not None and row is not None:
+            with self._lock:
+                self._conn.execute('UPDATE entries SET meta = ? WHERE dir = ? AND name = ?',
+                                   (meta, directory, os.path.basename(path)))
+                self._conn.commit()
+        return json.loads(meta) if meta is not None else None
+
+    # 监控调用的增量更新
+
+    def _touch_directory(self, directory):
+        """条目变化已写入索引后，记录目录当前的 mtime，之后的查询不必重新扫描"""
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return
+        with self._lock:
+            if self._conn.execute('SELECT 1 FROM directories WHERE dir = ?', (_key(directory),)).fetchone():
+                self._conn.execute('UPDATE directories SET mtime_ns = ? WHERE dir = ?',
+                                   (mtime_ns, _key(directory)))
+                self._conn.commit()
+
+    def update_path(self, path):
+        """新建或修改了 path：更新它的记录；新出现的目录整棵扫描"""
+        path = os.path.abspath(path)
+        if self.root_for(path) is None:
+            return
+        directory, name = os.path.split(path)
+        key = _key(directory)
+        try:
+            row = _entry_row(path, name, False, None)
+        except OSError:
+            self.remove_path(path)
+            return
+        with self._lock:
+            previous = self._conn.execute('SELECT kind, size, mtime_ns, meta FROM entries WHERE dir = ? AND name = ?',
+                                          (key, name)).fetchone()
+        if row[1] & KIND_FILE:
+            unchanged = previous is not None and previous[1:3] == (row[3], row[4])
+            meta = previous[3] if unchanged else (
+                probe_metadata(path, row[6], self._reader()) if self.with_metadata else None)
+            row = row[:7] + (meta,)
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (key,) + row)
+            self._conn.commit()
+        if row[1] & KIND_DIR and not row[1] & KIND_LINK and (previous is None or not previous[0] & KIND_DIR):
+            self._scan_tree(path)
+        self._touch_directory(directory)
+
+    def remove_path(self, path):
+        """path 被删除：删除它的记录（是目录时连同其下的全部记录）"""
+        path = os.path.abspath(path)
+        if self.root_for(path) is None:
+            return
+        directory, name = os.path.split(path)
+        with self._lock:
+            self._conn.execute('DELETE FROM entries WHERE dir = ? AND name = ?', (_key(directory), name))
+            self._conn.commit()
+        self._delete_tree(_key(path))
+        self._touch_directory(directory)
+
+    def move_path(self, source, target):
+        """source 被移动或重命名为 target"""
+        self.remove_path(source)
+        self.update_path(target)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def default_index_path():
+    return os.path.join(default_cache_dir(), 'fs_index.sqlite3')
+
+
+_index = None
+_index_lock = threading.Lock()
+_absent_since = None
+
+
+def get_index(create=False):
+    """返回共享的索引实例
+
+    索引是可选的：配置 FS_INDEX = False，或者还没有建立过索引（数据库不存在）且 create 为 False 时返回 None。
+    """
+    global _index, _absent_since
+    if not get_config_value('FS_INDEX', True):
+        return None
+    if _index is not None:
+        return _index
+    # 没有索引时每次模式展开都会调用这里，不能每次都检查文件是否存在
+    if not create and _absent_since is not None and time.monotonic() - _absent_since < RECHECK_INTERVAL:
+        return None
+    with _index_lock:
+        if _index is None:
+            if not create and not os.path.exists(default_index_path()):
+                _absent_since = time.monotonic()
+                return None
+            try:
+                _index = FileIndex()
+            except (OSError, sqlite3.Error) as e:
+                print(f"无法打开文件索引: {e}")
+                _absent_since = time.monotonic()
+                return None
+        return _index
+
+
+def listing(directory):
+    """从索引列出目录；没有索引或目录不在索引范围内时返回 None（调用方改用 os.scandir）
+
+    Raises:
+        OSError: 目录不存在或无法访问
+    """
+    index = get_index()
+    if index is None:
+        return None
+    try:
+        return index.listing(directory)
+    except sqlite3.Error as e:
+        print(MESSAGES['zh']['error'].format(e))
+        return None
+
+
+def walk(root):
+    """从索引列出整棵树（见 FileIndex.walk）；没有索引或 root 不在索引范围内时返回 None"""
+    index = get_index()
+    if index is None:
+        return None
+    try:
+        return index.walk(root)
+    except sqlite3.Error as e:
+        print(MESSAGES['zh']['error'].format(e))
+        return None
+
+
+def listdir(path):
+    """与 os.listdir 相同，目录在索引范围内时从索引读取"""
+    entries = listing(path)
+    if entries is None:
+        return os.listdir(path)
+    return [entry.name for entry in entries]
+
+
+def _live_query(root, extensions, min_size, max_size, modified_after, modified_before, recursive):
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with span('fs.scandir'), os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        stack.append(entry.path)
+                    continue
+                if not entry.is_file():
+                    continue
+                if extensions and os.path.splitext(entry.name)[1].lower() not in extensions:
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            if min_size is not None and st.st_size < min_size:
+                continue
+            if max_size is not None and st.st_size > max_size:
+                continue
+            if modified_after is not None and st.st_mtime < modified_after:
+                continue
+            if modified_before is not None and st.st_mtime >= modified_before:
+                continue
+            yield entry.path
+
+
+def find_files(root, extensions=None, min_size=None, max_size=None,
+               modified_after=None, modified_before=None, recursive=True):
+    """按扩展名、大小和修改时间查找文件：root 已建立索引时查询索引，否则实时扫描
+
+    参数见 FileIndex.query。
+
+    Returns:
+        list: 匹配的文件路径
+    """
+    if extensions:
+        extensions = {e.lower() if e.startswith('.') else '.' + e.lower() for e in extensions}
+    index = get_index()
+    if index is not None:
+        try:
+            paths = index.query(root, extensions, min_size, max_size, modified_after, modified_before, recursive)
+        except sqlite3.Error as e:
+            print(MESSAGES['zh']['error'].format(e))
+            paths = None
+        if paths is not None:
+            return paths
+    return list(_live_query(root, extensions, min_size, max_size, modified_after, modified_before, recursive))
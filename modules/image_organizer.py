@@ -0,0 +1,368 @@
+import os
+import string
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from PIL import Image, ImageOps
+from utils import get_config_value
+from .progress import Progress, ignore_interrupt
+
+MESSAGES = {
+    'zh': {
+        'folder_not_exist': "错误：文件夹 '{}' 不存在",
+        'scanning': "正在读取 {} 张图片的文件头...",
+        'no_images': "指定目录中没有找到图片",
+        'error_reading': "读取图片 '{}' 时出错: {}",
+        'invalid_layout': "错误：{}",
+        'plan_summary': "\n将移动 {} 张图片（{} 张已在目标位置）：",
+        'plan_folder': "  {}: {} 张",
+        'plan_example': "  {} -> {}",
+        'plan_more': "  ... 另外 {} 张",
+        'confirm_organize': "\n确认移动这些图片吗？(y/n): ",
+        'confirm_thumbnails': "\n将为 {} 张图片生成缩略图（最长边 {} 像素）到 '{}'，确认吗？(y/n): ",
+        'cancelled': "操作已取消",
+        'nothing_to_do': "所有图片都已在目标位置",
+        'thumbnails_up_to_date': "所有缩略图都是最新的",
+        'thumbnail_error': "生成 '{}' 的缩略图失败: {}",
+        'thumbnails_complete': "缩略图生成完成：成功 {} 张，失败 {} 张"
+    },
+    'en': {
+        'folder_not_exist': "Error: Folder '{}' does not exist",
+        'scanning': "Reading headers of {} images...",
+        'no_images': "No images found in the specified directory",
+        'error_reading': "Error reading image '{}': {}",
+        'invalid_layout': "Error: {}",
+        'plan_summary': "\n{} images will be moved ({} already in place):",
+        'plan_folder': "  {}: {} images",
+        'plan_example': "  {} -> {}",
+        'plan_more': "  ... and {} more",
+        'confirm_organize': "\nMove these images? (y/n): ",
+        'confirm_thumbnails': "\nGenerate thumbnails (longest side {1} px) for {0} images into '{2}'? (y/n): ",
+        'cancelled': "Operation cancelled",
+        'nothing_to_do': "All images are already in place",
+        'thumbnails_up_to_date': "All thumbnails are up to date",
+        'thumbnail_error': "Failed to create thumbnail for '{}': {}",
+        'thumbnails_complete': "Thumbnails finished: {} created, {} failed"
+    }
+}
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.webp', '.bmp', '.gif'}
+# 分类布局中可以使用的字段
+LAYOUT_KEYS = ('year', 'month', 'day', 'camera', 'orientation', 'megapixels', 'format')
+DEFAULT_LAYOUT = '{year}/{year}-{month}'
+# 像素数分组：(上限百万像素, 名称)
+MEGAPIXEL_BUCKETS = ((2, 'under_2MP'), (8, '2-8MP'), (20, '8-20MP'))
+# 预览中最多列出的示例数
+PREVIEW_LIMIT = 20
+# 缩略图所在的文件夹名称（整理和生成缩略图时都会跳过它）
+THUMBNAIL_DIR = 'thumbnails'
+
+# EXIF 标签
+_EXIF_IFD = 0x8769
+_DATETIME_ORIGINAL = 36867
+_DATETIME = 306
+_MAKE = 271
+_MODEL = 272
+
+
+def is_image_file(name):
+    """只根据扩展名判断是否是图片（不访问磁盘）"""
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _parse_exif_date(value):
+    try:
+        return datetime.strptime(str(value).strip('\x00 ')[:19], '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
+def read_image_info(path):
+    """只读取图片文件头：尺寸、格式、拍摄时间和相机型号，不解码像素
+
+    Image.open 只解析文件头，像素在第一次访问时才会解码；EXIF 也位于文件头中。
+    没有拍摄时间的图片使用文件修改时间。
+
+    Returns:
+        dict: width、height、format、date、camera、date_source（'exif' 或 'mtime'）
+    """
+    with Image.open(path) as image:
+        width, height = image.size
+        image_format = image.format
+        exif = image.getexif()
+        date = _parse_exif_date(exif.get_ifd(_EXIF_IFD).get(_DATETIME_ORIGINAL, '')) or \
+            _parse_exif_date(exif.get(_DATETIME, ''))
+        make = str(exif.get(_MAKE, '')).strip('\x00 ')
+        model = str(exif.get(_MODEL, '')).strip('\x00 ')
+    date_source = 'exif'
+    if date is None:
+        date = datetime.fromtimestamp(os.stat(path).st_mtime)
+        date_source = 'mtime'
+    # 型号中通常已包含厂商名
+    camera = model if model.lower().startswith(make.lower()) else f"{make} {model}".strip()
+    return {'width': width, 'height': height, 'format': image_format, 'date': date,
+            'camera': camera, 'date_source': date_source}
+
+
+def image_keys(info):
+    """从图片信息中提取所有分类字段"""
+    width, height = info['width'], info['height']
+    megapixels = width * height / 1e6
+    for limit, name in MEGAPIXEL_BUCKETS:
+        if megapixels < limit:
+            bucket = name
+            break
+    else:
+        bucket = 'over_20MP'
+    if width > height:
+        orientation = 'landscape'
+    elif width < height:
+        orientation = 'portrait'
+    else:
+        orientation = 'square'
+    camera = ''.join(c if c.isalnum() or c in ' -_.' else '_' for c in info['camera']).strip()
+    return {
+        'year': f"{info['date'].year:04d}",
+        'month': f"{info['date'].month:02d}",
+        'day': f"{info['date'].day:02d}",
+        'camera': camera or 'unknown',
+        'orientation': orientation,
+        'megapixels': bucket,
+        'format': info['format'] or 'unknown',
+    }
+
+
+def check_layout(layout):
+    """检查分类布局，例如 '{year}/{camera}'
+
+    Raises:
+        ValueError: 布局中使用了不支持的字段
+    """
+    fields = {field for _, field, _, _ in string.Formatter().parse(layout) if field is not None}
+    unknown = fields - set(LAYOUT_KEYS)
+    if unknown or not fields:
+        raise ValueError(f"无效的分类布局 '{layout}'，可用字段: {', '.join(LAYOUT_KEYS)}")
+
+
+def _list_images(folder_path, recursive):
+    """列出图片文件，跳过缩略图文件夹"""
+    paths = []
+    for root, dirs, files in os.walk(folder_path):
+        dirs[:] = [d for d in dirs if d != THUMBNAIL_DIR]
+        paths.extend(os.path.join(root, name) for name in files if is_image_file(name))
+        if not recursive:
+            break
+    return paths
+
+
+def _read_info(path):
+    try:
+        return path, read_image_info(path), None
+    except Exception as e:
+        return path, None, e
+
+
+def read_image_infos(paths, max_workers=None):
+    """用线程池并发读取图片文件头（只读取文件开头，I/O 为主）
+
+    Yields:
+        tuple: (路径, 图片信息 dict 或 None, 异常或 None)
+    """
+    max_workers = max_workers or get_config_value('IMAGE_PROBE_WORKERS', min(32, (os.cpu_count() or 1) * 4))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(_read_info, paths, chunksize=64)
+
+
+def plan_image_organization(folder_path, layout=None, recursive=False, lang='zh'):
+    """计算整理方案：每张图片应移动到的位置
+
+    Returns:
+        tuple: ([(源路径, 目标路径)], 已在目标位置的数量)
+    """
+    msg = MESSAGES[lang]
+    layout = layout or get_config_value('IMAGE_LAYOUT', DEFAULT_LAYOUT)
+    check_layout(layout)
+    paths = _list_images(folder_path, recursive)
+    if not paths:
+        return [], 0
+    print(msg['scanning'].format(len(paths)))
+
+    plan = []
+    in_place = 0
+    targets = set()
+    for path, info, error in read_image_infos(paths):
+        if error is not None:
+            print(msg['error_reading'].format(os.path.basename(path), str(error)))
+            continue
+        folder = os.path.join(*[part for part in layout.format(**image_keys(info)).split('/') if part])
+        target = os.path.join(folder_path, folder, os.path.basename(path))
+        if os.path.normcase(os.path.abspath(target)) == os.path.normcase(os.path.abspath(path)):
+            in_place += 1
+            continue
+        # 同名图片避免互相覆盖
+        base, ext = os.path.splitext(target)
+        counter = 1
+        while os.path.normcase(target) in targets or os.path.exists(target):
+            target = f"{base}_{counter}{ext}"
+            counter += 1
+        targets.add(os.path.normcase(target))
+        plan.append((path, target))
+    return plan, in_place
+
+
+def preview_image_plan(plan, in_place, folder_path, lang='zh'):
+    """按目标文件夹汇总预览整理方案"""
+    msg = MESSAGES[lang]
+    print(msg['plan_summary'].format(len(plan), in_place))
+    counts = {}
+    for _, target in plan:
+        folder = os.path.relpath(os.path.dirname(target), folder_path)
+        counts[folder] = counts.get(folder, 0) + 1
+    for folder in sorted(counts):
+        print(msg['plan_folder'].format(folder, counts[folder]))
+    for source, target in plan[:PREVIEW_LIMIT]:
+        print(msg['plan_example'].format(os.path.relpath(source, folder_path), os.path.relpath(target, folder_path)))
+    if len(plan) > PREVIEW_LIMIT:
+        print(msg['plan_more'].format(len(plan) - PREVIEW_LIMIT))
+
+
+def organize_images(folder_path, layout=None, recursive=False, lang='zh', confirm=True):
+    """按拍摄日期、相机、尺寸等字段整理图片
+
+    文件头用线程池并发读取，不解码像素；移动交给 FileOperationBatch（统一校验、合并建目录、并行执行）。
+
+    Args:
+        folder_path (str): 图片所在文件夹
+        layout (str): 目标文件夹布局，例如 '{year}/{year}-{month}' 或 '{camera}/{orientation}'
+        recursive (bool): 是否包含子文件夹中的图片
+        lang (str): 语言选项 ('zh' 或 'en')
+        confirm (bool): 执行前是否需要确认
+
+    Returns:
+        list: 实际完成的 (源路径, 目标路径) 列表，可用于撤回；取消或失败时为空列表
+    """
+    from .plan_store import FileOperation
+    from .operation_batch import FileOperationBatch
+
+    msg = MESSAGES[lang]
+    if not os.path.isdir(folder_path):
+        print(msg['folder_not_exist'].format(folder_path))
+        return []
+    try:
+        plan, in_place = plan_image_organization(folder_path, layout, recursive, lang)
+    except ValueError as e:
+        print(msg['invalid_layout'].format(str(e)))
+        return []
+    if not plan:
+        print(msg['nothing_to_do'] if in_place else msg['no_images'])
+        return []
+
+    preview_image_plan(plan, in_place, folder_path, lang)
+    if confirm and input(msg['confirm_organize']).lower() != 'y':
+        print(msg['cancelled'])
+        return []
+
+    batch = FileOperationBatch((FileOperation('move', source, target) for source, target in plan), lang=lang)
+    results = batch.execute()
+    return [pair for index, pair in enumerate(plan) if results.status(index) == 'ok']
+
+
+def make_thumbnail(source, target, max_size=256, quality=85):
+    """生成一张缩略图
+
+    JPEG 先用 draft() 让解码器直接按 1/2、1/4、1/8 缩小解码，其他格式用 reduce() 做整数倍快速缩小，
+    最后再用高质量滤波缩放到目标尺寸，避免在内存中展开原始尺寸的像素。
+    """
+    with Image.open(source) as image:
+        image.draft('RGB', (max_size, max_size))
+        factor = min(image.width // max_size, image.height // max_size)
+        if factor >= 2:
+            image = image.reduce(factor)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size), Image.LANCZOS, reducing_gap=2.0)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        image.save(target, 'JPEG', quality=quality, optimize=True)
+    return target
+
+
+def _thumbnail_job(job):
+    """进程池中执行的任务"""
+    source, target, max_size, quality = job
+    try:
+        return source, make_thumbnail(source, target, max_size, quality), None
+    except Exception as e:
+        return source, None, str(e)
+
+
+def generate_thumbnails(folder_path, output_dir=None, max_size=256, recursive=False, lang='zh',
+                        max_workers=None, confirm=True, quality=85):
+    """为文件夹中的图片批量生成缩略图（进程池并行）
+
+    缩略图保存为 JPEG，保持源文件的相对目录结构；已存在且比源文件新的缩略图会被跳过。
+
+    Args:
+        folder_path (str): 图片所在文件夹
+        output_dir (str): 缩略图目录，默认为 folder_path 下的 thumbnails
+        max_size (int): 缩略图最长边像素数
+        recursive (bool): 是否包含子文件夹中的图片
+        lang (str): 语言选项 ('zh' 或 'en')
+        max_workers (int): 进程数，默认取配置 IMAGE_WORKERS（CPU 核心数）
+        confirm (bool): 执行前是否需要确认
+        quality (int): JPEG 质量
+
+    Returns:
+        list: 新生成的缩略图路径，可用于撤回
+    """
+    msg = MESSAGES[lang]
+    if not os.path.isdir(folder_path):
+        print(msg['folder_not_exist'].format(folder_path))
+        return []
+    output_dir = output_dir or os.path.join(folder_path, THUMBNAIL_DIR)
+    paths = _list_images(folder_path, recursive)
+    if not paths:
+        print(msg['no_images'])
+        return []
+
+    jobs = []
+    sizes = {}
+    for path in paths:
+        relative = os.path.splitext(os.path.relpath(path, folder_path))[0] + '.jpg'
+        target = os.path.join(output_dir, relative)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        try:
+            if os.stat(target).st_mtime >= st.st_mtime:
+                continue
+        except OSError:
+            pass
+        sizes[path] = st.st_size
+        jobs.append((path, target, max_size, quality))
+    if not jobs:
+        print(msg['thumbnails_up_to_date'])
+        return []
+
+    if confirm and input(msg['confirm_thumbnails'].format(len(jobs), max_size, output_dir)).lower() != 'y':
+        print(msg['cancelled'])
+        return []
+
+    created = []
+    failed = 0
+    max_workers = min(max_workers or get_config_value('IMAGE_WORKERS', os.cpu_count() or 1), len(jobs))
+    with Progress(len(jobs), 'thumbnails', lang, bytes_total=sum(sizes.values())) as progress, \
+            ProcessPoolExecutor(max_workers=max_workers, initializer=ignore_interrupt) as executor:
+        for source, target, error in executor.map(_thumbnail_job, jobs, chunksize=16):
+            if error is not None:
+                failed += 1
+                print(msg['thumbnail_error'].format(os.path.basename(source), error))
+            else:
+                created.append(target)
+            progress.advance(nbytes=sizes[source], error=error is not None)
+            if progress.cancelled:
+                # 已开始的批次完成后停止；重新运行时已生成的缩略图会被跳过
+                executor.shutdown(cancel_futures=True)
+                break
+    print(msg['thumbnails_complete'].format(len(created), failed))
+    return created
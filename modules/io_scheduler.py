@@ -0,0 +1,170 @@
+import os
+import threading
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+import psutil
+from utils import get_config_value
+
+# 每类设备同时进行的 I/O 数：机械硬盘并发读写会来回寻道，网络存储受往返延迟和服务端限制，
+# NVMe 需要足够深的队列才能跑满带宽
+DEVICE_LIMITS = {'nvme': 16, 'ssd': 8, 'hdd': 1, 'network': 2, 'memory': 16, 'unknown': 4}
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smbfs', 'smb3', 'afpfs', 'sshfs', 'fuse.sshfs', 'fuse.rclone',
+                       'davfs', 'fuse.davfs', '9p', 'ceph', 'glusterfs', 'fuse.glusterfs', 'lustre', 'webdav'}
+MEMORY_FILESYSTEMS = {'tmpfs', 'ramfs'}
+# 线程池上限（各设备并发数之和可能很大）
+MAX_WORKERS = 32
+
+_devices = {}
+_devices_lock = threading.Lock()
+
+
+def mount_point(path):
+    """路径所在的挂载点（向上查找直到设备号变化）"""
+    path = os.path.realpath(path)
+    device = os.stat(path).st_dev
+    while True:
+        parent = os.path.dirname(path)
+        if parent == path:
+            return path
+        try:
+            if os.stat(parent).st_dev != device:
+                return path
+        except OSError:
+            return path
+        path = parent
+
+
+def _rotational(device):
+    """Linux 下从 sysfs 读取块设备是否为机械硬盘，返回 (是否机械硬盘, 设备名)；无法判断时为 (None, None)"""
+    node = f'/sys/dev/block/{os.major(device)}:{os.minor(device)}'
+    if not os.path.exists(node):
+        return None, None
+    node = os.path.realpath(node)
+    # 分区目录下没有 queue，使用所属磁盘的
+    disk = node if os.path.isdir(os.path.join(node, 'queue')) else os.path.dirname(node)
+    try:
+        with open(os.path.join(disk, 'queue', 'rotational')) as f:
+            return f.read().strip() == '1', os.path.basename(disk)
+    except OSError:
+        return None, os.path.basename(disk)
+
+
+def classify_device(path):
+    """判断路径所在设备的类型：nvme、ssd、hdd、network、memory 或 unknown
+
+    Returns:
+        tuple: (设备类型, 挂载点)
+    """
+    mount = mount_point(path)
+    partition = None
+    try:
+        for item in psutil.disk_partitions(all=True):
+            if os.path.normcase(item.mountpoint) == os.path.normcase(mount):
+                partition = item
+    except Exception:
+        partition = None
+    if partition is not None:
+        fstype = partition.fstype.lower()
+        if fstype in NETWORK_FILESYSTEMS or 'remote' in partition.opts.split(','):
+            return 'network', mount
+        if fstype in MEMORY_FILESYSTEMS:
+            return 'memory', mount
+    if hasattr(os, 'major'):
+        rotational, name = _rotational(os.stat(mount).st_dev)
+        if rotational:
+            return 'hdd', mount
+        if rotational is not None:
+            return ('nvme' if name.startswith('nvme') else 'ssd'), mount
+    return 'unknown', mount
+
+
+def device_limit(kind, mount):
+    """设备的并发上限：配置 IO_CONCURRENCY 可按挂载点或设备类型覆盖，例如 {'hdd': 2, '/mnt/nas': 4}"""
+    configured = get_config_value('IO_CONCURRENCY', {}) or {}
+    for key, value in configured.items():
+        if key not in DEVICE_LIMITS and os.path.normcase(os.path.abspath(key)) == os.path.normcase(mount):
+            return max(1, int(value))
+    return max(1, int(configured.get(kind, DEVICE_LIMITS[kind])))
+
+
+def device_info(path):
+    """路径所在设备的 (st_dev, 类型, 挂载点, 并发上限)，按 st_dev 缓存"""
+    device = os.stat(path).st_dev
+    with _devices_lock:
+        info = _devices.get(device)
+    if info is None:
+        try:
+            kind, mount = classify_device(path)
+        except OSError:
+            kind, mount = 'unknown', path
+        info = (device, kind, mount, device_limit(kind, mount))
+        with _devices_lock:
+            _devices.setdefault(device, info)
+    return info
+
+
+class IOScheduler:
+    """按设备限制并发的 I/O 调度器
+
+    每个任务声明它读写的设备（源和目标的 st_dev），执行时依次占用这些设备的名额，
+    同一设备上同时进行的任务数不超过该设备的上限；不同设备之间互不影响。
+    名额按设备号顺序获取，两个方向相反的跨设备复制不会互相死锁。
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or get_config_value('IO_MAX_WORKERS', MAX_WORKERS)
+        self._limits = {}
+        self._semaphores = {}
+
+    def register(self, path):
+        """登记路径所在的设备，返回 st_dev"""
+        device, _, _, limit = device_info(path)
+        if device not in self._semaphores:
+            self._limits[device] = limit
+            self._semaphores[device] = threading.BoundedSemaphore(limit)
+        return device
+
+    def limits(self):
+        """已登记设备的 {st_dev: 并发上限}"""
+        return dict(self._limits)
+
+    def run(self, tasks):
+        """执行任务并等待全部完成
+
+        Args:
+            tasks (list): (设备号元组, 无参数的可调用对象[, 占用名额之前调用的可调用对象])；
+                          按给定顺序开始，不同设备的任务交替提交。第三项用于不需要设备名额的等待
+                          （例如等待文件写入完成），等待期间不占用名额
+
+        Returns:
+            list: 各任务的返回值（与 tasks 顺序一致）
+        """
+        devices = {device for task in tasks for device in task[0]}
+        workers = min(self.max_workers, sum(self._limits[device] for device in devices) or 1, len(tasks))
+        if workers <= 1:
+            return [self._run(*task) for task in tasks]
+
+        # 按设备组合分成几条队列轮流提交，避免线程都卡在同一设备的名额上
+        lanes = {}
+        for index, task in enumerate(tasks):
+            lanes.setdefault(tuple(sorted(set(task[0]))), []).append(index)
+        order = []
+        queues = list(lanes.values())
+        for position in range(max(len(queue) for queue in queues)):
+            order.extend(queue[position] for queue in queues if position < len(queue))
+
+        results = [None] * len(tasks)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [(index, executor.submit(self._run, *tasks[index])) for index in order]
+            for index, future in futures:
+                results[index] = future.result()
+        return results
+
+    def _run(self, task_devices, run, before=None):
+        if before is not None:
+            before()
+        with ExitStack() as stack:
+            for device in sorted(set(task_devices)):
+                self._semaphores[device].acquire()
+                stack.callback(self._semaphores[device].release)
+            return run()
@@ -0,0 +1,145 @@
+import json
+import time
+import random
+import threading
+from utils import get_config_value
+
+# get_ai_response 在系统提示词末尾用这个标记引出用户的原始请求
+REQUEST_MARKER = "用户的请求是: "
+
+
+class BackendError(Exception):
+    """模型后端调用失败"""
+
+
+class ModelBackend:
+    """AI 模型后端接口：输入完整提示词，返回模型生成的文本"""
+
+    name = 'base'
+
+    def generate(self, prompt):
+        """生成响应文本
+
+        Args:
+            prompt (str): 完整提示词
+
+        Returns:
+            str: 模型输出
+        """
+        raise NotImplementedError
+
+
+class GeminiBackend(ModelBackend):
+    """Google Gemini 后端（首次创建时才导入 SDK 并配置 API Key）"""
+
+    name = 'gemini'
+
+    def __init__(self, model_name='gemini-pro', api_key=None):
+        import google.generativeai as genai
+        if api_key is None:
+            from config import GEMINI_API_KEY
+            api_key = GEMINI_API_KEY
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self._model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt):
+        response = self._model.generate_content(prompt)
+        return response.text
+
+
+class StubBackend(ModelBackend):
+    """确定性的本地替身模型，用于离线测试和基准测试
+
+    响应来源按以下顺序确定：
+    1. script：可调用对象，参数为用户请求，返回响应
+    2. responses：字典，用户请求包含某个键时返回对应的值（按插入顺序匹配）
+    3. default：其他情况下的默认响应
+    响应为 dict/list 时会被序列化为 JSON。
+    """
+
+    name = 'stub'
+
+    def __init__(self, responses=None, script=None, default=None, latency=0.0, jitter=0.0,
+                 failure_rate=0.0, fail_every=0, seed=0):
+        """初始化替身模型
+
+        Args:
+            responses (dict): 请求关键字 -> 响应
+            script (callable): 根据用户请求生成响应的函数
+            default: 没有匹配时的默认响应
+            latency (float): 每次调用的固定延迟（秒）
+            jitter (float): 在固定延迟上附加的均匀随机延迟上限（秒）
+            failure_rate (float): 随机失败的概率（0~1）
+            fail_every (int): 每第 N 次调用必定失败，0 表示不启用
+            seed (int): 随机种子，保证延迟和失败序列可复现
+        """
+        self.responses = dict(responses or {})
+        self.script = script
+        self.default = default
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.fail_every = fail_every
+        self.calls = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def extract_request(prompt):
+        """从完整提示词中取出用户的原始请求"""
+        return prompt.rsplit(REQUEST_MARKER, 1)[-1].strip()
+
+    def _respond(self, request):
+        if self.script is not None:
+            response = self.script(request)
+        else:
+            response = self.default
+            for key, value in self.responses.items():
+                if key in request:
+                    response = value
+                    break
+        if response is None:
+            raise BackendError(f"没有为请求准备响应: {request}")
+        if not isinstance(response, str):
+            response = json.dumps(response, ensure_ascii=False)
+        return response
+
+    def generate(self, prompt):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = (self.fail_every and call % self.fail_every == 0) or (
+                self.failure_rate and self._random.random() < self.failure_rate
+            )
+            if fail:
+                self.failures += 1
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise BackendError(f"注入的故障（第 {call} 次调用）")
+        return self._respond(self.extract_request(prompt))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """返回当前模型后端，首次调用时按配置创建（默认 Gemini）"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            model_name = get_config_value('GEMINI_MODEL', 'gemini-pro')
+            _backend = GeminiBackend(model_name)
+        return _backend
+
+
+def set_backend(backend):
+    """替换模型后端，返回之前的后端（可能为 None）"""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+        return previous
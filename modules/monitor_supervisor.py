@@ -0,0 +1,378 @@
+import os
+import time
+import queue
+import signal
+import threading
+import multiprocessing
+from multiprocessing.connection import wait as wait_connections
+from utils import get_config_value
+
+MESSAGES = {
+    'zh': {
+        'shard_started': "监控进程 {} 已启动（PID {}）：{}",
+        'shard_restarted': "监控进程 {} 异常退出（退出码 {}），正在重启，恢复 {} 个待处理文件",
+        'shard_gave_up': "监控进程 {} 连续 {} 次启动失败，不再重启",
+        'quarantined': "监控进程 {} 连续 {} 次在处理 {} 时崩溃，之后跳过这个文件",
+        'shard_stats': "分片 {shard}（PID {pid}）：{rate:.1f} 事件/秒，队列 {queue}，"
+                       "延迟 平均 {latency_avg:.0f} ms / p95 {latency_p95:.0f} ms，"
+                       "已处理 {processed}，错误 {errors}，重启 {restarts}"
+    },
+    'en': {
+        'shard_started': "Monitor process {} started (PID {}): {}",
+        'shard_restarted': "Monitor process {} exited unexpectedly (exit code {}), restarting with {} pending files",
+        'shard_gave_up': "Monitor process {} failed {} times in a row, giving up",
+        'quarantined': "Monitor process {} crashed {} times in a row while handling {}; skipping that file from now on",
+        'shard_stats': "Shard {shard} (PID {pid}): {rate:.1f} events/s, queue {queue}, "
+                       "latency avg {latency_avg:.0f} ms / p95 {latency_p95:.0f} ms, "
+                       "processed {processed}, errors {errors}, restarts {restarts}"
+    }
+}
+
+# 工作进程向主进程报告状态的间隔（秒）
+HEARTBEAT_INTERVAL = 1.0
+# 启动后这么多秒内就退出算作启动失败；连续失败 MAX_FAILURES 次后不再重启
+STARTUP_GRACE = 5.0
+MAX_FAILURES = 5
+# 同一个文件处理期间连续崩溃这么多次后跳过该文件，不让一个坏文件拖垮整个分片
+QUARANTINE_CRASHES = 2
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _catch_up(roots, file_types, since):
+    """列出 since 之后修改、仍留在源文件夹中的文件（工作进程重启期间 watchdog 没有看到的新文件）"""
+    for root in roots:
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if not any(name.lower().endswith(ext.lower()) for ext in file_types):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    if os.stat(path).st_mtime >= since:
+                        yield root, path
+                except OSError:
+                    continue
+
+
+def _worker_main(shard, roots, target_root, file_types, lang, wait_time, where, state, reports, stop):
+    """工作进程：监控分到的源文件夹，事件先进入队列，由处理线程逐个移动
+
+    state 为上一个进程留下的状态：{'pending': [(源文件夹, 路径)], 'since': 时间戳, 'skip': [路径]}，
+    启动时先处理这些文件以及 since 之后出现在源文件夹中的文件；skip 中的文件曾多次让进程崩溃，不再处理。
+    开始处理每个文件前先报告它的路径，进程崩溃时主进程知道是哪个文件。
+    reports 是只属于本进程的管道，stop 是无锁的共享标志：进程被强制结束时不会留下别人要等的锁。
+    """
+    # Ctrl+C 由主进程处理，工作进程只响应 stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler, FileCreatedEvent
+    from .file_monitor import SmartFileHandler, IndexEventHandler
+    from . import fs_index, progress
+
+    progress.configure('off')
+    file_types = file_types or ['.wav']
+    events = queue.Queue()
+    pending = {}
+    lock = threading.Lock()
+    counters = {'events': 0, 'processed': 0, 'errors': 0}
+    latencies = []
+    skip = set(state.get('skip', ()))
+    # 正在处理的文件
+    current = [None]
+    # 管道同时被心跳循环和处理线程使用
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            reports.send(message)
+
+    def submit(handler, event):
+        with lock:
+            if not event.is_directory:
+                if event.src_path in skip:
+                    return
+                if event.src_path in pending:
+                    return
+                pending[event.src_path] = handler.source_root
+            counters['events'] += 1
+        events.put((handler, event, time.monotonic()))
+
+    class QueuedHandler(FileSystemEventHandler):
+        def __init__(self, handler):
+            self.handler = handler
+
+        def on_created(self, event):
+            submit(self.handler, event)
+
+    handlers = {root: SmartFileHandler(root, target_root, file_types, lang, wait_time, where) for root in roots}
+    index = fs_index.get_index()
+    observer = Observer()
+    for root, handler in handlers.items():
+        observer.schedule(QueuedHandler(handler), root, recursive=True)
+        if index is not None and index.root_for(root) is not None:
+            observer.schedule(IndexEventHandler(index), root, recursive=True)
+            index.watch(root)
+    observer.start()
+
+    # 恢复上一个进程没有处理完的文件
+    recovered = list(state.get('pending', ()))
+    if state.get('since'):
+        recovered.extend(_catch_up(roots, file_types, state['since']))
+    for root, path in recovered:
+        handler = handlers.get(root)
+        if handler is not None and os.path.exists(path):
+            submit(handler, FileCreatedEvent(path))
+
+    def consume():
+        while not stop.value:
+            try:
+                handler, event, queued = events.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            with lock:
+                current[0] = event.src_path
+            send({'shard': shard, 'pid': os.getpid(), 'current': event.src_path})
+            ok = handler.process(event)
+            with lock:
+                current[0] = None
+                pending.pop(event.src_path, None)
+                counters['processed'] += 1
+                counters['errors'] += not ok
+                latencies.append(time.monotonic() - queued)
+
+    worker = threading.Thread(target=consume, name=f'monitor-shard-{shard}', daemon=True)
+    worker.start()
+    try:
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            if stop.value or not worker.is_alive():
+                break
+            with lock:
+                window, latencies[:] = list(latencies), []
+                report = dict(counters, shard=shard, pid=os.getpid(), time=time.time(), queue=events.qsize(),
+                              latency_avg=sum(window) / len(window) * 1000 if window else 0.0,
+                              latency_p95=_percentile(window, 0.95) * 1000,
+                              pending=[(root, path) for path, root in pending.items()], current=current[0])
+            send(report)
+    finally:
+        observer.stop()
+        observer.join()
+        # 正常停止时让当前文件处理完
+        worker.join()
+    # 处理线程意外退出时以非零退出码结束，由主进程重启
+    if not stop.value:
+        os._exit(1)
+
+
+class MonitorSupervisor:
+    """多进程文件夹监控：把源文件夹分配到多个工作进程
+
+    每个工作进程有自己的 watchdog 监控器和处理队列，哈希、音频读取等 CPU 密集的步骤不再争用同一个 GIL，
+    一个进程崩溃也不影响其他源文件夹。主进程只负责监督：收集各分片的指标（事件/秒、队列长度、延迟），
+    工作进程异常退出时重新启动，并把它没有处理完的文件和停机期间出现的新文件交给新进程。
+    """
+
+    def __init__(self, source_roots, target_root, file_types=None, lang='zh', wait_time=3, where=None,
+                 processes=None):
+        """
+        Args:
+            source_roots (list): 源文件夹列表
+            target_root (str): 目标文件夹
+            file_types (list): 要处理的文件类型（如 ['.wav']）
+            lang (str): 语言选项
+            wait_time (float): 移动新文件前等待写入完成的秒数
+            where (str|FileFilter): 筛选条件
+            processes (int): 工作进程数，默认取配置 MONITOR_PROCESSES，最多每个源文件夹一个进程
+        """
+        if isinstance(source_roots, str):
+            source_roots = [source_roots]
+        self.source_roots = [os.path.abspath(root) for root in source_roots]
+        self.target_root = os.path.abspath(target_root)
+        self.file_types = file_types
+        self.lang = lang
+        self.wait_time = wait_time
+        # 工作进程中重新编译，FileFilter 不能直接传给子进程
+        self.where = getattr(where, 'expression', where)
+        processes = processes or get_config_value('MONITOR_PROCESSES', 0) or os.cpu_count() or 1
+        count = max(1, min(processes, len(self.source_roots)))
+        self.shards = [self.source_roots[i::count] for i in range(count)]
+        self.msg = MESSAGES[lang]
+        self._context = multiprocessing.get_context()
+        self._stop = self._context.RawValue('b', 0)
+        self._stopping = threading.Event()
+        self._workers = {}
+        self._lock = threading.Lock()
+        self._supervisor = None
+
+    def _spawn(self, shard, state):
+        """启动一个工作进程，返回 (进程, 读取报告的管道)"""
+        reader, writer = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_worker_main, name=f'batchgenie-monitor-{shard}', daemon=True,
+            args=(shard, self.shards[shard], self.target_root, self.file_types, self.lang, self.wait_time,
+                  self.where, state, writer, self._stop)
+        )
+        process.start()
+        # 关闭主进程中的写端，工作进程退出后读端才会收到 EOF
+        writer.close()
+        return process, reader
+
+    def start(self):
+        """启动所有工作进程和监督线程"""
+        self._stop.value = 0
+        self._stopping.clear()
+        now = time.time()
+        for shard, roots in enumerate(self.shards):
+            process, reader = self._spawn(shard, {})
+            self._workers[shard] = {
+                'process': process, 'reader': reader, 'roots': roots, 'started': now, 'restarts': 0, 'failures': 0,
+                'last': None, 'report': None, 'rate': 0.0,
+                # 等待重启时的计划重启时间；交给当前（或下一个）进程的状态
+                'restart_at': None, 'state': None,
+                # 最近一次报告的正在处理的文件；连续崩溃时正在处理的文件和次数；跳过的文件
+                'current': None, 'suspect': None, 'crashes': 0, 'skip': set(),
+                # 之前的进程累计的计数，重启后与新进程的计数相加
+                'base': {'events': 0, 'processed': 0, 'errors': 0},
+            }
+            print(self.msg['shard_started'].format(shard, process.pid, ', '.join(roots)))
+        self._supervisor = threading.Thread(target=self._supervise, name='monitor-supervisor', daemon=True)
+        self._supervisor.start()
+
+    def _record(self, report):
+        with self._lock:
+            self._apply(self._workers.get(report['shard']), report)
+
+    @staticmethod
+    def _apply(worker, report):
+        if worker is None or worker['process'] is None or report['pid'] != worker['process'].pid:
+            return
+        worker['current'] = report.get('current')
+        if 'time' not in report:
+            # 开始处理一个文件的通知，不是心跳
+            return
+        previous = worker['report']
+        if previous is not None and report['time'] > previous['time']:
+            worker['rate'] = (report['events'] - previous['events']) / (report['time'] - previous['time'])
+        worker['report'] = report
+        worker['last'] = report['time']
+
+    def _schedule_restart(self, shard, worker):
+        """记录退出进程的状态并安排重启；启动即失败时按指数退避推迟，由监督线程之后的循环执行，不阻塞其他分片"""
+        process = worker['process']
+        try:
+            # 进程退出前发出、还没读取的消息
+            while worker['reader'].poll():
+                self._apply(worker, worker['reader'].recv())
+        except (EOFError, OSError):
+            pass
+        report = worker['report'] or {}
+        failed_early = time.time() - worker['started'] < STARTUP_GRACE
+        worker['failures'] = worker['failures'] + 1 if failed_early else 0
+        worker['reader'].close()
+        worker['reader'] = None
+        suspect = worker['current']
+        worker['crashes'] = worker['crashes'] + 1 if suspect is not None and suspect == worker['suspect'] else 1
+        worker['suspect'], worker['current'] = suspect, None
+        if suspect is not None and worker['crashes'] >= QUARANTINE_CRASHES:
+            # 崩溃的原因是这个文件，跳过它之后分片可以照常工作
+            print(self.msg['quarantined'].format(shard, worker['crashes'], suspect))
+            worker['skip'].add(suspect)
+            worker.update(suspect=None, crashes=0, failures=0)
+        if worker['failures'] >= MAX_FAILURES:
+            print(self.msg['shard_gave_up'].format(shard, worker['failures']))
+            worker['process'] = None
+            return
+        for key in worker['base']:
+            worker['base'][key] += report.get(key, 0)
+        previous = worker['state']
+        if worker['report'] is None and previous:
+            # 进程在第一次报告前就退出，交给它的文件还没有被接手，原样交给下一个进程
+            pending, since = previous['pending'], previous['since']
+        else:
+            # 从最后一次报告之前开始补扫，最后一次报告之后进入队列的文件也不会漏掉
+            pending, since = report.get('pending', []), (worker['last'] or worker['started']) - HEARTBEAT_INTERVAL
+        worker['state'] = {'pending': [(root, path) for root, path in pending if path not in worker['skip']],
+                           'since': since, 'skip': sorted(worker['skip'])}
+        print(self.msg['shard_restarted'].format(shard, process.exitcode, len(worker['state']['pending'])))
+        delay = min(30, 2 ** worker['failures']) if failed_early else 0
+        worker.update(restart_at=time.time() + delay, report=None, rate=0.0)
+
+    def _restart(self, shard, worker):
+        """到了计划时间，用保存的状态启动新的工作进程"""
+        worker['process'], worker['reader'] = self._spawn(shard, worker['state'])
+        worker.update(started=time.time(), restarts=worker['restarts'] + 1, restart_at=None)
+
+    def _supervise(self):
+        while not self._stopping.is_set():
+            with self._lock:
+                readers = [worker['reader'] for worker in self._workers.values() if worker['reader'] is not None]
+            for reader in wait_connections(readers, timeout=HEARTBEAT_INTERVAL / 2) if readers else ():
+                try:
+                    # 读完已到达的全部消息：进程退出前的最后一条通知说明它在处理哪个文件
+                    self._record(reader.recv())
+                    while reader.poll():
+                        self._record(reader.recv())
+                except (EOFError, OSError):
+                    # 进程已退出，下面的存活检查负责重启
+                    continue
+            if not readers:
+                self._stopping.wait(HEARTBEAT_INTERVAL / 2)
+            with self._lock:
+                now = time.time()
+                for shard, worker in self._workers.items():
+                    process = worker['process']
+                    if process is None or self._stopping.is_set():
+                        continue
+                    if worker['restart_at'] is not None:
+                        if now >= worker['restart_at']:
+                            self._restart(shard, worker)
+                    elif not process.is_alive():
+                        self._schedule_restart(shard, worker)
+
+    def metrics(self):
+        """各分片的最新指标
+
+        Returns:
+            list: 每个分片一个 dict：shard、pid、alive、roots、events、processed、errors（含重启前的累计）、
+                  rate（事件/秒）、queue（队列长度）、latency_avg / latency_p95（毫秒，最近一个报告周期）、restarts
+        """
+        result = []
+        with self._lock:
+            for shard, worker in sorted(self._workers.items()):
+                process, report = worker['process'], worker['report'] or {}
+                item = {'shard': shard, 'pid': process.pid if process else None,
+                        'alive': bool(process and process.is_alive()), 'roots': worker['roots'],
+                        'rate': worker['rate'], 'queue': report.get('queue', 0),
+                        'latency_avg': report.get('latency_avg', 0.0), 'latency_p95': report.get('latency_p95', 0.0),
+                        'restarts': worker['restarts']}
+                for key, base in worker['base'].items():
+                    item[key] = base + report.get(key, 0)
+                result.append(item)
+        return result
+
+    def print_metrics(self):
+        for item in self.metrics():
+            print(self.msg['shard_stats'].format(**item))
+
+    def stop(self, timeout=5):
+        """通知所有工作进程停止并等待退出"""
+        self._stop.value = 1
+        self._stopping.set()
+        if self._supervisor is not None:
+            self._supervisor.join()
+        for worker in self._workers.values():
+            process = worker['process']
+            if process is None:
+                continue
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            # 等待重启的分片已在安排重启时关闭了管道
+            if worker['reader'] is not None:
+                worker['reader'].close()
@@ -0,0 +1,441 @@
+import os
+import stat
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from .audio_cache import record_moves
+from . import profiler
+from .progress import Progress
+from .plan_store import PlanStore
+
+MESSAGES = {
+    'zh': {
+        'source_missing': "源路径不存在: {}",
+        'target_missing': "缺少目标路径: {}",
+        'target_exists': "目标路径已存在: {}",
+        'duplicate_target': "多个操作指向同一目标: {}",
+        'invalid_type': "无效的操作类型: {}",
+        'problem': "  ⚠ {}",
+        'created_dirs': "已创建 {} 个目录",
+        'failed': "失败: {} ({})",
+        'cancelled': "已中断",
+        'summary': "批量操作完成：成功 {}，失败 {}，跳过 {}，耗时 {:.2f} 秒"
+    },
+    'en': {
+        'source_missing': "Source path does not exist: {}",
+        'target_missing': "Missing target path: {}",
+        'target_exists': "Target path already exists: {}",
+        'duplicate_target': "Multiple operations target the same path: {}",
+        'invalid_type': "Invalid operation type: {}",
+        'problem': "  ⚠ {}",
+        'created_dirs': "Created {} directories",
+        'failed': "Failed: {} ({})",
+        'cancelled': "Interrupted",
+        'summary': "Batch finished: {} succeeded, {} failed, {} skipped in {:.2f}s"
+    }
+}
+
+# 支持的操作类型
+OPERATION_TYPES = ('rename', 'move', 'copy', 'delete', 'create_dir', 'create_file')
+
+
+# 执行结果状态，ResultList 中按序号保存
+STATUSES = ('ok', 'failed', 'skipped')
+
+
+class OperationResult:
+    """单个文件操作的执行结果"""
+
+    __slots__ = ('operation', 'status', 'duration', 'bytes_processed', 'error')
+
+    def __init__(self, operation, status, duration=0.0, bytes_processed=0, error=None):
+        self.operation = operation
+        self.status = status  # ok, failed, skipped
+        self.duration = duration
+        self.bytes_processed = bytes_processed
+        self.error = error
+
+    def to_dict(self):
+        """转换为可序列化的字典"""
+        target = self.operation.target_path
+        return {
+            'type': self.operation.type,
+            'source': os.fspath(self.operation.source_path),
+            'target': os.fspath(target) if target is not None else None,
+            'status': self.status,
+            'duration': round(self.duration, 6),
+            'bytes': self.bytes_processed,
+            'error': self.error
+        }
+
+
+class ResultList:
+    """execute() 的结果：状态、耗时和字节数按列存放在数组中，错误信息单独保存
+
+    按序号或迭代访问时才生成 OperationResult，百万级操作的结果只占几十 MB。
+    """
+
+    def __init__(self, operations):
+        count = len(operations)
+        self.operations = operations
+        self._status = array('b', [-1]) * count  # -1 表示尚未执行
+        self._duration = array('d', [0.0]) * count
+        self._bytes = array('Q', [0]) * count
+        self._errors = {}
+
+    def set(self, index, status, duration=0.0, bytes_processed=0, error=None):
+        self._status[index] = STATUSES.index(status)
+        self._duration[index] = duration
+        self._bytes[index] = bytes_processed
+        if error is not None:
+            self._errors[index] = error
+
+    def status(self, index):
+        code = self._status[index]
+        return STATUSES[code] if code >= 0 else None
+
+    def error(self, index):
+        return self._errors.get(index)
+
+    def indexes(self, status):
+        """状态为 status 的操作序号"""
+        code = STATUSES.index(status)
+        return (index for index, value in enumerate(self._status) if value == code)
+
+    def summary(self):
+        """统计执行结果（与 FileOperationBatch.summarize 相同的字段）"""
+        summary = {'ok': 0, 'failed': 0, 'skipped': 0, 'bytes': sum(self._bytes), 'duration': sum(self._duration)}
+        for code, name in enumerate(STATUSES):
+            summary[name] = self._status.count(code)
+        return summary
+
+    def __len__(self):
+        return len(self._status)
+
+    def __getitem__(self, index):
+        status = self.status(index)
+        if status is None:
+            return None
+        return OperationResult(self.operations[index], status, self._duration[index], self._bytes[index],
+                               self._errors.get(index))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def _key(path):
+    """生成用于比较的路径键（忽略大小写差异的平台上统一大小写）"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+class FileOperationBatch:
+    """批量执行 FileOperation：一次遍历完成预览与校验，合并目录创建，按设备和目录分组并行执行"""
+
+    def __init__(self, operations=None, max_workers=None, lang='zh'):
+        """初始化批量执行器
+
+        Args:
+            operations (iterable): FileOperation 对象或 PlanStore（大型计划直接传 PlanStore 更省内存）
+            max_workers (int): 工作线程数，默认根据 CPU 数量决定
+            lang (str): 语言选项
+        """
+        self.operations = operations if isinstance(operations, PlanStore) else PlanStore(operations or ())
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+        self.lang = lang
+        self.msg = MESSAGES[lang]
+        self._stat_cache = {}
+
+    def __len__(self):
+        return len(self.operations)
+
+    def add(self, operation):
+        """添加一个操作"""
+        self.operations.add(operation)
+
+    def _stat(self, path):
+        """带缓存的 stat，返回 (st_dev << 1) | 是否目录，路径不存在时返回 None
+
+        只缓存分组和校验需要的两项信息：百万个完整的 stat_result 会占用数百 MB。
+        """
+        key = _key(path)
+        if key not in self._stat_cache:
+            try:
+                st = os.stat(path)
+                self._stat_cache[key] = (st.st_dev << 1) | stat.S_ISDIR(st.st_mode)
+            except OSError:
+                self._stat_cache[key] = None
+        return self._stat_cache[key]
+
+    def _effective_target(self, op):
+        """计算操作的实际目标路径（移动/复制到已存在目录时落到目录内部）"""
+        if op.target_path is None:
+            return None
+        target = os.fspath(op.target_path)
+        if op.type in ('move', 'copy'):
+            st = self._stat(target)
+            if st is not None and st & 1:
+                return os.path.join(target, os.path.basename(os.fspath(op.source_path)))
+        return target
+
+    def _check(self):
+        """按顺序校验每个操作，依次返回 (序号, 操作, 问题描述或 None)"""
+        planned_targets = set()
+        created = set()  # 前面的操作会创建的路径
+        removed = set()  # 前面的操作会移走或删除的路径
+        for index, op in enumerate(self.operations):
+            if op.type not in OPERATION_TYPES:
+                yield index, op, self.msg['invalid_type'].format(op.type)
+                continue
+
+            source = os.fspath(op.source_path)
+            source_key = _key(source)
+            if op.type in ('rename', 'move', 'copy', 'delete'):
+                exists = source_key in created or (
+                    self._stat(source) is not None and source_key not in removed
+                )
+                if not exists:
+                    yield index, op, self.msg['source_missing'].format(source)
+                    continue
+
+            if op.type in ('rename', 'move', 'copy'):
+                target = self._effective_target(op)
+                if target is None:
+                    yield index, op, self.msg['target_missing'].format(source)
+                    continue
+                target_key = _key(target)
+                if target_key in planned_targets:
+                    yield index, op, self.msg['duplicate_target'].format(target)
+                    continue
+                if target_key not in removed and (
+                    target_key in created or self._stat(target) is not None
+                ):
+                    yield index, op, self.msg['target_exists'].format(target)
+                    continue
+                planned_targets.add(target_key)
+                created.add(target_key)
+                removed.discard(target_key)
+                if op.type != 'copy':
+                    removed.add(source_key)
+                    created.discard(source_key)
+            elif op.type == 'delete':
+                removed.add(source_key)
+                created.discard(source_key)
+            else:  # create_dir, create_file
+                created.add(source_key)
+                removed.discard(source_key)
+            yield index, op, None
+
+    def validate(self):
+        """一次遍历校验所有操作
+
+        Returns:
+            dict: 操作序号 -> 问题描述
+        """
+        return {index: problem for index, _, problem in self._check() if problem is not None}
+
+    def iter_preview(self):
+        """逐行生成所有操作的预览（含校验问题），校验和预览共用一次遍历，不在内存中保存整个列表"""
+        for _, op, problem in self._check():
+            yield from op.preview()
+            if problem is not None:
+                yield self.msg['problem'].format(problem)
+
+    def preview(self):
+        """返回所有操作的预览列表"""
+        return list(self.iter_preview())
+
+    def _plan_directories(self, problems):
+        """收集需要创建的目录并去掉被子目录覆盖的祖先目录"""
+        directories = {}
+        for index, op in enumerate(self.operations):
+            if index in problems:
+                continue
+            if op.type == 'create_dir':
+                path = os.fspath(op.source_path)
+            elif op.type == 'create_file':
+                path = os.path.dirname(os.fspath(op.source_path))
+            elif op.type in ('rename', 'move', 'copy'):
+                path = os.path.dirname(self._effective_target(op))
+            else:
+                continue
+            if path:
+                directories.setdefault(_key(path), path)
+
+        # makedirs 会创建所有父目录，只保留最深的目录
+        ancestors = set()
+        for key in directories:
+            child, parent = key, os.path.dirname(key)
+            while parent != child and parent not in ancestors:
+                ancestors.add(parent)
+                child, parent = parent, os.path.dirname(parent)
+        return [path for key, path in directories.items() if key not in ancestors]
+
+    def _group(self, indexes):
+        """按设备和目录分组；共享路径的操作合并到同一组以保证先后顺序
+
+        路径相同、在同一目录下，或者一个操作的路径是另一个操作路径的祖先（例如删除 /X 与重命名 /X/sub/a）
+        的操作都合并到同一组。
+        """
+        parent = array('q', range(len(self.operations)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i, j):
+            parent[find(i)] = find(j)
+
+        # 只保存路径键的哈希：哈希冲突只会让两组合并串行执行，不影响正确性
+        owners = {}
+        # 操作自身的路径（不含所在目录）-> 操作序号，用于查找祖先路径上的操作
+        own = {}
+        keys = []
+        for index in indexes:
+            op = self.operations[index]
+            paths = [os.fspath(op.source_path)]
+            if op.type in ('rename', 'move', 'copy'):
+                paths.append(self._effective_target(op))
+            for path in paths:
+                path = _key(path)
+                keys.append((index, path))
+                own.setdefault(hash(path), index)
+                for key in (hash(path), hash(os.path.dirname(path))):
+                    if key in owners:
+                        union(index, owners[key])
+                    else:
+                        owners[key] = index
+
+        # 所有路径登记完之后再沿祖先查找，不受操作先后顺序的影响
+        for index, path in keys:
+            child, ancestor = path, os.path.dirname(os.path.dirname(path))
+            while ancestor != child:
+                other = own.get(hash(ancestor))
+                if other is not None:
+                    union(index, other)
+                child, ancestor = ancestor, os.path.dirname(ancestor)
+
+        groups = {}
+        for index in indexes:
+            groups.setdefault(find(index), []).append(index)
+
+        def locality(members):
+            source = os.fspath(self.operations[members[0]].source_path)
+            st = self._stat(source)
+            if st is None:
+                st = self._stat(os.path.dirname(source))
+            return (st >> 1 if st is not None else 0, _key(os.path.dirname(source)))
+
+        return sorted(groups.values(), key=locality)
+
+    def _run_group(self, members, results, progress):
+        """顺序执行同一组内的操作；请求中断后剩余的操作标记为跳过"""
+        for index in members:
+            op = self.operations[index]
+            if progress.cancelled:
+                results.set(index, 'skipped', error=self.msg['cancelled'])
+                continue
+            size = 0
+            if op.type in ('copy', 'move'):
+                try:
+                    size = os.stat(op.source_path).st_size
+                except OSError:
+                    size = 0
+            elif op.type == 'create_file':
+                content = op.parameters.get('content') or ''
+                size = len(content.encode('utf-8')) if isinstance(content, str) else len(content)
+            start = time.perf_counter()
+            error = None
+            try:
+                op.apply(make_parents=False)
+            except Exception as e:
+                error, size = str(e), 0
+            duration = time.perf_counter() - start
+            results.set(index, 'ok' if error is None else 'failed', duration, size, error)
+            profiler.record(f'batch.{op.type}', duration, size, start)
+            progress.advance(nbytes=size, error=error is not None)
+
+    def _resume_plan(self, results):
+        """因中断而未执行的操作，转换为可继续执行的 batch 计划"""
+        items = []
+        for index in results.indexes('skipped'):
+            if results.error(index) != self.msg['cancelled']:
+                continue
+            op = self.operations[index]
+            item = {'type': op.type, 'source': os.path.abspath(op.source_path)}
+            if op.target_path is not None:
+                item['target'] = os.path.abspath(op.target_path)
+            if 'content' in op.parameters:
+                item['content'] = op.parameters['content']
+            items.append(item)
+        return {'operation': 'batch', 'operations': items}
+
+    def execute(self):
+        """执行所有通过校验的操作
+
+        Returns:
+            ResultList: 与 operations 一一对应的 OperationResult 序列
+        """
+        started = time.perf_counter()
+        problems = self.validate()
+        results = ResultList(self.operations)
+        for index, reason in problems.items():
+            results.set(index, 'skipped', error=reason)
+
+        # 合并目录创建
+        created_dirs = 0
+        for path in self._plan_directories(problems):
+            if self._stat(path) is not None:
+                continue
+            try:
+                os.makedirs(path, exist_ok=True)
+                created_dirs += 1
+            except OSError as e:
+                print(self.msg['failed'].format(path, str(e)))
+        if created_dirs:
+            print(self.msg['created_dirs'].format(created_dirs))
+
+        indexes = [i for i in range(len(self.operations)) if i not in problems]
+        groups = self._group(indexes)
+        with Progress(len(indexes), 'batch', self.lang) as progress:
+            if len(groups) <= 1 or self.max_workers <= 1:
+                for members in groups:
+                    self._run_group(members, results, progress)
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(groups))) as executor:
+                    futures = [executor.submit(self._run_group, members, results, progress) for members in groups]
+                    for future in futures:
+                        future.result()
+            if progress.cancelled:
+                progress.save_resume(self._resume_plan(results))
+
+        # 音频元数据缓存跟随文件迁移（目标路径按执行前的 stat 缓存计算）
+        record_moves(
+            (op.source_path, self._effective_target(op))
+            for op in (self.operations[index] for index in results.indexes('ok'))
+            if op.type in ('rename', 'move')
+        )
+        # 执行后文件系统已改变，清空 stat 缓存
+        self._stat_cache.clear()
+
+        summary = self.summarize(results)
+        for index in results.indexes('failed'):
+            print(self.msg['failed'].format(self.operations[index].source_path, results.error(index)))
+        print(self.msg['summary'].format(
+            summary['ok'], summary['failed'], summary['skipped'], time.perf_counter() - started
+        ))
+        return results
+
+    @staticmethod
+    def summarize(results):
+        """统计执行结果"""
+        if isinstance(results, ResultList):
+            return results.summary()
+        summary = {'ok': 0, 'failed': 0, 'skipped': 0, 'bytes': 0, 'duration': 0.0}
+        for result in results:
+            summary[result.status] += 1
+            summary['bytes'] += result.bytes_processed
+            summary['duration'] += result.duration
+        return summary
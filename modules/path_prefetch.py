@@ -0,0 +1,181 @@
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from .pattern_expander import warm_directory, forget_warm_listings
+
+# 路径起始位置：Windows 盘符、用户目录 ~ 或 POSIX 根目录
+_PATH_START = re.compile(r'(?:(?<![A-Za-z])[A-Za-z]:[\\/]|~[\\/]|(?<![\w:])/(?=[^\s/]))')
+# 路径在这些字符处结束（引号、中文标点、换行等）
+_PATH_END = re.compile(r'["\'“”‘’，。；、：！？（）《》<>|\n\r\t,;]')
+
+
+def _existing_prefix(candidate):
+    """在候选文本中找到最长的存在路径前缀"""
+    candidate = candidate.rstrip()
+    # 遇到通配符时只保留其所在目录
+    for i, c in enumerate(candidate):
+        if c in '*?[':
+            candidate = os.path.dirname(candidate[:i])
+            break
+    candidate = os.path.expanduser(candidate)
+
+    # 路径可能包含空格，从右向左在空白处截断尝试
+    cut = candidate
+    while cut:
+        if os.path.exists(cut):
+            return cut
+        index = max(cut.rfind(' '), cut.rfind('　'))
+        if index <= 0:
+            break
+        cut = cut[:index].rstrip()
+
+    # 路径后紧跟其他文字时，逐级回退到存在的父目录
+    path = candidate
+    while path and not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+    return path or None
+
+
+def extract_candidate_paths(prompt):
+    """从自然语言指令中提取可能涉及的本地路径
+
+    Args:
+        prompt (str): 已替换占位符的用户指令
+
+    Returns:
+        list: 存在的路径列表（不包含文件系统根目录）
+    """
+    paths = []
+    seen = set()
+    for match in _PATH_START.finditer(prompt):
+        start = match.start()
+        end_match = _PATH_END.search(prompt, start)
+        end = end_match.start() if end_match else len(prompt)
+        path = _existing_prefix(prompt[start:end])
+        if not path:
+            continue
+        path = os.path.normpath(path)
+        # 不预取整个盘符或根目录
+        if os.path.dirname(path) == path:
+            continue
+        key = os.path.normcase(path)
+        if key not in seen:
+            seen.add(key)
+            paths.append(path)
+    return paths
+
+
+def _related(directory, roots):
+    """目录与某个根路径相同，或者互为上下级"""
+    directory = os.path.normcase(os.path.abspath(directory))
+    for root in roots:
+        try:
+            common = os.path.commonpath([directory, root])
+        except ValueError:
+            continue
+        if common in (directory, root):
+            return True
+    return False
+
+
+class PathPrefetcher:
+    """在等待 AI 响应期间，后台预先列出指令中提到的目录并缓存 stat 信息"""
+
+    def __init__(self, max_workers=4, depth=1, max_entries=200000):
+        """初始化预取器
+
+        Args:
+            max_workers (int): 预取线程数
+            depth (int): 向下预取的子目录层数
+            max_entries (int): 最多预取的条目数，避免在超大目录上浪费资源
+        """
+        self.max_workers = max_workers
+        self.depth = depth
+        self.max_entries = max_entries
+        self._executor = None
+        self._futures = []  # (目录, future)
+        self._warmed = []  # 本预取器缓存的 (目录, 条目列表)，停止时只释放这些
+        self._lock = threading.Lock()
+        self._entries = 0
+        self._stopped = threading.Event()
+
+    def start(self, prompt):
+        """提取候选路径并开始后台预取
+
+        Args:
+            prompt (str): 已替换占位符的用户指令
+
+        Returns:
+            PathPrefetcher: 自身，便于链式调用
+        """
+        paths = extract_candidate_paths(prompt)
+        if not paths:
+            return self
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        for path in paths:
+            if os.path.isdir(path):
+                self._submit(path, self.depth)
+            else:
+                # 文件：预取所在目录，顺带缓存该文件的 stat
+                self._submit(os.path.dirname(path), 0)
+        return self
+
+    def _submit(self, directory, depth):
+        with self._lock:
+            if self._stopped.is_set() or self._entries >= self.max_entries:
+                return
+            self._futures.append((directory, self._executor.submit(self._scan, directory, depth)))
+
+    def _scan(self, directory, depth):
+        """预取单个目录，并按深度继续预取子目录"""
+        if self._stopped.is_set():
+            return
+        entries = warm_directory(directory)
+        with self._lock:
+            self._entries += len(entries)
+            self._warmed.append((directory, entries))
+        if depth <= 0:
+            return
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    self._submit(entry.path, depth - 1)
+            except OSError:
+                continue
+
+    def wait(self, timeout=None, roots=None):
+        """等待已提交的预取任务完成（预取过程中还会提交子目录任务）
+
+        Args:
+            timeout (float): 最长等待秒数，None 表示一直等到完成
+            roots (list): 只等待这些路径及其上下级目录的预取（通常是解析后的计划实际用到的路径），None 表示全部
+        """
+        if roots is not None:
+            roots = [os.path.normcase(os.path.abspath(root)) for root in roots]
+            if not roots:
+                return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                pending = [f for directory, f in self._futures
+                           if not f.done() and (roots is None or _related(directory, roots))]
+            if not pending:
+                return
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return
+            wait(pending, timeout=remaining)
+
+    def stop(self):
+        """停止预取并释放本预取器缓存的目录列表（其他任务预取的目录保留）"""
+        self._stopped.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            warmed, self._warmed = self._warmed, []
+        forget_warm_listings(warmed)
@@ -0,0 +1,406 @@
+import os
+import re
+import time
+import threading
+from .profiler import span
+from . import fs_index
+from .file_filter import compile_filter
+
+# 通配符字符
+_MAGIC_CHARS = '*?['
+# 递归模式下 "**" 的正则：中间位置匹配零个或多个非隐藏目录，末尾匹配所有非隐藏路径
+_ANY_DIRS = r'(?:(?!\.)[^/]+/)*'
+_ANY_PATH = r'(?!\.)[^/]+(?:/(?!\.)[^/]+)*'
+# 不区分大小写的平台（Windows）上匹配时忽略大小写
+_FLAGS = re.IGNORECASE if os.path.normcase('A') == 'a' else 0
+
+
+def has_magic(pattern):
+    """判断路径是否包含通配符"""
+    return any(c in pattern for c in _MAGIC_CHARS)
+
+
+def _literal(component):
+    """返回路径组件的字面值；包含通配符时返回 None
+
+    glob.escape 生成的单字符转义（如 [*]、[[]）被视为字面字符。
+    """
+    result = []
+    i, n = 0, len(component)
+    while i < n:
+        c = component[i]
+        if c == '[':
+            if i + 2 < n and component[i + 2] == ']' and component[i + 1] in _MAGIC_CHARS:
+                result.append(component[i + 1])
+                i += 3
+                continue
+            return None
+        if c in '*?':
+            return None
+        result.append(c)
+        i += 1
+    return ''.join(result)
+
+
+def _component_regex(component):
+    """把单个路径组件的通配符模式转换为正则表达式（不跨越目录分隔符）"""
+    parts = []
+    i, n = 0, len(component)
+    while i < n:
+        c = component[i]
+        i += 1
+        if c == '*':
+            parts.append('[^/]*')
+        elif c == '?':
+            parts.append('[^/]')
+        elif c == '[':
+            j = i
+            if j < n and component[j] == '!':
+                j += 1
+            if j < n and component[j] == ']':
+                j += 1
+            while j < n and component[j] != ']':
+                j += 1
+            if j >= n:
+                parts.append('\\[')
+                continue
+            stuff = component[i:j].replace('\\', '\\\\')
+            # 与 fnmatch.translate 一样转义集合中的 [ 和集合运算符，避免被 re 当作嵌套集合
+            stuff = re.sub(r'([&~|[])', r'\\\1', stuff)
+            i = j + 1
+            if stuff.startswith('!'):
+                parts.append('[^/' + stuff[1:] + ']')
+            elif stuff.startswith('^'):
+                parts.append('[\\' + stuff + ']')
+            else:
+                parts.append('[' + stuff + ']')
+        else:
+            parts.append(re.escape(c))
+    regex = ''.join(parts)
+    # 与 glob 一致：除非模式以点开头，否则不匹配隐藏文件
+    if not component.startswith('.'):
+        regex = r'(?!\.)' + regex
+    return regex
+
+
+class _PatternSpec:
+    """拆分后的单个模式：字面根目录 + 剩余通配组件；dirs_only 表示模式以分隔符结尾，只匹配目录"""
+
+    def __init__(self, root, components, recursive, dirs_only=False):
+        self.root = root
+        self.components = components
+        self.recursive = recursive
+        self.dirs_only = dirs_only
+
+    @property
+    def unbounded(self):
+        return self.recursive and '**' in self.components
+
+    def zero_depth(self):
+        """末尾的 ** 与 glob 一样也匹配零层：返回匹配 ** 之前那一级目录的模式，没有时返回 None
+
+        只有 ** 一个组件时，匹配的是根目录本身，由调用方处理。
+        """
+        if self.recursive and len(self.components) > 1 and self.components[-1] == '**':
+            return _PatternSpec(self.root, self.components[:-1], self.recursive, dirs_only=True)
+        return None
+
+    def regex(self):
+        """生成匹配相对路径（以 / 分隔）的正则表达式"""
+        regex = ''
+        last = len(self.components) - 1
+        for i, component in enumerate(self.components):
+            if component == '**' and self.recursive:
+                regex += _ANY_PATH if i == last else _ANY_DIRS
+            else:
+                regex += _component_regex(component) + ('' if i == last else '/')
+        return regex
+
+    def level_regex(self, depth):
+        """返回第 depth 层目录允许下探的组件正则；None 表示不限制，False 表示不需要下探"""
+        if self.recursive and '**' in self.components[:depth + 1]:
+            return None
+        if depth < len(self.components) - 1:
+            return _component_regex(self.components[depth])
+        return False
+
+    def rebase(self, root):
+        """把模式改写为相对于祖先目录 root 的形式"""
+        relative = os.path.relpath(self.root, root or os.curdir)
+        prefix = [] if relative == os.curdir else relative.split(os.sep)
+        escaped = [re.sub(r'([*?[])', r'[\1]', part) for part in prefix]
+        return _PatternSpec(root, escaped + self.components, self.recursive, self.dirs_only)
+
+
+def _split(pattern, recursive):
+    """把模式拆分为字面根目录和通配组件；以分隔符结尾的模式（如 dir/*/）与 glob 一样只匹配目录"""
+    dirs_only = pattern.endswith(os.sep) or bool(os.altsep and pattern.endswith(os.altsep))
+    pattern = os.path.normpath(pattern)
+    drive, rest = os.path.splitdrive(pattern)
+    anchor = os.sep if rest.startswith(os.sep) else ''
+    components = [c for c in rest.split(os.sep) if c]
+    literal = []
+    for component in components:
+        value = _literal(component)
+        if value is None:
+            break
+        literal.append(value)
+    root = drive + anchor + os.sep.join(literal)
+    # 只有根（如 / 或 C:\）时结尾的分隔符不表示只匹配目录
+    return _PatternSpec(root, components[len(literal):], recursive, dirs_only and bool(components))
+
+
+# 预取的目录列表：规范化路径 -> (目录 mtime_ns, 缓存时间, 条目列表)
+_warm_listings = {}
+_warm_lock = threading.Lock()
+# 预取列表的有效期（秒），目录 mtime 不变时也不会无限期使用旧的 stat 信息
+WARM_LISTING_TTL = 60
+
+
+def warm_directory(path):
+    """预先列出目录并缓存每个条目的 stat 信息，供随后的模式展开直接使用
+
+    Args:
+        path (str): 目录路径
+
+    Returns:
+        list: os.DirEntry 列表（目录不可访问时为空列表）
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError:
+        return []
+    for entry in entries:
+        try:
+            # DirEntry 会缓存 stat 和 is_dir 的结果
+            entry.stat()
+            entry.is_dir()
+        except OSError:
+            pass
+    with _warm_lock:
+        _warm_listings[os.path.normcase(os.path.abspath(path))] = (mtime, time.monotonic(), entries)
+    return entries
+
+
+def clear_warm_listings():
+    """清空所有预取的目录列表"""
+    with _warm_lock:
+        _warm_listings.clear()
+
+
+def forget_warm_listings(listings):
+    """只释放指定的预取结果，其他任务预取的目录不受影响
+
+    Args:
+        listings (iterable): warm_directory 的 (目录, 返回的条目列表)；目录之后又被重新预取时保留新的结果
+    """
+    with _warm_lock:
+        for path, entries in listings:
+            key = os.path.normcase(os.path.abspath(path))
+            cached = _warm_listings.get(key)
+            if cached is not None and cached[2] is entries:
+                del _warm_listings[key]
+
+
+def pattern_root(pattern):
+    """返回模式中不含通配符的最长前缀路径（字面路径返回自身）"""
+    return _split(pattern, True).root or os.curdir
+
+
+def _scandir(path):
+    """列出目录内容，优先使用仍然有效的预取结果，其次是文件索引，无法访问时返回空列表"""
+    if _warm_listings:
+        key = os.path.normcase(os.path.abspath(path))
+        with _warm_lock:
+            cached = _warm_listings.get(key)
+        if cached is not None:
+            mtime, cached_at, entries = cached
+            try:
+                if (os.stat(path).st_mtime_ns == mtime
+                        and time.monotonic() - cached_at < WARM_LISTING_TTL):
+                    return entries
+            except OSError:
+                pass
+            # 目录已变化或缓存过期
+            with _warm_lock:
+                _warm_listings.pop(key, None)
+    try:
+        entries = fs_index.listing(path)
+    except OSError:
+        return []
+    if entries is not None:
+        return entries
+    try:
+        with span('fs.scandir'), os.scandir(path) as it:
+            return list(it)
+    except OSError:
+        return []
+
+
+class _RootMatcher:
+    """同一根目录下所有模式编译成的组合匹配器"""
+
+    def __init__(self, root, specs):
+        self.root = root
+        zero_depth = [spec.zero_depth() for spec in specs]
+        dir_specs = [spec for spec in specs if spec.dirs_only] + [spec for spec in zero_depth if spec is not None]
+        self.regex = self._compile(spec for spec in specs if not spec.dirs_only)
+        # 只有目录才能匹配的模式
+        self.dir_regex = self._compile(dir_specs)
+        # root/** 与 glob 一样包括根目录本身
+        self.include_root = bool(root) and any(
+            spec.recursive and spec.components == ['**'] for spec in specs)
+        self.unbounded = any(spec.unbounded for spec in specs)
+        self.max_depth = max(len(spec.components) for spec in specs)
+        self._levels = {}
+        self._specs = specs
+
+    @staticmethod
+    def _compile(specs):
+        return re.compile('|'.join(f'(?:{spec.regex()})' for spec in specs) or '(?!)', _FLAGS)
+
+    def _matches(self, relative, entry):
+        """相对路径是否匹配；entry 为 DirEntry、文件索引条目或返回条目的函数，只有需要判断是否为目录时才使用"""
+        if self.regex.fullmatch(relative):
+            return True
+        if self.dir_regex.fullmatch(relative):
+            try:
+                return (entry() if callable(entry) else entry).is_dir()
+            except OSError:
+                return False
+        return False
+
+    def can_descend(self, name, depth):
+        """判断第 depth 层的目录 name 是否可能包含匹配项"""
+        if depth not in self._levels:
+            alternatives = []
+            unrestricted = False
+            for spec in self._specs:
+                level = spec.level_regex(depth)
+                if level is None:
+                    unrestricted = True
+                    break
+                if level is not False:
+                    alternatives.append(f'(?:{level})')
+            if unrestricted:
+                self._levels[depth] = None
+            elif alternatives:
+                self._levels[depth] = re.compile('|'.join(alternatives), _FLAGS)
+            else:
+                self._levels[depth] = False
+        level = self._levels[depth]
+        if level is None:
+            return True
+        if level is False:
+            return False
+        return level.fullmatch(name) is not None
+
+    def walk(self, where=None):
+        """单次遍历根目录，逐个产出匹配的路径
+
+        where 为 FileFilter 时只产出满足条件的路径，条件使用遍历时 scandir 已缓存的 stat 信息。
+        文件索引只用来按名称缩小候选范围：索引中的大小和时间可能落后于文件本身，
+        展开结果会交给删除、移动等操作，所以索引条目的条件按实时的 os.stat 判断。
+        """
+        if self.include_root and (where is None or where.match(self.root)):
+            yield self.root
+        if self.unbounded:
+            # 根目录已建立索引时，整棵树只需一次查询
+            relatives = fs_index.walk(self.root or os.curdir)
+            if relatives is not None:
+                for relative, row in relatives:
+                    if not self._matches(relative, lambda row=row: fs_index.IndexedEntry(*row)):
+                        continue
+                    relative_path = relative.replace('/', os.sep)
+                    path = os.path.join(self.root, relative_path) if self.root else relative_path
+                    if where is None or where.match(path):
+                        yield path
+                return
+        stack = [(self.root or os.curdir, '', 0)]
+        while stack:
+            directory, prefix, depth = stack.pop()
+            for entry in _scandir(directory):
+                relative = prefix + entry.name
+                if self._matches(relative, entry) and (where is None or where.match(
+                        entry.path if isinstance(entry, fs_index.IndexedEntry) else entry)):
+                    relative_path = relative.replace('/', os.sep)
+                    yield os.path.join(self.root, relative_path) if self.root else relative_path
+                if not self.unbounded and depth + 1 >= self.max_depth:
+                    continue
+                try:
+                    # 无限深度（**）遍历时不跟随符号链接，避免循环
+                    is_dir = entry.is_dir(follow_symlinks=not self.unbounded)
+                except OSError:
+                    continue
+                if is_dir and self.can_descend(entry.name, depth):
+                    stack.append((entry.path, relative + '/', depth + 1))
+
+
+def _group(specs):
+    """按根目录分组；可被祖先目录的无限深度遍历覆盖的根目录并入祖先组"""
+    groups = {}
+    for spec in specs:
+        groups.setdefault(os.path.normcase(spec.root), []).append(spec)
+
+    merged = {}
+    for key in sorted(groups, key=len):
+        specs_in_root = groups[key]
+        for ancestor, ancestor_specs in merged.items():
+            if not any(spec.unbounded for spec in ancestor_specs):
+                continue
+            if ancestor:
+                covered = key.startswith(ancestor.rstrip(os.sep) + os.sep)
+            else:
+                covered = not os.path.isabs(key) and not key.startswith(os.pardir)
+            if covered:
+                root = ancestor_specs[0].root
+                ancestor_specs.extend(spec.rebase(root) for spec in specs_in_root)
+                break
+        else:
+            merged[key] = list(specs_in_root)
+    return merged.values()
+
+
+def expand_patterns(patterns, recursive=True, where=None):
+    """展开多个通配符模式，每个根目录只遍历一次
+
+    模式按字面根目录分组，同组模式编译为一个正则，用 os.scandir 遍历根目录一次，
+    匹配结果以生成器的形式逐个返回（已去重）。
+
+    Args:
+        patterns (iterable): 通配符模式列表（语义与 glob.glob 相同）
+        recursive (bool): 是否支持 ** 递归匹配
+        where (str): 筛选条件（见 file_filter），如 "size > 1G and age > 30d"
+
+    Yields:
+        str: 匹配的路径
+
+    Raises:
+        ValueError: 筛选条件无法解析（在产出第一个结果之前）
+    """
+    where = compile_filter(where)
+    seen = set()
+    specs = []
+    for pattern in patterns:
+        spec = _split(pattern, recursive)
+        if not spec.components:
+            # 不含通配符的字面路径，直接检查是否存在
+            key = os.path.normcase(spec.root)
+            exists = os.path.isdir(spec.root) if spec.dirs_only else os.path.lexists(spec.root)
+            if key not in seen and exists and (where is None or where.match(spec.root)):
+                seen.add(key)
+                yield spec.root
+            continue
+        specs.append(spec)
+
+    for group in _group(specs):
+        matcher = _RootMatcher(group[0].root, group)
+        if matcher.root and not os.path.isdir(matcher.root):
+            continue
+        for path in matcher.walk(where):
+            key = os.path.normcase(path)
+            if key not in seen:
+                seen.add(key)
+                yield path
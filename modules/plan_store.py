@@ -0,0 +1,256 @@
+import os
+import mmap
+import shutil
+import tempfile
+import threading
+from array import array
+from utils import get_config_value
+
+# 文件名区超过这个大小（字节）后写入临时文件，只在内存中保留索引数组
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+
+
+class FileOperation:
+    """一个文件操作：类型、源路径、目标路径和附加参数（如 create_file 的 content）"""
+
+    __slots__ = ('type', 'source_path', 'target_path', 'parameters')
+
+    def __init__(self, operation_type, source_path, target_path=None, parameters=None):
+        self.type = operation_type  # rename, move, delete, copy, create_dir, create_file 等
+        self.source_path = os.path.normpath(os.fspath(source_path))
+        self.target_path = os.path.normpath(os.fspath(target_path)) if target_path else None
+        self.parameters = parameters or {}
+
+    def preview(self):
+        """返回此操作将影响的文件列表"""
+        affected_files = []
+        try:
+            if self.type == "rename":
+                affected_files.append(f"{self.source_path} -> {self.target_path}")
+            elif self.type == "move":
+                affected_files.append(f"移动: {self.source_path} -> {self.target_path}")
+            elif self.type == "copy":
+                affected_files.append(f"复制: {self.source_path} -> {self.target_path}")
+            elif self.type == "delete":
+                affected_files.append(f"删除: {self.source_path}")
+            elif self.type == "create_dir":
+                affected_files.append(f"创建目录: {self.source_path}")
+            elif self.type == "create_file":
+                affected_files.append(f"创建文件: {self.source_path}")
+                if self.parameters.get('content'):
+                    affected_files.append(f"文件内容: {self.parameters['content'][:100]}...")
+        except Exception as e:
+            affected_files.append(f"预览错误: {str(e)}")
+        return affected_files
+
+    def apply(self, make_parents=True):
+        """执行文件操作，出错时抛出异常
+
+        Args:
+            make_parents (bool): 创建文件前是否确保父目录存在（批量执行时已统一创建）
+        """
+        if self.type == "rename":
+            os.rename(self.source_path, self.target_path)
+        elif self.type == "move":
+            shutil.move(self.source_path, self.target_path)
+        elif self.type == "copy":
+            shutil.copy2(self.source_path, self.target_path)
+        elif self.type == "delete":
+            if os.path.isfile(self.source_path):
+                os.remove(self.source_path)
+            else:
+                shutil.rmtree(self.source_path)
+        elif self.type == "create_dir":
+            os.makedirs(self.source_path, exist_ok=True)
+        elif self.type == "create_file":
+            # 确保父目录存在
+            if make_parents:
+                os.makedirs(os.path.dirname(self.source_path) or '.', exist_ok=True)
+            # 创建文件并写入内容
+            mode = 'w' if isinstance(self.parameters.get('content', ''), str) else 'wb'
+            with open(self.source_path, mode, encoding='utf-8' if mode == 'w' else None) as f:
+                if self.parameters.get('content'):
+                    f.write(self.parameters['content'])
+                else:
+                    f.write('')  # 创建空文件
+        else:
+            raise ValueError(f"无效的操作类型: {self.type}")
+
+    def execute(self):
+        """执行文件操作"""
+        try:
+            self.apply()
+            return True
+        except Exception as e:
+            print(f"执行错误: {str(e)}")
+            return False
+
+
+def _encode(name):
+    return name.encode('utf-8', 'surrogateescape')
+
+
+def _decode(data):
+    return data.decode('utf-8', 'surrogateescape')
+
+
+class PlanStore:
+    """大型操作计划的紧凑存储
+
+    每条记录只占几个数组元素：操作类型和目录是驻留表中的序号（同一目录只保存一次），
+    源文件名和目标文件名按 UTF-8 连续存放在一块字节区中，靠偏移量数组定位。
+    一百万条重命名约占几十 MB，而 FileOperation 对象列表要接近 1 GB。
+    字节区超过 memory_limit 后写入临时文件（用 mmap 读取），内存中只保留索引数组。
+
+    按序号或迭代访问时才临时生成 FileOperation；只需要路径时用 paths() 更省。
+    """
+
+    def __init__(self, operations=(), memory_limit=None):
+        """
+        Args:
+            operations (iterable): FileOperation 对象
+            memory_limit (int): 文件名区在内存中的上限（字节），默认取配置 PLAN_MEMORY_LIMIT
+        """
+        self.memory_limit = memory_limit or get_config_value('PLAN_MEMORY_LIMIT', DEFAULT_MEMORY_LIMIT)
+        self._types = array('B')
+        self._type_names = []
+        self._type_ids = {}
+        self._dirs = []  # 目录前缀（含末尾分隔符），还原路径时直接拼接文件名
+        self._dir_ids = {}
+        self._source_dirs = array('I')
+        self._target_dirs = array('i')  # -1 表示没有目标路径
+        # 第 i 条记录的源文件名位于 [offsets[2i], offsets[2i+1])，目标文件名位于 [offsets[2i+1], offsets[2i+2])
+        self._offsets = array('Q', [0])
+        self._names = bytearray()
+        self._parameters = {}  # 很少出现（create_file 的内容），按序号单独保存
+        self._spill = None
+        self._spilled = 0
+        self._map = None
+        self._map_lock = threading.Lock()
+        self.extend(operations)
+
+    # 写入
+
+    def _intern(self, table, ids, value):
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(table)
+            table.append(value)
+        return index
+
+    def _split(self, path):
+        """拆成 (目录前缀序号, 文件名)；规范化后的路径只含 os.sep，前缀 + 文件名即为原路径"""
+        cut = path.rfind(os.sep) + 1
+        return self._intern(self._dirs, self._dir_ids, path[:cut]), path[cut:]
+
+    def append(self, operation_type, source_path, target_path=None, parameters=None):
+        """追加一条记录（路径按 FileOperation 的方式规范化）"""
+        self._append(operation_type, os.path.normpath(os.fspath(source_path)),
+                     os.path.normpath(os.fspath(target_path)) if target_path else None, parameters)
+
+    def add(self, operation):
+        """追加一个 FileOperation（路径已规范化）"""
+        self._append(operation.type, operation.source_path, operation.target_path, operation.parameters)
+
+    def extend(self, operations):
+        for operation in operations:
+            self.add(operation)
+
+    def _append(self, operation_type, source_path, target_path, parameters):
+        source_id, source_name = self._split(source_path)
+        if target_path:
+            target_id, target_name = self._split(target_path)
+        else:
+            target_id, target_name = -1, ''
+        self._types.append(self._intern(self._type_names, self._type_ids, operation_type))
+        self._source_dirs.append(source_id)
+        self._target_dirs.append(target_id)
+        self._names += _encode(source_name)
+        self._offsets.append(self._spilled + len(self._names))
+        self._names += _encode(target_name)
+        self._offsets.append(self._spilled + len(self._names))
+        if parameters:
+            self._parameters[len(self._types) - 1] = parameters
+        if len(self._names) > self.memory_limit:
+            self._spill_names()
+
+    def _spill_names(self):
+        """把内存中的文件名区追加到临时文件"""
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(prefix='batchgenie_plan_')
+        self._spill.seek(0, os.SEEK_END)
+        self._spill.write(self._names)
+        self._spill.flush()
+        self._spilled += len(self._names)
+        self._names = bytearray()
+
+    # 读取
+
+    def _name(self, start, end):
+        if start >= self._spilled:
+            return _decode(self._names[start - self._spilled:end - self._spilled])
+        with self._map_lock:
+            if self._map is None or len(self._map) < self._spilled:
+                if self._map is not None:
+                    self._map.close()
+                self._map = mmap.mmap(self._spill.fileno(), self._spilled, access=mmap.ACCESS_READ)
+            return _decode(self._map[start:end])
+
+    def record(self, index):
+        """第 index 条记录的 (操作类型, 源路径, 目标路径)"""
+        offsets = self._offsets
+        start, middle, end = offsets[2 * index], offsets[2 * index + 1], offsets[2 * index + 2]
+        source = self._dirs[self._source_dirs[index]] + self._name(start, middle)
+        target_id = self._target_dirs[index]
+        target = self._dirs[target_id] + self._name(middle, end) if target_id >= 0 else None
+        return self._type_names[self._types[index]], source, target
+
+    def __len__(self):
+        return len(self._types)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('plan index out of range')
+        return self._operation(index)
+
+    def _operation(self, index):
+        # 保存时已规范化路径，直接还原，不再经过 FileOperation.__init__
+        operation = FileOperation.__new__(FileOperation)
+        operation.type, operation.source_path, operation.target_path = self.record(index)
+        operation.parameters = self._parameters.get(index) or {}
+        return operation
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._operation(index)
+
+    def paths(self, reverse=False):
+        """依次返回 (操作类型, 源路径, 目标路径)，不创建 FileOperation"""
+        indexes = range(len(self) - 1, -1, -1) if reverse else range(len(self))
+        for index in indexes:
+            yield self.record(index)
+
+    @property
+    def nbytes(self):
+        """内存中占用的大致字节数（不含已写入临时文件的部分）"""
+        arrays = (self._types, self._source_dirs, self._target_dirs, self._offsets)
+        return (sum(a.itemsize * len(a) for a in arrays) + len(self._names)
+                + sum(len(d) for d in self._dirs))
+
+    def close(self):
+        """释放临时文件"""
+        with self._map_lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
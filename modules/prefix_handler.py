@@ -1,5 +1,9 @@
 import os
 import glob
+from .pattern_expander import expand_patterns
+from .audio_cache import record_moves
+from .profiler import span
+from .progress import Progress, batch_plan
 
 MESSAGES = {
     'zh': {
@@ -24,7 +28,7 @@ MESSAGES = {
     }
 }
 
-def add_prefix(folder_path, file_extension, prefix, lang='zh'):
+def add_prefix(folder_path, file_extension, prefix, lang='zh', confirm=True, where=None):
     """批量为文件添加前缀
     
     Args:
@@ -32,6 +36,8 @@ def add_prefix(folder_path, file_extension, prefix, lang='zh'):
         file_extension (str): 文件扩展名（如 txt）
         prefix (str): 要添加的前缀
         lang (str): 语言选项
+        confirm (bool): 是否需要确认
+        where (str): 筛选条件（见 file_filter），如 "size > 1G and age > 30d"
     
     Returns:
         bool: 操作是否成功
@@ -41,11 +47,11 @@ def add_prefix(folder_path, file_extension, prefix, lang='zh'):
         # 规范化路径
         folder_path = os.path.normpath(folder_path)
         
-        # 构建完整的搜索模式
-        search_pattern = os.path.join(folder_path, f"*.{file_extension}")
+        # 构建完整的搜索模式（转义文件夹路径中的通配符字符）
+        search_pattern = os.path.join(glob.escape(folder_path), f"*.{file_extension}")
         
         # 获取所有匹配的文件
-        files = glob.glob(search_pattern)
+        files = list(expand_patterns([search_pattern], recursive=False, where=where))
         
         if not files:
             print(msg['no_files'])
@@ -59,22 +65,39 @@ def add_prefix(folder_path, file_extension, prefix, lang='zh'):
             print(msg['rename_preview'].format(file_path, new_path))
         
         # 请求确认
-        response = input(msg['confirm_rename']).lower()
-        if response != 'y':
-            print(msg['rename_cancelled'])
-            return False
+        if confirm:
+            response = input(msg['confirm_rename']).lower()
+            if response != 'y':
+                print(msg['rename_cancelled'])
+                return False
         
         # 执行重命名
-        for file_path in files:
-            try:
-                new_name = prefix + os.path.basename(file_path)
-                new_path = os.path.join(os.path.dirname(file_path), new_name)
-                print(msg['renaming'].format(file_path, new_path))
-                os.rename(file_path, new_path)
-            except Exception as e:
-                print(msg['rename_error'].format(str(e)))
-                continue
+        renamed = []
+        with Progress(len(files), 'prefix', lang) as progress:
+            for index, file_path in enumerate(files):
+                if progress.cancelled:
+                    # 剩余的重命名保存为执行计划（重新运行会给已处理的文件再加一次前缀）
+                    progress.save_resume(batch_plan(
+                        ('rename', path, os.path.join(os.path.dirname(path), prefix + os.path.basename(path)))
+                        for path in files[index:]
+                    ))
+                    break
+                try:
+                    new_name = prefix + os.path.basename(file_path)
+                    new_path = os.path.join(os.path.dirname(file_path), new_name)
+                    print(msg['renaming'].format(file_path, new_path))
+                    with span('fs.rename'):
+                        os.rename(file_path, new_path)
+                    renamed.append((file_path, new_path))
+                    progress.advance()
+                except Exception as e:
+                    print(msg['rename_error'].format(str(e)))
+                    progress.advance(error=True)
+                    continue
         
+        record_moves(renamed)
+        if progress.cancelled:
+            return False
         print(msg['rename_complete'])
         return True
         
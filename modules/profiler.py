@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import time
+import array
+import threading
+import contextlib
+
+MESSAGES = {
+    'zh': {
+        'header': "\n{:<24}{:>10}{:>12}{:>12}{:>12}{:>12}",
+        'row': "{:<24}{:>10}{:>12.1f}{:>12.3f}{:>12.3f}{:>12}",
+        'columns': ('阶段', '次数', '总计ms', '平均ms', 'p95 ms', '字节'),
+        'trace_written': "时间线已写入 {}（可在 chrome://tracing 或 Perfetto 中打开）",
+        'profile_header': "\ncProfile（按累计耗时排序，前 {} 项）："
+    },
+    'en': {
+        'header': "\n{:<24}{:>10}{:>12}{:>12}{:>12}{:>12}",
+        'row': "{:<24}{:>10}{:>12.1f}{:>12.3f}{:>12.3f}{:>12}",
+        'columns': ('stage', 'count', 'total ms', 'avg ms', 'p95 ms', 'bytes'),
+        'trace_written': "Timeline written to {} (open it in chrome://tracing or Perfetto)",
+        'profile_header': "\ncProfile (sorted by cumulative time, top {}):"
+    }
+}
+
+# 每个阶段最多保留的耗时样本数（超出后均匀抽样），用于计算 p95
+MAX_SAMPLES = 100000
+# 时间线最多保留的事件数
+MAX_EVENTS = 500000
+
+_enabled = False
+_tracing = False
+_lock = threading.Lock()
+_stats = {}
+_events = []
+_origin = time.perf_counter()
+_null = contextlib.nullcontext()
+
+
+class _Stage:
+    """一个阶段的累计统计"""
+
+    __slots__ = ('count', 'total', 'bytes', 'samples', 'skip')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.bytes = 0
+        self.samples = array.array('d')
+        self.skip = 1
+
+    def add(self, seconds, size):
+        self.count += 1
+        self.total += seconds
+        self.bytes += size
+        if self.count % self.skip == 0:
+            self.samples.append(seconds)
+            if len(self.samples) >= MAX_SAMPLES:
+                # 样本过多时隔一个保留一个，之后的采样间隔加倍
+                self.samples = self.samples[::2]
+                self.skip *= 2
+
+
+class _Span:
+    __slots__ = ('name', 'size', 'start')
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start, self.size, self.start)
+        return False
+
+
+def _percentile(values, p):
+    """百分位数（线性插值），与 benchmarks.common.percentile 相同"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def enabled():
+    return _enabled
+
+
+def span(name, size=0):
+    """计时一个阶段：with span('fs.rename'): ...
+
+    未启用时返回共享的空上下文，开销只有一次函数调用。
+    """
+    if not _enabled:
+        return _null
+    return _Span(name, size)
+
+
+def timed(name):
+    """把整个函数作为一个阶段计时的装饰器"""
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name, 0):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+    return decorator
+
+
+def record(name, seconds, size=0, start=None):
+    """直接记录一次耗时（及字节数）；start 为 perf_counter 起点，记录时间线时需要"""
+    if not _enabled:
+        return
+    with _lock:
+        stage = _stats.get(name)
+        if stage is None:
+            stage = _stats[name] = _Stage()
+        stage.add(seconds, size)
+        if _tracing and start is not None and len(_events) < MAX_EVENTS:
+            _events.append({'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                            'ts': round((start - _origin) * 1e6, 1), 'dur': round(seconds * 1e6, 1),
+                            'args': {'bytes': size} if size else {}})
+
+
+class _TimedStream:
+    """统计终端输出耗时的标准输出包装"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        start = time.perf_counter()
+        try:
+            return self.stream.write(text)
+        finally:
+            record('io.output', time.perf_counter() - start, len(text), start)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def enable(trace=False, output=True):
+    """开启计时；trace 为 True 时同时记录时间线事件，output 为 True 时统计标准输出的耗时"""
+    global _enabled, _tracing
+    _enabled = True
+    _tracing = trace
+    if output and not isinstance(sys.stdout, _TimedStream):
+        sys.stdout = _TimedStream(sys.stdout)
+
+
+def disable():
+    global _enabled, _tracing
+    _enabled = _tracing = False
+    if isinstance(sys.stdout, _TimedStream):
+        sys.stdout = sys.stdout.stream
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        del _events[:]
+
+
+def summary():
+    """各阶段的统计：count、total、avg、p95（秒）和 bytes，按总耗时从高到低排列"""
+    with _lock:
+        stages = sorted(_stats.items(), key=lambda item: -item[1].total)
+        return {name: {'count': stage.count, 'total': stage.total,
+                       'avg': stage.total / stage.count if stage.count else 0.0,
+                       'p95': _percentile(stage.samples, 95), 'bytes': stage.bytes}
+                for name, stage in stages}
+
+
+def print_summary(lang='zh', file=None):
+    msg = MESSAGES[lang]
+    file = file or sys.stderr
+    print(msg['header'].format(*msg['columns']), file=file)
+    for name, stats in summary().items():
+        print(msg['row'].format(name, stats['count'], stats['total'] * 1000, stats['avg'] * 1000,
+                                stats['p95'] * 1000, stats['bytes']), file=file)
+
+
+def write_trace(path, lang='zh'):
+    """把时间线写成 Chrome trace 格式的 JSON"""
+    with _lock:
+        events = list(_events)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    print(MESSAGES[lang]['trace_written'].format(path), file=sys.stderr)
+
+
+@contextlib.contextmanager
+def profiling(lang='zh', trace_path=None, cprofile=False, cprofile_path=None, top=25):
+    """在一段代码运行期间开启计时（可选 cProfile），结束后把汇总打印到标准错误
+
+    Args:
+        lang (str): 语言选项
+        trace_path (str): 时间线输出路径，None 表示不记录时间线
+        cprofile (bool): 是否同时用 cProfile 分析
+        cprofile_path (str): cProfile 原始数据的保存路径（可用 snakeviz 等工具查看）
+        top (int): 打印 cProfile 结果的行数
+    """
+    profiler = None
+    if cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+    reset()
+    enable(trace=trace_path is not None)
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        disable()
+        print_summary(lang)
+        if trace_path:
+            write_trace(trace_path, lang)
+        if profiler is not None:
+            import pstats
+            if cprofile_path:
+                profiler.dump_stats(cprofile_path)
+            print(MESSAGES[lang]['profile_header'].format(top), file=sys.stderr)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(top)
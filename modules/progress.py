@@ -0,0 +1,285 @@
+import os
+import sys
+import json
+import time
+import signal
+import itertools
+import threading
+from utils import get_config_value
+
+MESSAGES = {
+    'zh': {
+        'line': "{label} {done}/{total} {percent} | {rate:.0f} 个/秒{bytes} | 剩余 {eta} | 错误 {errors}",
+        'bytes': " | {:.1f} MB/秒",
+        'cancel_requested': "\n收到中断请求，将在当前文件完成后停止（再按一次 Ctrl+C 立即退出）",
+        'cancelled': "操作已中断：完成 {} / {}",
+        'resume_saved': "剩余的操作已保存到 {}，可用 python batchgenie.py plan \"{}\" 继续",
+        'resume_failed': "无法保存剩余的操作: {}"
+    },
+    'en': {
+        'line': "{label} {done}/{total} {percent} | {rate:.0f} files/s{bytes} | ETA {eta} | errors {errors}",
+        'bytes': " | {:.1f} MB/s",
+        'cancel_requested': "\nInterrupt received, stopping after the current file (press Ctrl+C again to abort)",
+        'cancelled': "Operation interrupted: {} of {} done",
+        'resume_saved': "The remaining work was saved to {}; run python batchgenie.py plan \"{}\" to continue",
+        'resume_failed': "Could not save the remaining work: {}"
+    }
+}
+
+# 终端进度行和 JSON 进度的最短刷新间隔（秒）
+REFRESH_INTERVAL = 0.1
+JSON_INTERVAL = 0.5
+MODES = ('auto', 'line', 'json', 'off')
+
+_mode = None
+_lock = threading.Lock()
+_active = []
+_previous_handler = None
+_interrupted = False
+
+
+def configure(mode):
+    """设置进度显示方式：auto（标准错误是终端时显示进度行）、line、json（JSON Lines 输出到标准错误）、off"""
+    global _mode
+    if mode not in MODES:
+        raise ValueError(f"无效的进度显示方式: {mode}")
+    _mode = mode
+
+
+def interrupted():
+    """本进程中是否有操作被 Ctrl+C 中断过"""
+    return _interrupted
+
+
+def ignore_interrupt():
+    """进程池工作进程的 initializer：Ctrl+C 只由主进程处理，正在处理的文件不会被打断
+
+    终端的 Ctrl+C 会发给整个进程组，工作进程收到后会抛出 KeyboardInterrupt 使进程池失效。
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _current_mode():
+    mode = _mode or get_config_value('PROGRESS', 'auto')
+    if mode == 'auto':
+        return 'line' if sys.stderr.isatty() else 'off'
+    return mode
+
+
+def _format_eta(seconds):
+    if seconds is None:
+        return '--:--'
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if hours else f"{rest // 60:02d}:{rest % 60:02d}"
+
+
+class _LineStream:
+    """进度行显示期间的标准输出包装：输出普通信息前先擦除进度行，下次更新进度时再重绘"""
+
+    def __init__(self, stream, progress):
+        self.stream = stream
+        self.progress = progress
+
+    def write(self, text):
+        self.progress._clear_line()
+        return self.stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def _on_interrupt(signum, frame):
+    """第一次 Ctrl+C 请求所有进行中的操作在当前文件完成后停止，第二次立即中断"""
+    global _interrupted
+    with _lock:
+        active = list(_active)
+    if not active or all(progress.cancelled for progress in active):
+        raise KeyboardInterrupt
+    _interrupted = True
+    for progress in active:
+        progress.cancel()
+    print(MESSAGES[active[-1].lang]['cancel_requested'], file=sys.stderr)
+
+
+class Progress:
+    """批量操作的进度：已完成/总数、字节数、速度、预计剩余时间和错误数
+
+    引擎在每个文件处理完后调用 advance()，并在处理下一个文件前检查 cancelled，实现协作式取消：
+    在主线程中使用时，第一次 Ctrl+C 只设置取消标志，循环在文件之间干净地停止。
+
+    用法:
+        with Progress(len(files), 'prefix', lang) as progress:
+            for path in files:
+                if progress.cancelled:
+                    break
+                ...
+                progress.advance(nbytes=size)
+    """
+
+    def __init__(self, total=None, label='', lang='zh', bytes_total=None):
+        self.total = total
+        self.bytes_total = bytes_total
+        self.label = label
+        self.lang = lang
+        self.done = 0
+        self.bytes = 0
+        self.errors = 0
+        self.cancelled = False
+        self.finished = False
+        self.thread = threading.get_ident()
+        self.started = time.monotonic()
+        self._mode = 'off'
+        self._last_render = 0.0
+        self._line_visible = False
+        self._stream = None
+        self._counter_lock = threading.Lock()
+
+    # 引擎调用的接口
+
+    def advance(self, files=1, nbytes=0, error=False):
+        # 可能被多个工作线程同时调用
+        with self._counter_lock:
+            self.done += files
+            self.bytes += nbytes
+            if error:
+                self.errors += 1
+        if self._mode != 'off':
+            now = time.monotonic()
+            if now - self._last_render >= (JSON_INTERVAL if self._mode == 'json' else REFRESH_INTERVAL):
+                self._last_render = now
+                self._render()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def snapshot(self):
+        """当前进度的字典表示（可直接序列化为 JSON）"""
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done if self.total is not None else None
+        return {
+            'label': self.label, 'done': self.done, 'total': self.total, 'bytes': self.bytes,
+            'bytes_total': self.bytes_total, 'errors': self.errors, 'elapsed': round(elapsed, 3),
+            'files_per_second': round(rate, 1),
+            'mb_per_second': round(self.bytes / elapsed / 1e6, 2) if elapsed > 0 else 0.0,
+            'eta': round(remaining / rate, 1) if remaining is not None and rate > 0 else None,
+            'cancelled': self.cancelled, 'finished': self.finished
+        }
+
+    def save_resume(self, plan):
+        """把剩余的工作保存为执行计划（与 AI 返回的 JSON 格式相同），返回文件路径
+
+        计划可以用 python batchgenie.py plan <文件> 或守护进程的 {"plan": ...} 任务继续执行。
+        """
+        from .audio_cache import default_cache_dir
+
+        msg = MESSAGES[self.lang]
+        directory = os.path.join(default_cache_dir(), 'resume')
+        base = os.path.join(directory, f"{self.label or 'operation'}-{time.strftime('%Y%m%d-%H%M%S')}")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # 同一秒内中断多个操作时不覆盖已保存的计划
+            for counter in itertools.count():
+                path = f"{base}-{counter}.json" if counter else f"{base}.json"
+                try:
+                    f = open(path, 'x', encoding='utf-8')
+                    break
+                except FileExistsError:
+                    continue
+            with f:
+                json.dump(plan, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(msg['resume_failed'].format(str(e)))
+            return None
+        print(msg['resume_saved'].format(path, path))
+        return path
+
+    # 显示
+
+    def _line(self):
+        msg = MESSAGES[self.lang]
+        data = self.snapshot()
+        total = self.total if self.total is not None else '?'
+        percent = f"{self.done / self.total:.0%}" if self.total else ''
+        eta = _format_eta(data['eta'])
+        rate_bytes = msg['bytes'].format(data['mb_per_second']) if self.bytes else ''
+        return msg['line'].format(label=self.label, done=self.done, total=total, percent=percent,
+                                  rate=data['files_per_second'], bytes=rate_bytes, eta=eta, errors=self.errors)
+
+    def _render(self):
+        if self._mode == 'json':
+            sys.stderr.write(json.dumps(self.snapshot(), ensure_ascii=False) + '\n')
+        else:
+            sys.stderr.write('\r' + self._line() + '\x1b[K')
+            self._line_visible = True
+        sys.stderr.flush()
+
+    def _clear_line(self):
+        if self._line_visible:
+            sys.stderr.write('\r\x1b[K')
+            sys.stderr.flush()
+            self._line_visible = False
+
+    # 上下文管理
+
+    def __enter__(self):
+        global _previous_handler
+        self._mode = _current_mode()
+        with _lock:
+            first = not _active
+            _active.append(self)
+        if first and threading.current_thread() is threading.main_thread():
+            _previous_handler = signal.signal(signal.SIGINT, _on_interrupt)
+        if self._mode == 'line' and not isinstance(sys.stdout, _LineStream):
+            self._stream = sys.stdout
+            sys.stdout = _LineStream(sys.stdout, self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        global _previous_handler
+        self.finished = True
+        if self._mode != 'off':
+            self._render()
+            if self._mode == 'line':
+                self._line_visible = False
+                sys.stderr.write('\n')
+        if self._stream is not None:
+            sys.stdout = self._stream
+            self._stream = None
+        with _lock:
+            _active.remove(self)
+            last = not _active
+        if last and _previous_handler is not None and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, _previous_handler)
+            _previous_handler = None
+        if self.cancelled:
+            print(MESSAGES[self.lang]['cancelled'].format(self.done, self.total if self.total is not None else '?'))
+        return False
+
+
+def batch_plan(operations):
+    """把 (类型, 源路径, 目标路径) 列表转换为 batch 执行计划，用于保存中断后剩余的工作"""
+    return {
+        'operation': 'batch',
+        'operations': [
+            {'type': kind, 'source': os.path.abspath(source), 'target': os.path.abspath(target)} if target
+            else {'type': kind, 'source': os.path.abspath(source)}
+            for kind, source, target in operations
+        ]
+    }
+
+
+def snapshots(thread=None):
+    """进行中的操作的进度；指定 thread 时只返回该线程中的操作"""
+    with _lock:
+        return [progress.snapshot() for progress in _active if thread is None or progress.thread == thread]
+
+
+def cancel(thread=None):
+    """请求进行中的操作停止（thread 为 None 时取消全部），返回被取消的操作数"""
+    with _lock:
+        targets = [progress for progress in _active if thread is None or progress.thread == thread]
+    for progress in targets:
+        progress.cancel()
+    return len(targets)
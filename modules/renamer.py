@@ -1,5 +1,6 @@
 import os
 import glob
+from .profiler import span
 
 MESSAGES = {
     'zh': {
@@ -26,13 +27,14 @@ MESSAGES = {
     }
 }
 
-def batch_rename(source_path, new_name, lang='zh'):
+def batch_rename(source_path, new_name, lang='zh', confirm=True):
     """重命名单个文件
     
     Args:
         source_path (str): 源文件路径
         new_name (str): 新文件名（不包含路径）
         lang (str): 语言选项
+        confirm (bool): 是否需要确认
     
     Returns:
         bool: 操作是否成功
@@ -56,14 +58,16 @@ def batch_rename(source_path, new_name, lang='zh'):
         print(msg['rename_preview'].format(source_path, target_path))
         
         # 请求确认
-        response = input(msg['confirm_rename']).lower()
-        if response != 'y':
-            print(msg['rename_cancelled'])
-            return False
+        if confirm:
+            response = input(msg['confirm_rename']).lower()
+            if response != 'y':
+                print(msg['rename_cancelled'])
+                return False
         
         # 执行重命名
         print(msg['renaming'].format(source_path, target_path))
-        os.rename(source_path, target_path)
+        with span('fs.rename'):
+            os.rename(source_path, target_path)
         print(msg['rename_complete'])
         return True
         
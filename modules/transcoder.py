@@ -0,0 +1,294 @@
+import os
+import math
+import numpy as np
+import soundfile as sf
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from utils import get_config_value
+from .audio_header import AUDIO_EXTENSIONS
+from .file_filter import compile_filter
+from .progress import Progress, ignore_interrupt
+
+MESSAGES = {
+    'zh': {
+        'folder_not_exist': "错误：文件夹 '{}' 不存在",
+        'unsupported_target': "错误：不支持转码为 {} 格式（支持 {}）",
+        'invalid_bits': "错误：{} 格式不支持 {} bit",
+        'no_files': "未找到任何 {} 格式的文件",
+        'target_exists': "跳过 '{}'：目标文件已存在",
+        'transcoding': "正在转码 {} 个文件（{} 个进程）...",
+        'transcoded': "已转码: {} -> {}",
+        'failed': "转码 '{}' 失败: {}",
+        'complete': "转码完成：成功 {} 个，失败 {} 个，用时 {:.1f} 秒",
+        'invalid_filter': "错误：{}"
+    },
+    'en': {
+        'folder_not_exist': "Error: Folder '{}' does not exist",
+        'unsupported_target': "Error: Cannot transcode to {} (supported: {})",
+        'invalid_bits': "Error: {} does not support {}-bit output",
+        'no_files': "No files found with {} format",
+        'target_exists': "Skipped '{}': target file already exists",
+        'transcoding': "Transcoding {} files ({} processes)...",
+        'transcoded': "Transcoded: {} -> {}",
+        'failed': "Failed to transcode '{}': {}",
+        'complete': "Transcoding finished: {} succeeded, {} failed in {:.1f}s",
+        'invalid_filter': "Error: {}"
+    }
+}
+
+# 可以写出的目标格式（libsndfile 支持）：扩展名 -> (格式, 默认子类型)
+TARGET_FORMATS = {
+    '.wav': ('WAV', None),
+    '.aif': ('AIFF', None),
+    '.aiff': ('AIFF', None),
+    '.flac': ('FLAC', None),
+    '.ogg': ('OGG', 'VORBIS'),
+}
+# 位深 -> 子类型
+BIT_SUBTYPES = {8: 'PCM_U8', 16: 'PCM_16', 24: 'PCM_24', 32: 'PCM_32'}
+# 每次读取的帧数；重采样时每块的中间数组也按这个大小分配
+BLOCK_FRAMES = 16384
+# 重采样滤波器的半宽（过零点个数）和 Kaiser 窗参数
+RESAMPLE_HALF_WIDTH = 16
+RESAMPLE_BETA = 8.6
+
+
+def is_transcodable(source_extension, target_extension):
+    """两种扩展名之间是否需要（并且可以）真正转码，而不是只改扩展名"""
+    source_extension = source_extension.lower()
+    target_extension = target_extension.lower()
+    if source_extension not in AUDIO_EXTENSIONS or target_extension not in TARGET_FORMATS:
+        return False
+    source = TARGET_FORMATS.get(source_extension, (source_extension,))[0]
+    return source != TARGET_FORMATS[target_extension][0]
+
+
+class StreamingResampler:
+    """流式的带限（加窗 sinc）重采样器
+
+    采样率比例化简为 up/down 的整数比，每个输出采样对应的滤波器相位只有 up 种，预先计算好；
+    逐块输入、逐块输出，只保留滤波器需要的少量历史采样。
+    """
+
+    def __init__(self, source_rate, target_rate, channels, half_width=RESAMPLE_HALF_WIDTH):
+        divisor = math.gcd(source_rate, target_rate)
+        self.up = target_rate // divisor
+        self.down = source_rate // divisor
+        self.channels = channels
+        # 降采样时截止频率降到目标采样率的奈奎斯特频率，滤波器按比例加宽
+        cutoff = min(1.0, self.up / self.down)
+        self.width = int(math.ceil(half_width / cutoff))
+        offsets = np.arange(-self.width + 1, self.width + 1)
+        phases = np.arange(self.up)[:, np.newaxis] / self.up
+        x = offsets[np.newaxis, :] - phases
+        window = np.i0(RESAMPLE_BETA * np.sqrt(np.clip(1 - (x / self.width) ** 2, 0, None))) / np.i0(RESAMPLE_BETA)
+        self.kernels = cutoff * np.sinc(cutoff * x) * window
+        self.offsets = offsets
+        # buffer[0] 对应的输入采样序号；开头补 width 个零作为历史
+        self.buffer = np.zeros((self.width, channels))
+        self.start = -self.width
+        self.total_in = 0
+        self.produced = 0
+
+    def _emit(self, limit):
+        """输出序号小于 limit、且所需输入都已就绪的采样"""
+        available = self.start + len(self.buffer)
+        # 输出 n 需要的最后一个输入采样是 n*down//up + width
+        last = (available - self.width) * self.up // self.down
+        count = min(limit, last) - self.produced
+        if count <= 0:
+            return np.zeros((0, self.channels))
+        n = np.arange(self.produced, self.produced + count)
+        base = n * self.down // self.up
+        phase = n * self.down % self.up
+        index = base[:, np.newaxis] + self.offsets[np.newaxis, :] - self.start
+        taps = self.buffer[index]
+        out = np.einsum('nk,nkc->nc', self.kernels[phase], taps)
+        self.produced += count
+        # 丢弃之后不会再用到的历史采样
+        keep_from = self.produced * self.down // self.up - self.width + 1 - self.start
+        if keep_from > 0:
+            self.buffer = self.buffer[keep_from:]
+            self.start += keep_from
+        return out
+
+    def process(self, block):
+        """输入一块采样，返回当前可以输出的采样"""
+        self.buffer = np.concatenate((self.buffer, block))
+        self.total_in += len(block)
+        return self._emit(float('inf'))
+
+    def flush(self):
+        """输入结束：补零并输出剩余采样"""
+        total_out = -(-self.total_in * self.up // self.down)
+        self.buffer = np.concatenate((self.buffer, np.zeros((self.width + 1, self.channels))))
+        return self._emit(total_out)
+
+
+def _tpdf_dither(block, bits, rng):
+    """降低位深时加入 ±1 LSB 的三角分布抖动，避免截断失真"""
+    lsb = 1.0 / (2 ** (bits - 1))
+    return block + (rng.random(block.shape) - rng.random(block.shape)) * lsb
+
+
+def transcode_file(source, target, samplerate=None, bits=None, dither=True):
+    """把一个音频文件流式转码为目标格式
+
+    逐块读取、（可选）重采样和加抖动后写出，内存占用与文件长度无关。先写入临时文件，
+    完成后再替换为目标文件，中途失败不会留下损坏的文件。
+
+    Args:
+        source (str): 源文件路径
+        target (str): 目标文件路径，格式由扩展名决定
+        samplerate (int): 目标采样率，None 表示保持不变
+        bits (int): 目标位深（8/16/24/32），None 表示使用格式默认值
+        dither (bool): 降低到 16 bit 及以下时是否加抖动
+
+    Returns:
+        dict: source、target、frames、samplerate、subtype
+    """
+    extension = os.path.splitext(target)[1].lower()
+    if extension not in TARGET_FORMATS:
+        raise ValueError(f"不支持的目标格式: {extension}")
+    file_format, subtype = TARGET_FORMATS[extension]
+
+    with sf.SoundFile(source) as reader:
+        source_rate, channels = reader.samplerate, reader.channels
+        if bits is not None:
+            subtype = BIT_SUBTYPES[bits]
+        if subtype is None:
+            # 默认沿用源文件位深（目标格式支持时），否则用格式默认值
+            subtype = reader.subtype if sf.check_format(file_format, reader.subtype) else sf.default_subtype(file_format)
+        if not sf.check_format(file_format, subtype):
+            raise ValueError(f"{file_format} 不支持 {subtype}")
+        target_rate = samplerate or source_rate
+        resampler = StreamingResampler(source_rate, target_rate, channels) if target_rate != source_rate else None
+        # 只有源文件精度更高（或为浮点）时才需要抖动
+        source_bits = {subtype: b for b, subtype in BIT_SUBTYPES.items()}.get(reader.subtype, 64)
+        dither_bits = bits if dither and bits and bits <= 16 and source_bits > bits else None
+        rng = np.random.default_rng(0)
+
+        temporary = target + '.part'
+        frames = 0
+        try:
+            with sf.SoundFile(temporary, 'w', samplerate=target_rate, channels=channels,
+                              format=file_format, subtype=subtype) as writer:
+                def write(block):
+                    nonlocal frames
+                    if not len(block):
+                        return
+                    if dither_bits:
+                        block = _tpdf_dither(block, dither_bits, rng)
+                    writer.write(block)
+                    frames += len(block)
+
+                for block in reader.blocks(blocksize=BLOCK_FRAMES, dtype='float64', always_2d=True):
+                    write(resampler.process(block) if resampler else block)
+                if resampler:
+                    write(resampler.flush())
+            os.replace(temporary, target)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+    return {'source': source, 'target': target, 'frames': frames,
+            'samplerate': target_rate, 'subtype': subtype}
+
+
+def _transcode(source, target, samplerate, bits):
+    """进程池中执行的任务"""
+    try:
+        return source, transcode_file(source, target, samplerate, bits), None
+    except Exception as e:
+        return source, None, str(e)
+
+
+def batch_transcode(folder_path, original_extension, target_extension, lang='zh',
+                    samplerate=None, bits=None, max_workers=None, where=None):
+    """把文件夹中某种格式的音频文件转码为另一种格式（保留源文件）
+
+    每个文件在进程池中独立转码，总耗时受 CPU 核心数和磁盘速度限制，而不是逐个串行。
+
+    Args:
+        folder_path (str): 文件夹路径
+        original_extension (str): 源扩展名（如 .wav）
+        target_extension (str): 目标扩展名（如 .flac）
+        lang (str): 语言选项 ('zh' 或 'en')
+        samplerate (int): 目标采样率，None 表示保持不变
+        bits (int): 目标位深，None 表示沿用源文件
+        max_workers (int): 进程数，默认取配置 TRANSCODE_WORKERS（CPU 核心数）
+        where (str): 筛选条件（见 file_filter），如 "samplerate >= 96k"
+
+    Returns:
+        bool: 至少成功转码一个文件时返回 True
+    """
+    import time
+
+    msg = MESSAGES[lang]
+    if not os.path.exists(folder_path):
+        print(msg['folder_not_exist'].format(folder_path))
+        return False
+    target_extension = target_extension.lower()
+    if target_extension not in TARGET_FORMATS:
+        print(msg['unsupported_target'].format(target_extension, ', '.join(TARGET_FORMATS)))
+        return False
+    if bits is not None and (bits not in BIT_SUBTYPES
+                             or not sf.check_format(TARGET_FORMATS[target_extension][0], BIT_SUBTYPES[bits])):
+        print(msg['invalid_bits'].format(TARGET_FORMATS[target_extension][0], bits))
+        return False
+
+    try:
+        where = compile_filter(where)
+    except ValueError as e:
+        print(msg['invalid_filter'].format(str(e)))
+        return False
+
+    jobs = []
+    with os.scandir(folder_path) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        filename = entry.name
+        if not filename.lower().endswith(original_extension.lower()):
+            continue
+        if where is not None and not where.match(entry):
+            continue
+        source = os.path.join(folder_path, filename)
+        target = os.path.join(folder_path, filename[:-len(original_extension)] + target_extension)
+        if os.path.exists(target):
+            print(msg['target_exists'].format(filename))
+            continue
+        try:
+            size = entry.stat().st_size
+        except OSError:
+            size = 0
+        jobs.append((source, target, size))
+    if not jobs:
+        print(msg['no_files'].format(original_extension))
+        return False
+
+    max_workers = min(max_workers or get_config_value('TRANSCODE_WORKERS', os.cpu_count() or 1), len(jobs))
+    print(msg['transcoding'].format(len(jobs), max_workers))
+    started = time.perf_counter()
+    succeeded = failed = 0
+    with Progress(len(jobs), 'transcode', lang, bytes_total=sum(size for _, _, size in jobs)) as progress, \
+            ProcessPoolExecutor(max_workers=max_workers, initializer=ignore_interrupt) as executor:
+        futures = {executor.submit(_transcode, source, target, samplerate, bits): size
+                   for source, target, size in jobs}
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            source, result, error = future.result()
+            if error is not None:
+                failed += 1
+                print(msg['failed'].format(os.path.basename(source), error))
+            else:
+                succeeded += 1
+                print(msg['transcoded'].format(os.path.basename(source), os.path.basename(result['target'])))
+            progress.advance(nbytes=futures[future], error=error is not None)
+            if progress.cancelled:
+                # 正在转码的文件完成后停止；重新运行时已生成目标文件的源文件会被跳过
+                for pending in futures:
+                    pending.cancel()
+    if progress.cancelled:
+        return False
+    print(msg['complete'].format(succeeded, failed, time.perf_counter() - started))
+    return succeeded > 0
@@ -1,23 +1,43 @@
 import os
 import json
+import shutil
+from array import array
 from modules.ai_controller import get_ai_response  # 确保 AI 控制器已导入
+from modules.plan_store import PlanStore
+from modules.fs_index import listdir
 
 class UndoHandler:
     def __init__(self):
         self.last_operation = None
 
     def record_operation(self, operation_type, params):
-        """记录最后一次操作"""
+        """记录最后一次操作（文件列表转存为紧凑的 PlanStore，百万级文件也只占几十 MB）"""
+        if operation_type == 'move_files' and not isinstance(params, PlanStore):
+            store = PlanStore()
+            for source, target in params:
+                store.append('move', source, target)
+            params = store
+        elif operation_type == 'created_files' and not isinstance(params, PlanStore):
+            store = PlanStore()
+            for path in params:
+                store.append('create_file', path)
+            params = store
         self.last_operation = (operation_type, params)
 
-    def undo_last_operation(self):
-        """撤回最后一次操作"""
+    def undo_last_operation(self, confirm=True):
+        """撤回最后一次操作（confirm 为 False 时记录了文件列表的操作不再请求确认）"""
         if self.last_operation is None:
             print("没有操作可以撤回。")
             return
 
-        print(f"上一次操作: {self.last_operation}")  # 添加调试信息
         operation_type, params = self.last_operation
+        if operation_type in ('move_files', 'created_files'):
+            # 记录了完整文件列表的操作直接在本地撤回，不需要 AI
+            if self._undo_file_list(operation_type, params, confirm):
+                self.last_operation = None
+            return
+
+        print(f"上一次操作: {self.last_operation}")  # 添加调试信息
         # 获取受影响的文件列表
         affected_files = self.get_affected_files(operation_type, params)
         if not affected_files:
@@ -68,7 +88,7 @@ class UndoHandler:
 
         if operation_type == "add_prefix":
             prefix = params[2]
-            for filename in os.listdir(folder_path):
+            for filename in listdir(folder_path):
                 if filename.lower().endswith(f".{file_extension}"):
                     new_name = f"{prefix}{filename}"
                     affected_files.append(
@@ -77,7 +97,7 @@ class UndoHandler:
 
         elif operation_type == "remove_suffix":
             suffix = params[2]
-            for filename in os.listdir(folder_path):
+            for filename in listdir(folder_path):
                 # 检查文件名是否以后缀结尾
                 if filename.lower().endswith(f"{suffix}.{file_extension}"):
                     # 计算原始文件名
@@ -88,7 +108,7 @@ class UndoHandler:
 
         elif operation_type == "remove_prefix":
             prefix = params[2]
-            for filename in os.listdir(folder_path):
+            for filename in listdir(folder_path):
                 if filename.startswith(prefix) and filename.lower().endswith(f".{file_extension}"):
                     old_name = filename[len(prefix):]
                     affected_files.append(
@@ -98,7 +118,7 @@ class UndoHandler:
         elif operation_type == "rename_format":
             new_extension = params[1]
             original_extension = params[2]  # 确保获取原始扩展名
-            for filename in os.listdir(folder_path):
+            for filename in listdir(folder_path):
                 if filename.lower().endswith(new_extension):
                     base_name = os.path.splitext(filename)[0]
                     old_name = f"{base_name}{original_extension}"
@@ -125,9 +145,78 @@ class UndoHandler:
         else:
             print("未知的撤回操作。")
 
+    def _undo_file_list(self, operation_type, params, confirm=True):
+        """撤回记录了文件列表的操作
+
+        move_files 记录 (原路径, 新路径)，撤回时移回原位置；
+        created_files 记录新建文件的路径，撤回时删除这些文件。
+        params 为 record_operation 保存的 PlanStore，仍存在的文件只记录序号，之后清理因此变空的文件夹
+        （只清理这些文件所在文件夹的公共目录以下的文件夹，公共目录本身和更上层的文件夹不动）。
+        """
+        moving = operation_type == 'move_files'
+        pending = array('q')
+        root = None
+        print("以下文件将被移回原位置：" if moving else "以下文件将被删除：")
+        for index, (_, source, target) in enumerate(params.paths()):
+            # 撤回时变空的只会是文件被移入/创建的文件夹，清理范围限制在这些文件夹的公共目录以下
+            directory = os.path.dirname(os.path.abspath(target if moving else source))
+            try:
+                root = directory if root is None else os.path.commonpath([root, directory])
+            except ValueError:
+                root = ''  # 不同驱动器，没有公共目录：不清理任何文件夹
+            if os.path.exists(target if moving else source):
+                pending.append(index)
+                print(f"  {target} -> {source}" if moving else f"  {source}")
+        if not pending:
+            print("没有找到受影响的文件，无法执行撤回操作。")
+            return False
+        if confirm and input("是否确认撤回操作？(y/n): ").lower() != 'y':
+            print("撤回操作已取消。")
+            return False
+
+        emptied = set()
+        for index in reversed(pending):
+            _, source, target = params.record(index)
+            try:
+                if moving:
+                    os.makedirs(os.path.dirname(source), exist_ok=True)
+                    shutil.move(target, source)
+                    print(f"已撤回: {target} -> {source}")
+                    emptied.add(os.path.dirname(target))
+                else:
+                    os.remove(source)
+                    print(f"已删除: {source}")
+                    emptied.add(os.path.dirname(source))
+            except Exception as e:
+                print(f"无法撤回文件 {target if moving else source}: {e}")
+        self._remove_empty_dirs(emptied, root)
+        return True
+
+    @staticmethod
+    def _remove_empty_dirs(directories, root):
+        """从深到浅删除变空的文件夹（只向上清理同样变空的上级文件夹，到 root 为止，root 本身保留）"""
+        if not root:
+            return
+        root = os.path.normcase(root)
+
+        def below_root(directory):
+            directory = os.path.normcase(directory)
+            try:
+                return directory != root and os.path.commonpath([root, directory]) == root
+            except ValueError:
+                return False
+
+        for directory in sorted((os.path.abspath(d) for d in directories), key=len, reverse=True):
+            while directory and below_root(directory) and os.path.isdir(directory):
+                try:
+                    os.rmdir(directory)  # 非空时会失败
+                except OSError:
+                    break
+                directory = os.path.dirname(directory)
+
     def _remove_prefix(self, folder_path, file_extension, prefix):
         """执行移除前缀的操作"""
-        for filename in os.listdir(folder_path):
+        for filename in listdir(folder_path):
             if filename.startswith(prefix) and filename.lower().endswith(f".{file_extension}"):
                 old_name = filename[len(prefix):]
                 try:
@@ -138,7 +227,7 @@ class UndoHandler:
 
     def _remove_suffix(self, folder_path, file_extension, suffix):
         """执行移除后缀的操作"""
-        for filename in os.listdir(folder_path):
+        for filename in listdir(folder_path):
             if filename.lower().endswith(f"{suffix}.{file_extension}"):
                 old_name = filename[:-len(suffix)] + f".{file_extension}"
                 try:
@@ -149,7 +238,7 @@ class UndoHandler:
 
     def _rename_format(self, folder_path, new_extension, original_extension):
         """执行格式重命名的操作"""
-        for filename in os.listdir(folder_path):
+        for filename in listdir(folder_path):
             if filename.lower().endswith(new_extension):
                 base_name = os.path.splitext(filename)[0]
                 # 确保 original_extension 以点开头
@@ -21,3 +21,11 @@ def sanitize_filename(filename):
     # 移除非法字符
     filename = re.sub(r'[<>:"/\\|?*]', '', filename)
     return filename.strip()
+
+def get_config_value(name, default=None):
+    """读取 config.py 中的可选配置项，未配置或没有 config.py 时返回默认值"""
+    try:
+        import config
+    except ImportError:
+        return default
+    return getattr(config, name, default)